@@ -0,0 +1,75 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Agregados mensuales y anuales del mix de generación. Se calculan una vez (en
+# construir_datos.py o al cargar los datos) para que los callbacks de evolución
+# no tengan que remuestrear el histórico horario en cada carga de página.
+
+ARCHIVOS_AGREGADOS = {
+    'mensual': "agregados_mix_mensual.parquet",
+    'anual': "agregados_mix_anual.parquet",
+}
+COL_TOTAL = 'TotalGeneracion_MW'
+UMBRAL_TOTAL_MENSUAL_MW = 1000
+COLS_NO_GENERACION = ['DemandaReal_MW', 'SaldoIntercambios_MW', COL_TOTAL]
+
+
+def col_energia(col):
+    return col.replace('_MW', '_MWh')
+
+
+def col_cuota(col):
+    return col.replace('_MW', '_pct')
+
+
+def _tabla_periodo(df, cols_gen, regla):
+    agrupado = df.resample(regla)[cols_gen + [COL_TOTAL]]
+    medias = agrupado.mean()
+    # Datos horarios: la suma de MW de cada hora es la energía del periodo en MWh
+    energias = agrupado.sum(min_count=1).rename(columns=col_energia)
+    total = medias[COL_TOTAL]
+    cuotas = pd.DataFrame({col_cuota(c): np.where(total == 0, 0, medias[c] / total * 100) for c in cols_gen}, index=medias.index)
+    return pd.concat([medias, energias, cuotas], axis=1)
+
+
+def calcular_agregados_mix(df_horario):
+    if df_horario is None or df_horario.empty:
+        return {}
+    cols_gen = [c for c in df_horario.columns if c.endswith('_MW') and c not in COLS_NO_GENERACION and df_horario[c].notna().any()]
+    if not cols_gen:
+        return {}
+
+    df_mix = df_horario[cols_gen].fillna(0)
+    df_mix[COL_TOTAL] = df_horario[COL_TOTAL] if COL_TOTAL in df_horario.columns else df_mix.sum(axis=1)
+    # Medias mensuales solo sobre las horas con generación, descartando meses incompletos
+    mensual = _tabla_periodo(df_mix[df_mix[COL_TOTAL] > 0], cols_gen, 'ME')
+    mensual = mensual[mensual[COL_TOTAL].notna() & (mensual[COL_TOTAL] > UMBRAL_TOTAL_MENSUAL_MW)]
+
+    # Medias anuales sobre los datos originales (sin rellenar huecos con 0)
+    df_anual = df_horario[cols_gen].copy()
+    df_anual[COL_TOTAL] = df_mix[COL_TOTAL]
+    anual = _tabla_periodo(df_anual, cols_gen, 'YE')
+    return {'mensual': mensual, 'anual': anual}
+
+
+def guardar_agregados_mix(agregados, destino):
+    for periodo, nombre in ARCHIVOS_AGREGADOS.items():
+        if periodo in agregados:
+            ruta = os.path.join(destino, nombre)
+            agregados[periodo].to_parquet(ruta + ".tmp")
+            os.replace(ruta + ".tmp", ruta)
+
+
+def cargar_agregados_mix(data_dir, cargar_horario, path_horario):
+    # Usa los agregados precalculados si son al menos tan recientes como el fichero horario; si no, los
+    # recalcula con el DataFrame horario que devuelve `cargar_horario()` (solo se carga en ese caso)
+    rutas = {periodo: os.path.join(data_dir, nombre) for periodo, nombre in ARCHIVOS_AGREGADOS.items()}
+    if os.path.exists(path_horario) and all(os.path.exists(r) and os.path.getmtime(r) >= os.path.getmtime(path_horario) for r in rutas.values()):
+        agregados = {}
+        for periodo, ruta in rutas.items():
+            agregados[periodo] = pd.read_parquet(ruta)
+            agregados[periodo].index = pd.to_datetime(agregados[periodo].index)
+        return agregados
+    return calcular_agregados_mix(cargar_horario())
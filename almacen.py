@@ -0,0 +1,107 @@
+import functools
+import glob
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from metricas import cronometro
+
+# Almacén columnar particionado por resolución, año y mes (estilo hive):
+#   <DATA_DIR>/particionado/resolucion=hour/anio=2024/mes=4/parte-0.parquet
+# Una consulta de ventana solo abre las particiones de los meses que toca, y dentro de ellas
+# los grupos de filas cuyo rango de Timestamp se solapa con la ventana y las columnas pedidas.
+
+DIRECTORIO_PARTICIONADO = "particionado"
+COLUMNA_TIEMPO = "Timestamp"
+FILAS_POR_GRUPO = 1024
+ESQUEMA_PARTICION = pa.schema([('anio', pa.int16()), ('mes', pa.int8())])
+
+
+def ruta_resolucion(data_dir, resolucion):
+    return os.path.join(data_dir, DIRECTORIO_PARTICIONADO, f"resolucion={resolucion}")
+
+
+def escribir_particionado(df, data_dir, resolucion, completo=False):
+    # Reescribe solo las particiones (meses) presentes en `df`; el resto se conserva
+    ruta = ruta_resolucion(data_dir, resolucion)
+    if completo and os.path.exists(ruta):
+        shutil.rmtree(ruta)
+    if df.empty:
+        return
+    df = df.assign(anio=df.index.year.astype('int16'), mes=df.index.month.astype('int8'))
+    df.index.name = COLUMNA_TIEMPO
+    ds.write_dataset(
+        pa.Table.from_pandas(df), ruta, format='parquet',
+        partitioning=ds.partitioning(ESQUEMA_PARTICION, flavor='hive'),
+        existing_data_behavior='delete_matching',
+        basename_template='parte-{i}.parquet',
+        max_rows_per_group=FILAS_POR_GRUPO, min_rows_per_group=min(FILAS_POR_GRUPO, 256),
+    )
+    _abrir_dataset.cache_clear()
+
+
+def huella_dataset(ruta):
+    # Nombre, tamaño y fecha de modificación de cada fichero: cambia cuando otro proceso (construir_datos.py)
+    # reescribe o añade meses, y con ella la entrada de abrir_dataset
+    rutas = sorted(glob.glob(os.path.join(ruta, "*", "*", "*.parquet")))
+    return tuple((r, st.st_size, st.st_mtime_ns) for r, st in ((r, os.stat(r)) for r in rutas))
+
+
+@functools.lru_cache(maxsize=8)
+def _abrir_dataset(ruta, huella):
+    return ds.dataset(ruta, format='parquet', partitioning='hive')
+
+
+def abrir_dataset(ruta):
+    return _abrir_dataset(ruta, huella_dataset(ruta))
+
+
+def existe_particionado(data_dir, resolucion):
+    return os.path.isdir(ruta_resolucion(data_dir, resolucion))
+
+
+def _filtro_meses(inicio, fin):
+    anio, mes = ds.field('anio'), ds.field('mes')
+    filtro = None
+    if inicio is not None:
+        filtro = (anio > inicio.year) | ((anio == inicio.year) & (mes >= inicio.month))
+    if fin is not None:
+        filtro_fin = (anio < fin.year) | ((anio == fin.year) & (mes <= fin.month))
+        filtro = filtro_fin if filtro is None else filtro & filtro_fin
+    return filtro
+
+
+def _ajustar_tz(ts, tz):
+    if ts is None:
+        return None
+    ts = pd.Timestamp(ts)
+    if tz is None:
+        return ts.tz_convert(None) if ts.tz is not None else ts
+    return ts.tz_localize(tz) if ts.tz is None else ts.tz_convert(tz)
+
+
+def leer_ventana(data_dir, resolucion, inicio=None, fin=None, columnas=None):
+    dataset = abrir_dataset(ruta_resolucion(data_dir, resolucion))
+    tipo_tiempo = dataset.schema.field(COLUMNA_TIEMPO).type
+    # Las particiones se calcularon con la zona horaria del índice: la ventana se expresa en la misma
+    inicio, fin = _ajustar_tz(inicio, tipo_tiempo.tz), _ajustar_tz(fin, tipo_tiempo.tz)
+    filtro = _filtro_meses(inicio, fin)
+    # Filtro sobre el tiempo: poda de grupos de filas por sus estadísticas min/max
+    tiempo = ds.field(COLUMNA_TIEMPO)
+    if inicio is not None:
+        condicion = tiempo >= pa.scalar(inicio, type=tipo_tiempo)
+        filtro = condicion if filtro is None else filtro & condicion
+    if fin is not None:
+        condicion = tiempo <= pa.scalar(fin, type=tipo_tiempo)
+        filtro = condicion if filtro is None else filtro & condicion
+    cols = None if columnas is None else [c for c in columnas if c in dataset.schema.names and c != COLUMNA_TIEMPO] + [COLUMNA_TIEMPO]
+    with cronometro('dashboard_carga_datos_segundos', etapa='ventana', fichero=f"{DIRECTORIO_PARTICIONADO}/{resolucion}"):
+        tabla = dataset.to_table(columns=cols, filter=filtro)
+    df = tabla.to_pandas()
+    if COLUMNA_TIEMPO in df.columns:
+        df = df.set_index(COLUMNA_TIEMPO)
+    df = df.drop(columns=[c for c in ('anio', 'mes') if c in df.columns]).sort_index()
+    return df
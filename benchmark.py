@@ -0,0 +1,234 @@
+import argparse
+import gzip
+import importlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+# Banco de pruebas de rendimiento del dashboard. Para cada tamaño de histórico:
+#   1. genera parquet por indicador sintéticos (datos_sinteticos.py) y construye los datos (construir_datos.py);
+#   2. en un proceso nuevo, mide la importación de dashboard_app, el primer layout (carga de datos y KPIs)
+#      y cada callback: latencias (percentiles), memoria pico y tamaño de la salida serializada.
+# Los resultados se escriben en JSON para comparar versiones:
+#   python benchmark.py --anios 1 5 10 20 --salida resultados_benchmark.json
+
+PERCENTILES = (50, 90, 95, 99)
+REPETICIONES_DEFECTO = 20
+
+
+def pico_rss_mb():
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024
+
+
+def resumen_latencias(tiempos_s):
+    ms = np.asarray(tiempos_s) * 1000
+    resumen = {f"p{p}_ms": float(np.percentile(ms, p)) for p in PERCENTILES}
+    resumen.update({'media_ms': float(ms.mean()), 'min_ms': float(ms.min()), 'max_ms': float(ms.max()), 'n': int(ms.size)})
+    return resumen
+
+
+def serializar(resultado):
+    import plotly.utils
+    return json.dumps(resultado, cls=plotly.utils.PlotlyJSONEncoder)
+
+
+def buscar_props(componente, id_buscado):
+    # Propiedades del componente del layout con ese id (para llamar a los callbacks con sus valores iniciales)
+    if getattr(componente, 'id', None) == id_buscado:
+        return componente
+    hijos = getattr(componente, 'children', None)
+    for hijo in hijos if isinstance(hijos, (list, tuple)) else [hijos]:
+        if hijo is not None and not isinstance(hijo, (str, int, float)):
+            encontrado = buscar_props(hijo, id_buscado)
+            if encontrado is not None:
+                return encontrado
+    return None
+
+
+def casos_callbacks(d, layout, kpis):
+    # (nombre, función, argumentos) de cada callback con los valores iniciales del layout
+    series = buscar_props(layout, 'explorador-series').value
+    fechas = buscar_props(layout, 'ventana-fechas')
+    indice = d.obtener_df_horario(series[:1]).index
+    zoom = {'xaxis.range[0]': str(indice[len(indice) // 2].tz_localize(None)), 'xaxis.range[1]': str((indice[len(indice) // 2] + np.timedelta64(30, 'D')).tz_localize(None))} if len(indice) else None
+    return [
+        ('update_evolucion_mix', d.update_evolucion_mix, (None,)),
+        ('update_mix_generacion_fino', d.update_mix_generacion_fino, (None,)),
+        ('update_demanda_interc_precio_fino', d.update_demanda_interc_precio_fino, (None,)),
+        ('update_rampas_fino', d.update_rampas_fino, (None,)),
+        ('update_cobertura_fino', d.update_cobertura_fino, (None,)),
+        ('update_explorador_historico', d.update_explorador_historico, (series, 'minmax', None, None)),
+        ('update_explorador_historico[zoom]', d.update_explorador_historico, (series, 'minmax', zoom, None)),
+        ('update_explorador_historico[lttb]', d.update_explorador_historico, (series, 'lttb', None, None)),
+        ('update_ventana_mix', d.update_ventana_mix, (str(fechas.start_date), str(fechas.end_date), 'hour')),
+        ('update_ventana_mix[15min]', d.update_ventana_mix, (str(fechas.start_date), str(fechas.end_date), 'fifteen_minutes')),
+        ('update_similitud', d.update_similitud, (str(fechas.start_date), str(fechas.end_date), d.cols_similitud_defecto, 'hour', d.TOP_K)),
+        ('update_similitud[15min]', d.update_similitud, (str(fechas.start_date), str(fechas.end_date), d.cols_similitud_defecto, 'fifteen_minutes', d.TOP_K)),
+        ('update_cobertura_ventana', d.update_cobertura_ventana, (str(fechas.start_date), str(fechas.end_date), 'hour', d.COLS_RENOVABLES, d.COLS_NO_EMISORAS)),
+        ('update_cobertura_ventana[15min]', d.update_cobertura_ventana, (str(fechas.start_date), str(fechas.end_date), 'fifteen_minutes', d.COLS_RENOVABLES, d.COLS_NO_EMISORAS)),
+        ('calcular_kpis', lambda: d.calcular_kpis(d.obtener_df_horario(), d.obtener_df_incidente(), d.obtener_agregados_mix(), d.obtener_catalogo_rampas()), ()),
+        ('render_kpi_evolucion_mix', d.render_kpi_evolucion_mix, (kpis['evolucion'],)),
+        ('render_kpi_incidente_inicio', d.render_kpi_incidente_inicio, (kpis['incidente_inicio'],)),
+        ('render_kpi_rampas', d.render_kpi_rampas, (kpis['rampas'],)),
+        ('render_tabla_rampas_historico', d.render_tabla_rampas_historico, (kpis['comparativa_rampas'],)),
+        ('render_kpi_cobertura_previa', d.render_kpi_cobertura_previa, (kpis['cobertura'],)),
+    ]
+
+
+def memos_resultado(d):
+    # Memoizaciones en memoria de resultados intermedios de los callbacks (no de los datos cargados):
+    # se vacían antes de cada repetición para que la latencia sin caché no mida aciertos
+    return [d._cobertura_ventana]
+
+
+def medir_callback(func, args, repeticiones, memos=()):
+    # Cálculo sin caché de figuras (función original) y, si está decorada, también la ruta con caché
+    calculo = getattr(func, '__wrapped__', func)
+    limpiar = lambda: [memo.cache_clear() for memo in memos]
+    tiempos = []
+    for _ in range(repeticiones):
+        limpiar()
+        t0 = time.perf_counter()
+        resultado = calculo(*args)
+        tiempos.append(time.perf_counter() - t0)
+    limpiar()
+    tracemalloc.start()
+    calculo(*args)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    texto = serializar(resultado)
+    medida = {
+        'latencia': resumen_latencias(tiempos),
+        'pico_python_mb': pico / (1024 * 1024),
+        'salida_bytes': len(texto.encode('utf-8')),
+        'salida_gzip_bytes': len(gzip.compress(texto.encode('utf-8'))),
+    }
+    if calculo is not func:
+        limpiar()
+        t0 = time.perf_counter()
+        func(*args)
+        primera = time.perf_counter() - t0
+        tiempos_cache = []
+        for _ in range(repeticiones):
+            t0 = time.perf_counter()
+            func(*args)
+            tiempos_cache.append(time.perf_counter() - t0)
+        medida['cache'] = {'fallo_ms': primera * 1000, 'acierto': resumen_latencias(tiempos_cache)}
+    return medida
+
+
+def medir_dashboard(repeticiones):
+    # Se ejecuta en un proceso nuevo con DATA_DIR y CACHE_FIGURAS_DIR ya fijados
+    medida = {}
+    t0 = time.perf_counter()
+    d = importlib.import_module('dashboard_app')
+    medida['importacion_s'] = time.perf_counter() - t0
+    medida['rss_tras_importacion_mb'] = pico_rss_mb()
+    t0 = time.perf_counter()
+    layout = d.serve_layout()
+    medida['primer_layout_s'] = time.perf_counter() - t0
+    medida['layout_bytes'] = len(serializar(layout).encode('utf-8'))
+    medida['rss_tras_layout_mb'] = pico_rss_mb()
+    kpis = d.obtener_kpis(d.obtener_version_datos())
+    medida['callbacks'] = {}
+    for nombre, func, args in casos_callbacks(d, layout, kpis):
+        medida['callbacks'][nombre] = medir_callback(func, args, repeticiones, memos_resultado(d))
+    medida['pico_rss_mb'] = pico_rss_mb()
+    return medida
+
+
+def medir_en_proceso(data_dir, cache_dir, repeticiones):
+    ruta_salida = os.path.join(cache_dir, "medida.json")
+    entorno = dict(os.environ, DATA_DIR=data_dir, CACHE_FIGURAS_DIR=cache_dir)
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    subprocess.run([sys.executable, os.path.abspath(__file__), '--medir', ruta_salida, '--repeticiones', str(repeticiones)],
+                   env=entorno, cwd=directorio, check=True, stdout=subprocess.DEVNULL)
+    with open(ruta_salida) as f:
+        return json.load(f)
+
+
+def version_codigo():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ejecutar(lista_anios, repeticiones, directorio, semilla):
+    from construir_datos import construir
+    from datos_sinteticos import generar
+
+    resultados = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'version_codigo': version_codigo(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'repeticiones': repeticiones,
+        'tamanos': [],
+    }
+    for anios in lista_anios:
+        base = os.path.join(directorio, f"anios_{anios}")
+        origen, destino, cache_dir = (os.path.join(base, n) for n in ('origen', 'datos', 'cache'))
+        for ruta in (destino, cache_dir):
+            shutil.rmtree(ruta, ignore_errors=True)
+        os.makedirs(cache_dir)
+        t0 = time.perf_counter()
+        generar(origen, anios, semilla=semilla)
+        generacion_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        construir(origen, destino, completo=True)
+        construccion_s = time.perf_counter() - t0
+        print(f"[{anios} años] Midiendo dashboard...")
+        medida = medir_en_proceso(destino, cache_dir, repeticiones)
+        resultados['tamanos'].append({'anios': anios, 'generacion_s': generacion_s, 'construccion_s': construccion_s, **medida})
+        imprimir_resumen(anios, construccion_s, medida)
+    return resultados
+
+
+def imprimir_resumen(anios, construccion_s, medida):
+    print(f"[{anios} años] construcción {construccion_s:.2f} s | importación {medida['importacion_s']:.2f} s | primer layout {medida['primer_layout_s']:.2f} s | pico RSS {medida['pico_rss_mb']:.0f} MB")
+    for nombre, m in medida['callbacks'].items():
+        lat = m['latencia']
+        print(f"    {nombre:40s} p50 {lat['p50_ms']:8.1f} ms  p99 {lat['p99_ms']:8.1f} ms  pico {m['pico_python_mb']:7.1f} MB  salida {m['salida_bytes'] / 1024:8.1f} KB")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark del dashboard con datos sintéticos de distintos tamaños.")
+    parser.add_argument('--anios', type=int, nargs='+', default=[1, 5], help="Años de histórico a 15 minutos de cada tamaño (1-20)")
+    parser.add_argument('--repeticiones', type=int, default=REPETICIONES_DEFECTO)
+    parser.add_argument('--salida', default="resultados_benchmark.json", help="Fichero JSON de resultados")
+    parser.add_argument('--directorio', help="Directorio de trabajo para los datos generados (por defecto, uno temporal que se borra al terminar)")
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--medir', help=argparse.SUPPRESS)  # uso interno: proceso hijo que mide el dashboard
+    args = parser.parse_args()
+
+    if args.medir:
+        medida = medir_dashboard(args.repeticiones)
+        with open(args.medir, 'w') as f:
+            json.dump(medida, f)
+        sys.exit(0)
+
+    if any(not 1 <= a <= 20 for a in args.anios):
+        parser.error("--anios admite valores entre 1 y 20")
+    directorio = args.directorio or tempfile.mkdtemp(prefix="benchmark_dashboard_")
+    try:
+        resultados = ejecutar(args.anios, args.repeticiones, directorio, args.semilla)
+    finally:
+        if not args.directorio:
+            shutil.rmtree(directorio, ignore_errors=True)
+    with open(args.salida, 'w') as f:
+        json.dump(resultados, f, indent=2)
+    print(f"Resultados guardados en {args.salida}")
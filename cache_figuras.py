@@ -0,0 +1,117 @@
+import functools
+import glob
+import hashlib
+import inspect
+import json
+import os
+import sys
+
+import plotly.io as pio
+from plotly.utils import PlotlyJSONEncoder
+
+from metricas import contar
+
+# Caché en disco de las salidas de los callbacks (figuras serializadas a JSON). La clave combina
+# el nombre del callback, sus argumentos, la versión de los datos y la del código que los genera
+# (el módulo del callback y los del proyecto que tiene cargados: kpis.py, rampas.py...), de modo
+# que todos los workers de gunicorn que comparten el directorio reutilizan el mismo resultado.
+# Se guarda sin comprimir: en un acierto Dash vuelve a serializar la respuesta, así que el gzip
+# solo ahorraría disco a cambio de descomprimir en cada lectura. El tamaño está acotado y se
+# desaloja por orden de último uso (LRU, usando la fecha de modificación de cada entrada).
+
+CACHE_DIR = os.environ.get("CACHE_FIGURAS_DIR", ".cache_figuras")
+CACHE_MAX_BYTES = int(float(os.environ.get("CACHE_FIGURAS_MAX_MB", "256")) * 1024 * 1024)
+CACHE_MAX_ENTRADAS = int(os.environ.get("CACHE_FIGURAS_MAX_ENTRADAS", "512"))
+EXTENSION = ".json"
+
+
+def version_datos(data_dir):
+    # Huella de los parquet del directorio de datos: nombre, tamaño y fecha de modificación
+    huella = hashlib.sha1()
+    for ruta in sorted(glob.glob(os.path.join(data_dir, "*.parquet"))):
+        stat = os.stat(ruta)
+        huella.update(f"{os.path.basename(ruta)}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+    return huella.hexdigest()[:16]
+
+
+@functools.lru_cache(maxsize=None)
+def version_codigo(directorio):
+    # Huella (nombre y fecha de modificación) de los módulos cargados desde el directorio del proyecto.
+    # Se calcula en la primera consulta, cuando dashboard_app.py ya ha importado todo lo que usa.
+    huella = hashlib.sha1()
+    rutas = {os.path.abspath(m.__file__) for m in list(sys.modules.values()) if getattr(m, '__file__', None)}
+    for ruta in sorted(r for r in rutas if os.path.dirname(r) == directorio and r.endswith('.py')):
+        huella.update(f"{os.path.basename(ruta)}|{os.stat(ruta).st_mtime_ns}\n".encode())
+    return huella.hexdigest()[:16]
+
+
+def _ruta_entrada(clave):
+    return os.path.join(CACHE_DIR, clave + EXTENSION)
+
+
+def leer(clave):
+    ruta = _ruta_entrada(clave)
+    try:
+        with open(ruta, 'rb') as f:
+            datos = f.read()
+        os.utime(ruta)  # marca la entrada como usada recientemente
+        return datos
+    except OSError:
+        return None
+
+
+def guardar(clave, texto_json):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    ruta = _ruta_entrada(clave)
+    # Escritura atómica: otro worker puede estar leyendo o escribiendo la misma clave
+    ruta_tmp = f"{ruta}.{os.getpid()}.tmp"
+    with open(ruta_tmp, 'wb') as f:
+        f.write(texto_json.encode('utf-8'))
+    os.replace(ruta_tmp, ruta)
+    desalojar()
+
+
+def desalojar():
+    entradas = []
+    for ruta in glob.glob(os.path.join(CACHE_DIR, "*" + EXTENSION)):
+        try:
+            stat = os.stat(ruta)
+            entradas.append((stat.st_mtime_ns, stat.st_size, ruta))
+        except FileNotFoundError:
+            continue
+    total_bytes = sum(tamano for _, tamano, _ in entradas)
+    entradas.sort()
+    while entradas and (len(entradas) > CACHE_MAX_ENTRADAS or total_bytes > CACHE_MAX_BYTES):
+        _, tamano, ruta = entradas.pop(0)
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+        total_bytes -= tamano
+
+
+def cachear_resultado(nombre, obtener_version):
+    # Decorador para callbacks cuya salida solo depende de los datos cargados y de sus argumentos.
+    # En un acierto devuelve el JSON ya serializado (como dict) sin volver a construir la figura.
+    def decorador(func):
+        fuente = inspect.getsourcefile(func)
+        directorio = os.path.dirname(os.path.abspath(fuente)) if fuente else None
+
+        @functools.wraps(func)
+        def envoltura(*args):
+            clave_base = f"{nombre}|{obtener_version()}|{version_codigo(directorio) if directorio else 0}|{json.dumps(args, sort_keys=True, default=str)}"
+            clave = f"{nombre}-{hashlib.sha1(clave_base.encode()).hexdigest()[:20]}"
+            datos = leer(clave)
+            contar('dashboard_cache_figuras_total', callback=nombre, resultado='acierto' if datos is not None else 'fallo')
+            if datos is not None:
+                return json.loads(datos)
+            resultado = func(*args)
+            try:
+                # Callbacks con varias salidas: tupla de figuras y componentes
+                texto = json.dumps(resultado, cls=PlotlyJSONEncoder) if isinstance(resultado, tuple) else pio.to_json(resultado, validate=False)
+                guardar(clave, texto)
+            except OSError as e:
+                print(f"No se pudo guardar en caché el resultado de {nombre}: {e}")
+            return resultado
+        return envoltura
+    return decorador
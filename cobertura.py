@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+# Motor de cobertura de la demanda e intensidad de CO2, calculado al vuelo desde las columnas de
+# cada tecnología para cualquier resolución y ventana. Qué tecnologías son renovables o no emisoras
+# es configurable: las sumas de todas las clases salen de una sola multiplicación de la matriz de
+# valores por la de pertenencia (tecnología x clase). construir_datos.py lo usa con la clasificación
+# por defecto para las columnas derivadas que se guardan en los parquet.
+
+COLS_RENOVABLES = ['Hidraulica_MW', 'Eolica_MW', 'SolarFotovoltaica_MW', 'SolarTermica_MW', 'TermicaRenovable_MW']
+COLS_NO_EMISORAS = COLS_RENOVABLES + ['Nuclear_MW']
+COL_DEMANDA = 'DemandaReal_MW'
+COL_TOTAL = 'TotalGeneracion_MW'
+COL_FACTOR_CO2 = 'EmisionesCO2_Factor_tCO2_MWh'
+COL_INTENSIDAD_CO2 = 'IntensidadCO2_g_kWh'
+COLS_COBERTURA = {'renovable': 'CoberturaRenovable_pct', 'no_emisora': 'CoberturaNoEmisora_pct'}
+# 1 t/MWh = 10^6 g / 10^3 kWh
+G_KWH_POR_T_MWH = 1000
+
+
+def clasificacion(renovables=COLS_RENOVABLES, no_emisoras=COLS_NO_EMISORAS):
+    # Clave hashable y en orden estable de una clasificación, para las cachés
+    return tuple(sorted(set(renovables))), tuple(sorted(set(no_emisoras)))
+
+
+def sumas_por_clase(df, clases):
+    # {clase: columnas} -> DataFrame con la suma por fila de cada clase; NaN en las filas sin ningún
+    # valor de la clase, igual que sum(axis=1, min_count=1)
+    cols = sorted({c for miembros in clases.values() for c in miembros if c in df.columns})
+    if not cols:
+        return pd.DataFrame(np.nan, index=df.index, columns=list(clases))
+    valores = df[cols].to_numpy(dtype=float)
+    presentes = ~np.isnan(valores)
+    pertenencia = np.array([[c in miembros for miembros in clases.values()] for c in cols], dtype=float)
+    sumas = np.where(presentes, valores, 0.0) @ pertenencia
+    sumas[(presentes @ pertenencia) == 0] = np.nan
+    return pd.DataFrame(sumas, index=df.index, columns=list(clases))
+
+
+def calcular_coberturas(df, renovables=COLS_RENOVABLES, no_emisoras=COLS_NO_EMISORAS):
+    # Porcentaje de la demanda cubierto por cada clase (NaN si la demanda no es positiva)
+    sumas = sumas_por_clase(df, {'renovable': renovables, 'no_emisora': no_emisoras})
+    demanda = df[COL_DEMANDA].where(df[COL_DEMANDA] > 0).to_numpy(dtype=float)
+    return pd.DataFrame({COLS_COBERTURA[clase]: sumas[clase].to_numpy() / demanda * 100 for clase in sumas.columns}, index=df.index)
+
+
+def intensidad_co2(df, factor=None):
+    # g/kWh a partir del factor de emisión de la generación de e·sios (tCO2/MWh). `factor` permite pasar
+    # la serie horaria para una resolución más fina: cada intervalo toma el valor de su hora.
+    if factor is None:
+        factor = df[COL_FACTOR_CO2] if COL_FACTOR_CO2 in df.columns else pd.Series(np.nan, index=df.index)
+    elif not factor.index.equals(df.index):
+        factor = factor.reindex(df.index, method='ffill', tolerance=pd.Timedelta(hours=1) - pd.Timedelta(1))
+    return (factor * G_KWH_POR_T_MWH).rename(COL_INTENSIDAD_CO2)
+
+
+def calcular(df, generacion, renovables=COLS_RENOVABLES, no_emisoras=COLS_NO_EMISORAS, factor=None):
+    # Generación total, coberturas e intensidad de CO2 de una ventana con la clasificación dada
+    resultado = sumas_por_clase(df, {COL_TOTAL: generacion})
+    if COL_DEMANDA in df.columns:
+        resultado = resultado.join(calcular_coberturas(df, renovables, no_emisoras))
+    resultado[COL_INTENSIDAD_CO2] = intensidad_co2(df, factor)
+    return resultado
@@ -0,0 +1,44 @@
+import os
+
+import pandas as pd
+
+# Configuración de la descarga de indicadores de la API e·sios de REE (esios_api.py).
+# Cada indicador se guarda como `<nombre>_<resolución>.parquet` en ORIGEN_DIR, el directorio
+# del que construir_datos.py lee los parquet por indicador.
+
+ESIOS_URL = os.environ.get("ESIOS_URL", "https://api.esios.ree.es")
+ESIOS_TOKEN = os.environ.get("ESIOS_TOKEN", "")
+ORIGEN_DIR = os.environ.get("ORIGEN_DIR", "datos_esios copy2")
+
+# Inicio del histórico cuando un indicador aún no tiene fichero local
+FECHA_INICIO_HISTORICO = pd.Timestamp(os.environ.get("ESIOS_INICIO_HISTORICO", "2020-04-28"), tz='UTC')
+
+# Límites de la descarga: conexiones simultáneas, peticiones por segundo y reintentos por tramo
+MAX_CONEXIONES = int(os.environ.get("ESIOS_MAX_CONEXIONES", "8"))
+PETICIONES_POR_SEGUNDO = float(os.environ.get("ESIOS_PETICIONES_POR_SEGUNDO", "10"))
+REINTENTOS = int(os.environ.get("ESIOS_REINTENTOS", "5"))
+TIMEOUT_S = float(os.environ.get("ESIOS_TIMEOUT_S", "60"))
+
+# Tamaño de cada tramo de fechas pedido en una sola petición, por resolución
+DIAS_POR_TRAMO = {'hour': 92, 'fifteen_minutes': 31}
+PASOS = {'hour': pd.Timedelta(hours=1), 'fifteen_minutes': pd.Timedelta(minutes=15)}
+
+GEO_PENINSULA = 8741
+GEO_ESPANA = 3
+
+# nombre de fichero -> identificador e·sios, columna, resoluciones, agregación temporal y zona
+INDICADORES = {
+    'demanda_real': {'id': 1293, 'columna': 'DemandaReal_MW', 'resoluciones': ('hour', 'fifteen_minutes'), 'agregacion': 'average', 'geo_id': GEO_PENINSULA},
+    'emisiones_co2_generacion': {'id': 10355, 'columna': 'EmisionesCO2_Factor_tCO2_MWh', 'resoluciones': ('hour',), 'agregacion': 'average', 'geo_id': GEO_PENINSULA},
+    'generacion_carbon': {'id': 547, 'columna': 'Carbon_MW', 'resoluciones': ('hour', 'fifteen_minutes'), 'agregacion': 'average', 'geo_id': GEO_PENINSULA},
+    'generacion_ciclo_combinado': {'id': 550, 'columna': 'CicloCombinado_MW', 'resoluciones': ('hour', 'fifteen_minutes'), 'agregacion': 'average', 'geo_id': GEO_PENINSULA},
+    'generacion_cogeneracion_residuos': {'id': 1297, 'columna': 'Cogeneracion_MW', 'resoluciones': ('hour',), 'agregacion': 'average', 'geo_id': GEO_PENINSULA},
+    'generacion_eolica': {'id': 551, 'columna': 'Eolica_MW', 'resoluciones': ('hour', 'fifteen_minutes'), 'agregacion': 'average', 'geo_id': GEO_PENINSULA},
+    'generacion_hidraulica': {'id': 546, 'columna': 'Hidraulica_MW', 'resoluciones': ('hour', 'fifteen_minutes'), 'agregacion': 'average', 'geo_id': GEO_PENINSULA},
+    'generacion_nuclear': {'id': 549, 'columna': 'Nuclear_MW', 'resoluciones': ('hour', 'fifteen_minutes'), 'agregacion': 'average', 'geo_id': GEO_PENINSULA},
+    'generacion_solar_fotovoltaica': {'id': 1295, 'columna': 'SolarFotovoltaica_MW', 'resoluciones': ('hour', 'fifteen_minutes'), 'agregacion': 'average', 'geo_id': GEO_PENINSULA},
+    'generacion_solar_termica': {'id': 1294, 'columna': 'SolarTermica_MW', 'resoluciones': ('hour',), 'agregacion': 'average', 'geo_id': GEO_PENINSULA},
+    'generacion_termica_renovable': {'id': 1296, 'columna': 'TermicaRenovable_MW', 'resoluciones': ('hour',), 'agregacion': 'average', 'geo_id': GEO_PENINSULA},
+    'precio_mercado_diario': {'id': 600, 'columna': 'PrecioMercado_EUR_MWh', 'resoluciones': ('hour',), 'agregacion': 'average', 'geo_id': GEO_ESPANA},
+    'saldo_intercambios_total': {'id': 10207, 'columna': 'SaldoIntercambios_MW', 'resoluciones': ('hour', 'fifteen_minutes'), 'agregacion': 'average', 'geo_id': GEO_PENINSULA},
+}
@@ -0,0 +1,239 @@
+import argparse
+import glob
+import json
+import os
+import time
+
+import pandas as pd
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from agregados import ARCHIVOS_AGREGADOS, calcular_agregados_mix, guardar_agregados_mix
+from rampas import ARCHIVO_CATALOGO, construir_catalogo, guardar_catalogo
+from almacen import escribir_particionado, existe_particionado
+from cobertura import COL_DEMANDA, COL_TOTAL, COLS_NO_EMISORAS, COLS_RENOVABLES, calcular_coberturas, sumas_por_clase
+
+# Construcción de los DataFrames combinados que consume dashboard_app.py a partir
+# de los parquet por indicador (`<indicador>_hour.parquet`, `<indicador>_fifteen_minutes.parquet`).
+# La construcción es incremental: se guarda en un fichero de estado la última marca
+# temporal leída de cada indicador y solo se releen las filas nuevas de los ficheros modificados.
+
+ORIGEN_DIR = os.environ.get("ORIGEN_DIR", "datos_esios copy2")
+DATA_DIR = os.environ.get("DATA_DIR", "datos_esios")
+ARCHIVO_ESTADO = "estado_construccion.json"
+COLUMNA_TIEMPO = "Timestamp"
+
+RESOLUCIONES = {
+    'hour': {'salida': "df_calc_horario_final.parquet", 'paso': pd.Timedelta(hours=1)},
+    # Los indicadores que solo se publican por horas (precio, solar térmica, factor de CO2...) se
+    # completan en la rejilla de 15 minutos desde su fichero horario
+    'fifteen_minutes': {'salida': "df_incidente_plot_final_combinado_csv_esios.parquet", 'paso': pd.Timedelta(minutes=15), 'complemento': 'hour'},
+}
+
+# Nombres de columna de origen que el dashboard espera con otro nombre
+RENOMBRES_COLUMNAS = {'Cogeneracion_MW': 'CogeneracionYResiduos_MW'}
+
+COLS_NO_GENERACION = ['DemandaReal_MW', 'SaldoIntercambios_MW', 'TotalGeneracion_MW']
+COLS_DERIVADAS = ['TotalGeneracion_MW', 'CoberturaRenovable_pct', 'CoberturaNoEmisora_pct']
+
+
+def columnas_generacion(df):
+    return [c for c in df.columns if c.endswith('_MW') and c not in COLS_NO_GENERACION]
+
+
+def calcular_derivadas(df):
+    # Total y coberturas con la clasificación por defecto del motor de cobertura.py
+    df[COL_TOTAL] = sumas_por_clase(df, {COL_TOTAL: columnas_generacion(df)})[COL_TOTAL]
+    if COL_DEMANDA not in df.columns:
+        return df
+    coberturas = calcular_coberturas(df, COLS_RENOVABLES, COLS_NO_EMISORAS)
+    df[coberturas.columns] = coberturas
+    return df
+
+
+def cargar_estado(destino):
+    ruta = os.path.join(destino, ARCHIVO_ESTADO)
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta) as f:
+        return json.load(f)
+
+
+def guardar_estado(destino, estado):
+    ruta = os.path.join(destino, ARCHIVO_ESTADO)
+    ruta_tmp = ruta + ".tmp"
+    with open(ruta_tmp, 'w') as f:
+        json.dump(estado, f, indent=2)
+    os.replace(ruta_tmp, ruta)
+
+
+def leer_indicador(ruta, desde=None, hasta=None):
+    # `desde` y `hasta` (excluida) se empujan como filtro al lector parquet: solo se leen las filas de ese tramo
+    filtros = ([(COLUMNA_TIEMPO, '>=', desde)] if desde is not None else []) + ([(COLUMNA_TIEMPO, '<', hasta)] if hasta is not None else [])
+    df = pd.read_parquet(ruta, filters=filtros or None)
+    df.index = pd.to_datetime(df.index)
+    df = df[~df.index.duplicated(keep='last')].sort_index()
+    return df.rename(columns=RENOMBRES_COLUMNAS)
+
+
+def alinear(serie, paso, paso_nativo):
+    # Lleva la serie a la rejilla regular de la resolución de salida. Un indicador publicado con
+    # un paso mayor (p. ej. horario dentro del fichero de 15 min) mantiene su valor hasta la siguiente muestra.
+    if serie.empty:
+        return serie
+    rejilla = pd.date_range(serie.index.min(), serie.index.max(), freq=paso)
+    limite = max(int(paso_nativo / paso) - 1, 0)
+    serie = serie.reindex(rejilla.union(serie.index))
+    if limite:
+        serie = serie.ffill(limit=limite)
+    return serie.reindex(rejilla)
+
+
+def paso_mediano(indice, por_defecto):
+    if len(indice) < 2:
+        return por_defecto
+    return pd.Series(indice).diff().median()
+
+
+def archivos_indicadores(origen, resolucion):
+    # (ficheros de la resolución, ficheros de la resolución complementaria de indicadores que no tienen la propia)
+    archivos = sorted(glob.glob(os.path.join(origen, f"*_{resolucion}.parquet")))
+    complemento = RESOLUCIONES[resolucion].get('complemento')
+    if complemento is None:
+        return archivos, []
+    propios = {os.path.basename(a)[:-len(f"_{resolucion}.parquet")] for a in archivos}
+    return archivos, [a for a in sorted(glob.glob(os.path.join(origen, f"*_{complemento}.parquet")))
+                      if os.path.basename(a)[:-len(f"_{complemento}.parquet")] not in propios]
+
+
+def primera_marca(ruta):
+    return pd.Timestamp(pc.min(pq.read_table(ruta, columns=[COLUMNA_TIEMPO])[COLUMNA_TIEMPO]).as_py())
+
+
+def construir_resolucion(origen, destino, resolucion, estado, completo=False):
+    config = RESOLUCIONES[resolucion]
+    ruta_salida = os.path.join(destino, config['salida'])
+    propios, complementos = archivos_indicadores(origen, resolucion)
+    archivos = propios + complementos
+    estado_res = {} if completo else estado.get(resolucion, {})
+
+    nombres_actuales = {os.path.basename(a) for a in archivos}
+    if set(estado_res) - nombres_actuales or not os.path.exists(ruta_salida):
+        # Ha desaparecido algún indicador o falta la salida: no se puede partir de lo construido
+        estado_res = {}
+
+    partir_de_salida = bool(estado_res)
+    reconstruccion_completa = not partir_de_salida or not existe_particionado(destino, resolucion)
+    # Los complementos solo cubren el periodo de los indicadores propios de la resolución, no todo su histórico
+    limite = min((primera_marca(a) for a in propios), default=None) if complementos else None
+
+    nuevas, releidas = {}, set()
+    inicio_recalculo = None
+    for ruta in archivos:
+        nombre = os.path.basename(ruta)
+        stat = os.stat(ruta)
+        previo = estado_res.get(nombre)
+        if previo and previo['mtime_ns'] == stat.st_mtime_ns and previo['tamano'] == stat.st_size:
+            continue
+        minimo = limite if ruta in complementos else None
+        if ruta in complementos and minimo is None:
+            continue
+
+        filas_totales = pq.ParquetFile(ruta).metadata.num_rows
+        desde = pd.Timestamp(previo['ultimo_ts']) if previo else None
+        nuevo = leer_indicador(ruta, desde if desde is not None else minimo)
+        if previo and (nuevo.empty or nuevo.index.min() != desde or filas_totales != previo['filas'] + len(nuevo) - 1):
+            # El fichero no se ha limitado a añadir filas al final: se relee completo
+            print(f"{nombre}: histórico modificado, se relee completo.")
+            previo, desde = None, None
+            nuevo = leer_indicador(ruta, minimo)
+        if nuevo.empty:
+            continue
+
+        paso_nativo = pd.Timedelta(seconds=previo['paso_nativo_s']) if previo else paso_mediano(nuevo.index, config['paso'])
+        for col in nuevo.columns:
+            nuevas[col] = alinear(nuevo[col], config['paso'], paso_nativo)
+            if not previo:
+                # Indicador nuevo o releído: se descarta lo anterior de esa columna
+                releidas.add(col)
+        inicio_tramo = nuevo.index.min()
+        inicio_recalculo = inicio_tramo if inicio_recalculo is None else min(inicio_recalculo, inicio_tramo)
+
+        estado_res[nombre] = {
+            'mtime_ns': stat.st_mtime_ns,
+            'tamano': stat.st_size,
+            'filas': filas_totales,
+            'ultimo_ts': nuevo.index.max().isoformat(),
+            'paso_nativo_s': paso_nativo.total_seconds(),
+            'columnas': list(nuevo.columns),
+        }
+        print(f"{nombre}: {len(nuevo)} filas leídas desde {desde if desde is not None else 'el inicio'}.")
+
+    if inicio_recalculo is None:
+        print(f"[{resolucion}] Sin cambios en los indicadores.")
+        return False
+
+    # Una sola alineación del frame construido con todas las columnas nuevas
+    df = pd.DataFrame()
+    if partir_de_salida:
+        df = pd.read_parquet(ruta_salida)
+        df.index = pd.to_datetime(df.index)
+    nuevas = pd.DataFrame(nuevas)
+    df = df.reindex(index=df.index.union(nuevas.index), columns=df.columns.union(nuevas.columns, sort=False))
+    df[sorted(releidas)] = float('nan')
+    df.update(nuevas)
+    df.index.name = COLUMNA_TIEMPO
+    # Las columnas derivadas solo se recalculan en el tramo afectado por las filas nuevas
+    tramo = calcular_derivadas(df.loc[inicio_recalculo:].copy())
+    for col in COLS_DERIVADAS:
+        if col not in df.columns:
+            df[col] = float('nan')
+        df.loc[tramo.index, col] = tramo[col] if col in tramo.columns else float('nan')
+    df = df.dropna(axis=1, how='all').astype('float64')
+
+    os.makedirs(destino, exist_ok=True)
+    ruta_tmp = ruta_salida + ".tmp"
+    df.to_parquet(ruta_tmp)
+    os.replace(ruta_tmp, ruta_salida)
+    # En el almacén particionado solo se reescriben los meses afectados por el tramo recalculado
+    inicio_mes = inicio_recalculo.normalize().replace(day=1)
+    escribir_particionado(df if reconstruccion_completa else df.loc[inicio_mes:], destino, resolucion, completo=reconstruccion_completa)
+    estado[resolucion] = estado_res
+    print(f"[{resolucion}] {config['salida']} actualizado desde {inicio_recalculo}. Shape: {df.shape}")
+    return True
+
+
+def construir(origen=ORIGEN_DIR, destino=DATA_DIR, completo=False):
+    os.makedirs(destino, exist_ok=True)
+    estado = {} if completo else cargar_estado(destino)
+    t0 = time.perf_counter()
+    cambios = {resolucion: construir_resolucion(origen, destino, resolucion, estado, completo) for resolucion in RESOLUCIONES}
+    ruta_horario = os.path.join(destino, RESOLUCIONES['hour']['salida'])
+    faltan_agregados = not all(os.path.exists(os.path.join(destino, nombre)) for nombre in ARCHIVOS_AGREGADOS.values())
+    if os.path.exists(ruta_horario) and (cambios['hour'] or faltan_agregados):
+        df_horario = pd.read_parquet(ruta_horario)
+        df_horario.index = pd.to_datetime(df_horario.index)
+        guardar_agregados_mix(calcular_agregados_mix(df_horario), destino)
+        print("Agregados mensuales y anuales del mix actualizados.")
+    if any(cambios.values()) or not os.path.exists(os.path.join(destino, ARCHIVO_CATALOGO)):
+        frames = {}
+        for resolucion, config in RESOLUCIONES.items():
+            ruta = os.path.join(destino, config['salida'])
+            if os.path.exists(ruta):
+                frames[resolucion] = pd.read_parquet(ruta)
+                frames[resolucion].index = pd.to_datetime(frames[resolucion].index)
+        catalogo = construir_catalogo(frames)
+        guardar_catalogo(catalogo, destino)
+        print(f"Catálogo de rampas actualizado: {len(catalogo)} eventos.")
+    guardar_estado(destino, estado)
+    print(f"Construcción terminada en {time.perf_counter() - t0:.2f} s.")
+    return any(cambios.values())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Construye los DataFrames combinados del dashboard a partir de los parquet por indicador.")
+    parser.add_argument('--origen', default=ORIGEN_DIR, help="Directorio con los ficheros *_hour.parquet y *_fifteen_minutes.parquet")
+    parser.add_argument('--destino', default=DATA_DIR, help="Directorio de salida (DATA_DIR del dashboard)")
+    parser.add_argument('--completo', action='store_true', help="Ignora el estado guardado y reconstruye todo")
+    args = parser.parse_args()
+    construir(args.origen, args.destino, args.completo)
@@ -1,14 +1,28 @@
 import dash
 from dash import dcc, html
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
 import pandas as pd
 from datetime import datetime, timedelta
 import os
+import functools
 import numpy as np
 
+from agregados import cargar_agregados_mix
+from cache_figuras import cachear_resultado, version_datos
+from kpis import calcular_kpis
+from downsampling import METODOS, reducir_ventana
+from rampas import calcular_rampas, cargar_catalogo, maximos_absolutos
+from almacen import existe_particionado, leer_ventana
+from datos import cargar_frame, columnas_disponibles
+from metricas import instrumentar
+from similitud import TOP_K, buscar_similares
+from cobertura import COL_FACTOR_CO2, COL_INTENSIDAD_CO2, COL_TOTAL, COLS_COBERTURA, COLS_NO_EMISORAS, COLS_RENOVABLES, calcular, clasificacion
+from directo import INTERVALO_SONDEO_S, PASO, VENTANA, col_rampa, filas_desde, medias_mes, sondear
+
 print("Iniciando dashboard...")
 
 # Colores para cada tecnología
@@ -31,36 +45,46 @@ color_palette = {
 }
 
 # Carga de datos
-DATA_DIR = "datos_esios"
+DATA_DIR = os.environ.get("DATA_DIR", "datos_esios")
 PATH_INCIDENTE_DATOS = os.path.join(DATA_DIR, "df_incidente_plot_final_combinado_csv_esios.parquet")
 PATH_HORARIO_FINAL = os.path.join(DATA_DIR, "df_calc_horario_final.parquet")
 
-df_horario = None
-df_incidente_plot = pd.DataFrame()
-
-try:
-    if os.path.exists(PATH_INCIDENTE_DATOS):
-        df_incidente_plot = pd.read_parquet(PATH_INCIDENTE_DATOS)
-        df_incidente_plot.index = pd.to_datetime(df_incidente_plot.index)
-        print(f"DataFrame COMBINADO del incidente cargado. Shape: {df_incidente_plot.shape}")
-    else:
-        print(f"ERROR CRÍTICO: No se encontró el archivo combinado {PATH_INCIDENTE_DATOS}")
-
-    if os.path.exists(PATH_HORARIO_FINAL):
-        df_horario = pd.read_parquet(PATH_HORARIO_FINAL)
-        df_horario.index = pd.to_datetime(df_horario.index)
-        print(f"DataFrame horario cargado. Shape: {df_horario.shape}")
-    else:
-        print(f"ERROR CRÍTICO: No se encontró el archivo {PATH_HORARIO_FINAL}")
-except Exception as e:
-    print(f"Error cargando datos para el dashboard: {e}")
+if not os.path.exists(PATH_INCIDENTE_DATOS): print(f"ERROR CRÍTICO: No se encontró el archivo combinado {PATH_INCIDENTE_DATOS}")
+if not os.path.exists(PATH_HORARIO_FINAL): print(f"ERROR CRÍTICO: No se encontró el archivo {PATH_HORARIO_FINAL}")
 
 # Configuración del período de análisis
 FECHA_INCIDENTE = datetime(2025, 4, 28)
 inicio_zoom_incidente_dt_global = pd.Timestamp(FECHA_INCIDENTE - timedelta(days=1))
 fin_zoom_incidente_dt_global = pd.Timestamp(FECHA_INCIDENTE + timedelta(hours=23, minutes=59))
 
-if not df_incidente_plot.empty:
+cols_generacion_fino_plot = [
+    'Hidraulica_MW', 'Nuclear_MW', 'CicloCombinado_MW', 'Eolica_MW',
+    'SolarFotovoltaica_MW', 'SolarTermica_MW', 'Carbon_MW', 'FuelGas_MW',
+    'TermicaRenovable_MW', 'CogeneracionYResiduos_MW' 
+]
+cols_generacion_mix_evolucion_horario = [
+    'Hidraulica_MW', 'Nuclear_MW', 'CicloCombinado_MW', 'Eolica_MW',
+    'SolarFotovoltaica_MW', 'SolarTermica_MW', 'Carbon_MW',
+    'TermicaRenovable_MW', 'Cogeneracion_PBF_MW', 
+    'ResiduosNoRen_PBF_MW', 'CogeneracionYResiduos_MW'
+]
+# Columnas que se cargan de cada DataFrame: las de las gráficas más las que necesitan los KPIs
+cols_kpis_incidente = ['DemandaReal_MW', 'SaldoIntercambios_MW', 'TotalGeneracion_MW', 'PrecioMercado_EUR_MWh', 'CoberturaRenovable_pct', 'CoberturaNoEmisora_pct']
+cols_incidente_dashboard = list(dict.fromkeys(cols_generacion_fino_plot + cols_kpis_incidente))
+cols_horario_dashboard = list(dict.fromkeys(cols_generacion_mix_evolucion_horario + ['TotalGeneracion_MW', 'DemandaReal_MW']))
+
+# Carga perezosa: nada se lee hasta el primer uso y los valores se comparten por memory-map entre workers
+def obtener_version_datos():
+    # Versión de los datos en disco: forma parte de la clave de la caché de figuras y de los KPIs
+    return version_datos(DATA_DIR)
+
+def obtener_df_horario(columnas=cols_horario_dashboard):
+    return cargar_frame(PATH_HORARIO_FINAL, columnas)
+
+@functools.lru_cache(maxsize=2)
+def _df_incidente_ventana(version):
+    df_incidente_plot = cargar_frame(PATH_INCIDENTE_DATOS, cols_incidente_dashboard)
+    if df_incidente_plot.empty: return df_incidente_plot
     temp_inicio_zoom = inicio_zoom_incidente_dt_global
     temp_fin_zoom = fin_zoom_incidente_dt_global
     
@@ -72,24 +96,65 @@ if not df_incidente_plot.empty:
         if temp_inicio_zoom.tz is None: temp_inicio_zoom = temp_inicio_zoom.tz_localize(idx_tz)
         if temp_fin_zoom.tz is None: temp_fin_zoom = temp_fin_zoom.tz_localize(idx_tz)
     
-    df_incidente_plot = df_incidente_plot.loc[temp_inicio_zoom:temp_fin_zoom].copy()
+    df_incidente_plot = df_incidente_plot.loc[temp_inicio_zoom:temp_fin_zoom]
     print(f"Datos filtrados: {len(df_incidente_plot)} filas desde {df_incidente_plot.index.min()} hasta {df_incidente_plot.index.max() if not df_incidente_plot.empty else 'N/A'}.")
+    return df_incidente_plot
 
-cols_generacion_fino_plot = [
-    'Hidraulica_MW', 'Nuclear_MW', 'CicloCombinado_MW', 'Eolica_MW',
-    'SolarFotovoltaica_MW', 'SolarTermica_MW', 'Carbon_MW', 'FuelGas_MW',
-    'TermicaRenovable_MW', 'CogeneracionYResiduos_MW' 
-]
-cols_generacion_fino_existentes = [col for col in cols_generacion_fino_plot if col in df_incidente_plot.columns and df_incidente_plot[col].notna().any()] if not df_incidente_plot.empty else []
-cols_generacion_mix_evolucion_horario = [
-    'Hidraulica_MW', 'Nuclear_MW', 'CicloCombinado_MW', 'Eolica_MW',
-    'SolarFotovoltaica_MW', 'SolarTermica_MW', 'Carbon_MW',
-    'TermicaRenovable_MW', 'Cogeneracion_PBF_MW', 
-    'ResiduosNoRen_PBF_MW' 
-]
+def obtener_df_incidente():
+    return _df_incidente_ventana(obtener_version_datos())
+
+@functools.lru_cache(maxsize=2)
+def _agregados_mix(version):
+    try:
+        agregados_mix = cargar_agregados_mix(DATA_DIR, lambda: cargar_frame(PATH_HORARIO_FINAL), PATH_HORARIO_FINAL)
+        if agregados_mix: print(f"Agregados del mix disponibles. Meses: {len(agregados_mix['mensual'])}, años: {len(agregados_mix['anual'])}")
+        return agregados_mix
+    except Exception as e:
+        print(f"Error cargando agregados del mix: {e}")
+        return {}
+
+def obtener_agregados_mix():
+    return _agregados_mix(obtener_version_datos())
+
+@functools.lru_cache(maxsize=2)
+def _catalogo_rampas(version):
+    # Catálogo histórico de rampas (sobre los DataFrames completos, no sobre la ventana del incidente)
+    try:
+        catalogo = cargar_catalogo(DATA_DIR, lambda: {'hour': cargar_frame(PATH_HORARIO_FINAL), 'fifteen_minutes': cargar_frame(PATH_INCIDENTE_DATOS)}, [PATH_HORARIO_FINAL, PATH_INCIDENTE_DATOS])
+        print(f"Catálogo de rampas disponible: {len(catalogo)} eventos.")
+        return catalogo
+    except Exception as e:
+        print(f"Error cargando el catálogo de rampas: {e}")
+        return pd.DataFrame()
+
+def obtener_catalogo_rampas():
+    return _catalogo_rampas(obtener_version_datos())
+
+# Explorador del histórico: presupuesto máximo de puntos por vista, repartido entre las series
+PUNTOS_MAX_EXPLORADOR = int(os.environ.get("PUNTOS_MAX_EXPLORADOR", "4000"))
+cols_explorador_defecto = ['DemandaReal_MW', 'Eolica_MW', 'SolarFotovoltaica_MW']
+cols_explorador_disponibles = [col for col in columnas_disponibles(PATH_HORARIO_FINAL) if col.endswith(('_MW', '_MWh', '_pct'))]
+
+# Cobertura e intensidad de CO2 a medida: tecnologías que el usuario puede clasificar como renovables o no emisoras
+tecnologias_clasificables = {'Hidraulica_MW': 'Hidráulica', 'Eolica_MW': 'Eólica', 'SolarFotovoltaica_MW': 'Solar FV', 'SolarTermica_MW': 'Solar Térmica', 'TermicaRenovable_MW': 'Térmica Renovable', 'Nuclear_MW': 'Nuclear', 'CogeneracionYResiduos_MW': 'Cogeneración y Residuos'}
+opciones_tecnologias = [{'label': etiqueta, 'value': col} for col, etiqueta in tecnologias_clasificables.items()]
+
+# Búsqueda de episodios similares: series que definen la forma de la ventana de referencia
+cols_similitud_defecto = ['DemandaReal_MW', 'Eolica_MW', 'SolarFotovoltaica_MW', 'SaldoIntercambios_MW', 'CoberturaRenovable_pct']
+colores_similitud = px.colors.qualitative.Plotly
+
+# Modo en directo (MODO_DIRECTO=1): sección con las últimas horas a 15 minutos que el navegador amplía con
+# los puntos nuevos (dcc.Interval + extendData) a medida que esios_api.py añade filas a ORIGEN_DIR
+MODO_DIRECTO = os.environ.get("MODO_DIRECTO", "0") == "1"
+series_directo = [('DemandaReal_MW', 'Demanda Real', 1), ('TotalGeneracion_MW', 'Generación Total', 1), ('Eolica_MW', 'Eolica', 1), ('SolarFotovoltaica_MW', 'SolarFotovoltaica', 1),
+                  ('CoberturaRenovable_pct', 'Cobertura Renovable', 2), ('CoberturaNoEmisora_pct', 'Cobertura No Emisora', 2),
+                  (col_rampa('DemandaReal_MW'), 'Rampa Demanda', 3), (col_rampa('Eolica_MW'), 'Rampa Eólica', 3), (col_rampa('SolarFotovoltaica_MW'), 'Rampa Solar FV', 3)]
+puntos_ventana_directo = int(VENTANA / PASO)
 
 app = dash.Dash(__name__, external_stylesheets=['https://codepen.io/chriddyp/pen/bWLwgP.css'])
 server = app.server
+# Métricas por callback en /metrics (formato Prometheus) y perfilado bajo demanda
+instrumentar(app)
 
 styles = {
     'h2': {'textAlign': 'center', 'color': '#34495e', 'marginBottom': '10px', 'borderBottom': '2px solid #bdc3c7', 'paddingBottom': '10px'},
@@ -99,116 +164,197 @@ styles = {
     'kpi_list_item': {'marginBottom': '5px'}
 }
 
-app.layout = html.Div(style={'backgroundColor': '#eef1f5', 'padding': '20px', 'fontFamily': 'Arial, sans-serif'}, children=[
-    html.Div(style={'backgroundColor': '#2c3e50', 'color': 'white', 'padding': '20px', 'textAlign': 'center', 'borderRadius': '8px', 'marginBottom': '30px'}, children=[
-        html.H1(children="Análisis Visual del Mix Energético Español", style={'margin': '0', 'fontSize': '2.2em'}),
-        html.P(["Dinámica Previa al Incidente del ", html.Strong("28 de Abril de 2025")], style={'margin': '8px 0 0 0', 'fontSize': '1em'})
-    ]),
-    html.Div(style={'maxWidth': '1200px', 'margin': 'auto', 'padding': '0 15px'}, children=[
-        html.P([
-            "Este dashboard explora la dinámica del sistema eléctrico español en los días previos al incidente de 'cero energético' del ",
-            html.Strong("28 de abril de 2025"),
-            ". Se analiza la evolución histórica del mix de generación y se detalla el comportamiento del sistema durante las horas críticas, ",
-            "enfocándose en la respuesta de las diferentes tecnologías, la cobertura de la demanda y los cambios abruptos (rampas) en la generación y la demanda."
-        ], style={**styles['paragraph'], 'textAlign': 'center', 'maxWidth': '900px', 'margin': '0 auto 30px auto', 'fontSize': '1.05em'}),
-        html.Div(style={'backgroundColor': 'white', 'padding': '25px', 'borderRadius': '8px', 'boxShadow': '0 2px 10px rgba(0,0,0,0.08)', 'marginBottom': '30px'}, children=[
-            html.H2("Evolución Histórica del Mix Energético (Media Mensual %)", style=styles['h2']),
-            html.P("La siguiente visualización muestra la transformación porcentual del mix energético peninsular durante los últimos 5 años. Permite identificar tendencias a largo plazo, como el crecimiento de fuentes renovables y la disminución de otras más convencionales, ofreciendo un contexto crucial para entender las condiciones previas al incidente.", style=styles['paragraph']),
-            dcc.Graph(id='evolucion-mix-horario'),
-            html.Div(id='kpi-evolucion-mix-texto', style=styles['kpi_box'])
-        ]),
-        html.Div(style={'backgroundColor': 'white', 'padding': '25px', 'borderRadius': '8px', 'boxShadow': '0 2px 10px rgba(0,0,0,0.08)', 'marginBottom': '20px'}, children=[
-            html.H2(f"Perfil Detallado del Incidente ({inicio_zoom_incidente_dt_global.strftime('%d-%b-%Y')} al {fin_zoom_incidente_dt_global.strftime('%d-%b-%Y')})", style=styles['h2']),
-            html.P(f"Análisis con granularidad de 15 minutos de la generación, demanda, intercambios y cobertura durante las horas críticas. El objetivo es entender la secuencia de eventos y las condiciones operativas inmediatamente previas y durante la interrupción del suministro.", style=styles['paragraph']),
-            html.H3("Mix de Generación (Absoluto y Porcentual)", style=styles['h3']),
-            html.P("El primer gráfico muestra la contribución absoluta (MW) de cada tecnología. El segundo normaliza la generación a 100% para visualizar las proporciones. Observe los patrones horarios y la respuesta general durante la caída de demanda del día 28 de abril alrededor de las 09:00.", style={**styles['paragraph'], 'fontStyle':'italic'}),
-            dcc.Graph(id='mix-generacion-incidente'),
-            dcc.Graph(id='mix-generacion-incidente-pct'),
-            html.H3("Demanda, Intercambios Internacionales y Precio del Mercado", style=styles['h3']),
-            html.P("Demanda Real (línea negra), Saldo de Intercambios (azul, positivo=importación) y Precio (€/MWh, verde). La línea roja punteada marca el inicio de la drástica caída de demanda. Estos datos ayudan a entender la presión sobre el sistema y su dependencia externa.", style={**styles['paragraph'], 'fontStyle':'italic'}),
-            dcc.Graph(id='demanda-intercambios-precio-incidente'),
-            html.Div(id='kpi-incidente-inicio-texto', style=styles['kpi_box']),
-            html.H3("Análisis de Rampas (Cambios Bruscos cada 15 min)", style=styles['h3']),
-            html.P("Las 'rampas' indican la magnitud del cambio en MW entre intervalos de 15 minutos. Valores altos (positivos o negativos) señalan cambios rápidos que el sistema debe gestionar, especialmente en la demanda y en fuentes variables como la eólica y solar. Estas rampas son cruciales para entender la estabilidad del sistema.", style={**styles['paragraph'], 'fontStyle':'italic'}),
-            dcc.Graph(id='rampas-incidente-plot'),
-            html.Div(id='kpi-rampas-maximas-texto', style=styles['kpi_box']),
-            html.H3("Cobertura de la Demanda", style=styles['h3']),
-            html.P("Este gráfico muestra qué porcentaje de la demanda fue cubierta por energías renovables y por energías no emisoras (renovables + nuclear). Valores por encima del 100% indican que la generación de ese tipo superó la demanda interna, lo que puede reflejar exportaciones o la necesidad de gestionar excedentes. Observe la alta cobertura previa al incidente y el efecto de la caída de demanda.", style={**styles['paragraph'], 'fontStyle':'italic'}),
-            dcc.Graph(id='cobertura-incidente'),
-            html.Div(id='kpi-cobertura-previa-texto', style=styles['kpi_box']),
+# Gráficos de mix: el servidor envía una sola vez las series en MW (a un dcc.Store) y el navegador
+# alterna entre MW y % apilando con groupnorm='percent', sin otra petición ni otra copia de los datos
+opciones_unidad_mix = [{'label': 'MW', 'value': 'MW'}, {'label': '%', 'value': 'pct'}]
+ejes_y_mix = {'MW': "Generación (MW)", 'pct': "Porcentaje de Generación (%)"}
+mostrar_mix_unidad_js = """
+function(figura, unidad) {
+    if (!figura) { return window.dash_clientside.no_update; }
+    const pct = unidad === 'pct';
+    const ejes = (figura.layout && figura.layout.meta && figura.layout.meta.ejes_y) || {};
+    const data = (figura.data || []).map((traza, i) => i === 0 ? Object.assign({}, traza, {groupnorm: pct ? 'percent' : ''}) : traza);
+    const yaxis = Object.assign({}, figura.layout.yaxis, {title: {text: pct ? ejes.pct : ejes.MW}, ticksuffix: pct ? '%' : ''});
+    return {data: data, layout: Object.assign({}, figura.layout, {yaxis: yaxis})};
+}
+"""
+
+def figura_directo():
+    # Solo el esqueleto (trazas vacías): los puntos llegan por extendData desde update_directo
+    fig = make_subplots(rows=3, cols=1, shared_xaxes=True, vertical_spacing=0.06, subplot_titles=("Demanda y Generación (MW)", "Cobertura de la Demanda (%)", "Rampas (MW/15min)"))
+    for col, nombre, fila in series_directo:
+        fig.add_trace(go.Scatter(x=[], y=[], mode='lines', name=nombre, line=dict(color=color_palette.get(nombre)), hoverinfo='x+y+name'), row=fila, col=1)
+    fig.add_hline(y=100, line_dash="dash", line_color="grey", row=2, col=1)
+    fig.update_layout(uirevision='directo', height=700, hovermode="x unified", legend=dict(orientation="h", yanchor="bottom", y=1.03, xanchor="center", x=0.5, font=dict(size=9)))
+    return fig
+
+def seccion_directo():
+    return html.Div(style={'backgroundColor': 'white', 'padding': '25px', 'borderRadius': '8px', 'boxShadow': '0 2px 10px rgba(0,0,0,0.08)', 'marginBottom': '30px'}, children=[
+        html.H2(f"Sistema en Directo (Últimas {VENTANA / pd.Timedelta(hours=1):.0f} h, cada 15 min)", style=styles['h2']),
+        html.P("Datos a 15 minutos que se amplían solos a medida que se publican en e·sios. Solo se muestran los intervalos que ya han publicado todos los indicadores; el servidor envía únicamente los puntos nuevos.", style=styles['paragraph']),
+        dcc.Interval(id='directo-intervalo', interval=max(INTERVALO_SONDEO_S, 15) * 1000),
+        dcc.Store(id='directo-cursor'),
+        dcc.Graph(id='directo-grafico', figure=figura_directo()),
+        html.Div(id='directo-mes-texto', style=styles['kpi_box'])
+    ])
+
+@functools.lru_cache(maxsize=4)
+def obtener_kpis(version_datos):
+    # Todos los KPIs en una pasada; se recalculan solo si cambia la versión de los datos
+    return calcular_kpis(obtener_df_horario(), obtener_df_incidente(), obtener_agregados_mix(), obtener_catalogo_rampas())
+
+def serve_layout(kpis=None):
+    if kpis is None: kpis = obtener_kpis(obtener_version_datos())
+    return html.Div(style={'backgroundColor': '#eef1f5', 'padding': '20px', 'fontFamily': 'Arial, sans-serif'}, children=[
+        html.Div(style={'backgroundColor': '#2c3e50', 'color': 'white', 'padding': '20px', 'textAlign': 'center', 'borderRadius': '8px', 'marginBottom': '30px'}, children=[
+            html.H1(children="Análisis Visual del Mix Energético Español", style={'margin': '0', 'fontSize': '2.2em'}),
+            html.P(["Dinámica Previa al Incidente del ", html.Strong("28 de Abril de 2025")], style={'margin': '8px 0 0 0', 'fontSize': '1em'})
         ]),
-        html.Div(style={'backgroundColor': 'white', 'padding': '25px', 'borderRadius': '8px', 'boxShadow': '0 2px 10px rgba(0,0,0,0.08)', 'marginBottom': '20px'}, children=[
-            html.H2("Conclusiones Principales y Respuesta a Preguntas Clave", style=styles['h2']),
-            dcc.Markdown("""
-                Este análisis visual del mix energético español, centrado en el incidente del 28 de abril de 2025, permite extraer varias conclusiones:
-
-                *   **Perfil del Incidente:**
-                    *   La **secuencia de eventos** muestra una operación con alta participación renovable en las horas previas, seguida de una **caída abrupta de la demanda** el 28 de abril alrededor de las 09:00. El mix de generación se ve afectado de forma generalizada, como se observa en la reducción de la producción de la mayoría de las fuentes.
-                    *   Se observan **rampas significativas** en la generación eólica y solar en las horas previas, y una rampa negativa muy pronunciada en la demanda durante el inicio del incidente. Las fuentes gestionables como la hidráulica también muestran rampas considerables, indicando su papel en la regulación del sistema.
-                *   **Condiciones de Operación Previas:**
-                    *   El sistema operaba con **porcentajes de cobertura renovable y no emisora consistentemente altos** (frecuentemente >100%, llegando a picos elevados durante la caída de demanda debido al colapso del consumo) en los días y horas inmediatamente anteriores al evento. Esto indica un sistema con alta capacidad de generación limpia en ese momento.
-                    *   El comportamiento del sistema muestra la complejidad de gestionar un mix con alta penetración renovable durante eventos críticos.
-                *   **Análisis de Estrés:**
-                    *   Los datos permiten observar la respuesta del sistema ante cambios bruscos en la demanda y la participación de diferentes tecnologías en la regulación.
-                *   **Evolución Contextual:**
-                    *   El mix energético español ha mostrado una **clara tendencia hacia una mayor penetración de fuentes renovables** en los últimos 5 años, con un aumento notable de la eólica y solar, y una disminución del carbón. Esto establece el contexto de un sistema en transición hacia una mayor dependencia de fuentes variables.
-
-                Esta visualización interactiva sirve como herramienta para entender la complejidad de la gestión de un sistema eléctrico con alta penetración renovable y las dinámicas que podrían preceder a un evento crítico, facilitando la exploración de los datos para responder a preguntas clave sobre la resiliencia y la transición energética.
-            """, style={**styles['paragraph'], 'textAlign':'left'})
+        html.Div(style={'maxWidth': '1200px', 'margin': 'auto', 'padding': '0 15px'}, children=[
+            html.P([
+                "Este dashboard explora la dinámica del sistema eléctrico español en los días previos al incidente de 'cero energético' del ",
+                html.Strong("28 de abril de 2025"),
+                ". Se analiza la evolución histórica del mix de generación y se detalla el comportamiento del sistema durante las horas críticas, ",
+                "enfocándose en la respuesta de las diferentes tecnologías, la cobertura de la demanda y los cambios abruptos (rampas) en la generación y la demanda."
+            ], style={**styles['paragraph'], 'textAlign': 'center', 'maxWidth': '900px', 'margin': '0 auto 30px auto', 'fontSize': '1.05em'}),
+            *([seccion_directo()] if MODO_DIRECTO else []),
+            html.Div(style={'backgroundColor': 'white', 'padding': '25px', 'borderRadius': '8px', 'boxShadow': '0 2px 10px rgba(0,0,0,0.08)', 'marginBottom': '30px'}, children=[
+                html.H2("Evolución Histórica del Mix Energético (Media Mensual)", style=styles['h2']),
+                html.P("La siguiente visualización muestra la transformación del mix energético peninsular durante los últimos 5 años, en porcentaje de la generación o en potencia media (MW). Permite identificar tendencias a largo plazo, como el crecimiento de fuentes renovables y la disminución de otras más convencionales, ofreciendo un contexto crucial para entender las condiciones previas al incidente.", style=styles['paragraph']),
+                dcc.RadioItems(id='evolucion-mix-unidad', options=opciones_unidad_mix, value='pct', inline=True),
+                dcc.Store(id='evolucion-mix-datos'),
+                dcc.Graph(id='evolucion-mix-horario'),
+                html.Div(render_kpi_evolucion_mix(kpis['evolucion']), id='kpi-evolucion-mix-texto', style=styles['kpi_box'])
+            ]),
+            html.Div(style={'backgroundColor': 'white', 'padding': '25px', 'borderRadius': '8px', 'boxShadow': '0 2px 10px rgba(0,0,0,0.08)', 'marginBottom': '30px'}, children=[
+                html.H2("Explorador del Histórico Horario", style=styles['h2']),
+                html.P(f"Series horarias completas de los últimos 5 años. Para mantener el gráfico fluido se envían como máximo {PUNTOS_MAX_EXPLORADOR} puntos por vista: 'Mín/Máx' conserva los picos de cada tramo (rampas, caídas de demanda) y 'LTTB' la forma de la curva. Al hacer zoom se vuelve a consultar solo la ventana visible con más resolución.", style=styles['paragraph']),
+                html.Div(style={'display': 'flex', 'gap': '20px', 'alignItems': 'center'}, children=[
+                    dcc.Dropdown(id='explorador-series', options=[{'label': col.replace('_MW', ' (MW)').replace('_pct', ' (%)').replace('_EUR_MWh', ' (€/MWh)'), 'value': col} for col in cols_explorador_disponibles], value=[col for col in cols_explorador_defecto if col in cols_explorador_disponibles], multi=True, style={'flex': '1'}),
+                    dcc.RadioItems(id='explorador-metodo', options=[{'label': 'Mín/Máx', 'value': 'minmax'}, {'label': 'LTTB', 'value': 'lttb'}], value='minmax', inline=True)
+                ]),
+                dcc.Store(id='explorador-rango'),
+                dcc.Graph(id='explorador-historico')
+            ]),
+            html.Div(style={'backgroundColor': 'white', 'padding': '25px', 'borderRadius': '8px', 'boxShadow': '0 2px 10px rgba(0,0,0,0.08)', 'marginBottom': '30px'}, children=[
+                html.H2("Análisis de una Ventana Personalizada", style=styles['h2']),
+                html.P("Seleccione cualquier intervalo de fechas para comparar el mix de generación y la demanda con el periodo del incidente. Solo se leen del almacén particionado los meses, grupos de filas y columnas que necesita la ventana elegida.", style=styles['paragraph']),
+                html.Div(style={'display': 'flex', 'gap': '20px', 'alignItems': 'center'}, children=[
+                    dcc.DatePickerRange(id='ventana-fechas', start_date=inicio_zoom_incidente_dt_global.date(), end_date=fin_zoom_incidente_dt_global.date(), display_format='DD/MM/YYYY', first_day_of_week=1),
+                    dcc.RadioItems(id='ventana-resolucion', options=[{'label': 'Horaria', 'value': 'hour'}, {'label': '15 minutos', 'value': 'fifteen_minutes'}], value='hour', inline=True)
+                ]),
+                dcc.Graph(id='ventana-mix')
+            ]),
+            html.Div(style={'backgroundColor': 'white', 'padding': '25px', 'borderRadius': '8px', 'boxShadow': '0 2px 10px rgba(0,0,0,0.08)', 'marginBottom': '30px'}, children=[
+                html.H2("Cobertura e Intensidad de CO2 a Medida", style=styles['h2']),
+                html.P("Cobertura de la demanda e intensidad de CO2 de la generación (g/kWh, a partir del factor de emisión publicado por e·sios) para cualquier ventana, calculadas al momento desde la generación de cada tecnología. Elija qué tecnologías cuentan como renovables y cuáles como no emisoras (por ejemplo, excluir la hidráulica o la térmica renovable) para comparar definiciones sin reconstruir los datos.", style=styles['paragraph']),
+                html.Div(style={'display': 'flex', 'gap': '20px', 'alignItems': 'center'}, children=[
+                    dcc.DatePickerRange(id='cobertura-ventana-fechas', start_date=inicio_zoom_incidente_dt_global.date(), end_date=fin_zoom_incidente_dt_global.date(), display_format='DD/MM/YYYY', first_day_of_week=1),
+                    dcc.RadioItems(id='cobertura-ventana-resolucion', options=[{'label': 'Horaria', 'value': 'hour'}, {'label': '15 minutos', 'value': 'fifteen_minutes'}], value='hour', inline=True)
+                ]),
+                html.Div(style={'marginTop': '10px', 'fontSize': '0.9em'}, children=[
+                    html.Div([html.Strong("Renovables: "), dcc.Checklist(id='cobertura-renovables', options=opciones_tecnologias, value=COLS_RENOVABLES, inline=True, style={'display': 'inline-block'})]),
+                    html.Div([html.Strong("No emisoras: "), dcc.Checklist(id='cobertura-no-emisoras', options=opciones_tecnologias, value=COLS_NO_EMISORAS, inline=True, style={'display': 'inline-block'})])
+                ]),
+                dcc.Graph(id='cobertura-ventana'),
+                html.Div(id='cobertura-ventana-texto', style=styles['kpi_box'])
+            ]),
+            html.Div(style={'backgroundColor': 'white', 'padding': '25px', 'borderRadius': '8px', 'boxShadow': '0 2px 10px rgba(0,0,0,0.08)', 'marginBottom': '20px'}, children=[
+                html.H2(f"Perfil Detallado del Incidente ({inicio_zoom_incidente_dt_global.strftime('%d-%b-%Y')} al {fin_zoom_incidente_dt_global.strftime('%d-%b-%Y')})", style=styles['h2']),
+                html.P(f"Análisis con granularidad de 15 minutos de la generación, demanda, intercambios y cobertura durante las horas críticas. El objetivo es entender la secuencia de eventos y las condiciones operativas inmediatamente previas y durante la interrupción del suministro.", style=styles['paragraph']),
+                html.H3("Mix de Generación (Absoluto y Porcentual)", style=styles['h3']),
+                html.P("En MW el gráfico muestra la contribución absoluta de cada tecnología; en % normaliza la generación a 100% para visualizar las proporciones. Observe los patrones horarios y la respuesta general durante la caída de demanda del día 28 de abril alrededor de las 09:00.", style={**styles['paragraph'], 'fontStyle':'italic'}),
+                dcc.RadioItems(id='mix-generacion-incidente-unidad', options=opciones_unidad_mix, value='MW', inline=True),
+                dcc.Store(id='mix-generacion-incidente-datos'),
+                dcc.Graph(id='mix-generacion-incidente'),
+                html.H3("Demanda, Intercambios Internacionales y Precio del Mercado", style=styles['h3']),
+                html.P("Demanda Real (línea negra), Saldo de Intercambios (azul, positivo=importación) y Precio (€/MWh, verde). La línea roja punteada marca el inicio de la drástica caída de demanda. Estos datos ayudan a entender la presión sobre el sistema y su dependencia externa.", style={**styles['paragraph'], 'fontStyle':'italic'}),
+                dcc.Graph(id='demanda-intercambios-precio-incidente'),
+                html.Div(render_kpi_incidente_inicio(kpis['incidente_inicio']), id='kpi-incidente-inicio-texto', style=styles['kpi_box']),
+                html.H3("Análisis de Rampas (Cambios Bruscos cada 15 min)", style=styles['h3']),
+                html.P("Las 'rampas' indican la magnitud del cambio en MW entre intervalos de 15 minutos. Valores altos (positivos o negativos) señalan cambios rápidos que el sistema debe gestionar, especialmente en la demanda y en fuentes variables como la eólica y solar. Estas rampas son cruciales para entender la estabilidad del sistema.", style={**styles['paragraph'], 'fontStyle':'italic'}),
+                dcc.Graph(id='rampas-incidente-plot'),
+                html.Div(render_kpi_rampas(kpis['rampas']), id='kpi-rampas-maximas-texto', style=styles['kpi_box']),
+                html.P("Comparativa de la mayor rampa del periodo (a 1 h, 4 h y 24 h) con las mayores rampas horarias de todo el histórico: el puesto indica qué posición ocuparía entre los mayores eventos del mismo signo registrados en los últimos 5 años.", style={**styles['paragraph'], 'fontStyle':'italic'}),
+                html.Div(render_tabla_rampas_historico(kpis['comparativa_rampas']), id='tabla-rampas-historico'),
+                html.H3("Cobertura de la Demanda", style=styles['h3']),
+                html.P("Este gráfico muestra qué porcentaje de la demanda fue cubierta por energías renovables y por energías no emisoras (renovables + nuclear). Valores por encima del 100% indican que la generación de ese tipo superó la demanda interna, lo que puede reflejar exportaciones o la necesidad de gestionar excedentes. Observe la alta cobertura previa al incidente y el efecto de la caída de demanda.", style={**styles['paragraph'], 'fontStyle':'italic'}),
+                dcc.Graph(id='cobertura-incidente'),
+                html.Div(render_kpi_cobertura_previa(kpis['cobertura']), id='kpi-cobertura-previa-texto', style=styles['kpi_box']),
+            ]),
+            html.Div(style={'backgroundColor': 'white', 'padding': '25px', 'borderRadius': '8px', 'boxShadow': '0 2px 10px rgba(0,0,0,0.08)', 'marginBottom': '20px'}, children=[
+                html.H2("Búsqueda de Episodios Similares en el Histórico", style=styles['h2']),
+                html.P("¿Cuándo más se comportó el sistema así? Se toma como referencia la ventana elegida y se buscan en todo el histórico los periodos de la misma duración con la forma más parecida en las series seleccionadas (distancia entre ventanas normalizadas, de modo que cuenta el perfil y no el nivel). Los episodios no se solapan entre sí ni con la referencia. La similitud es la correlación media entre la referencia y el episodio en las series comparadas.", style=styles['paragraph']),
+                html.Div(style={'display': 'flex', 'gap': '20px', 'alignItems': 'center', 'flexWrap': 'wrap'}, children=[
+                    dcc.DatePickerRange(id='similitud-fechas', start_date=inicio_zoom_incidente_dt_global.date(), end_date=fin_zoom_incidente_dt_global.date(), display_format='DD/MM/YYYY', first_day_of_week=1),
+                    dcc.RadioItems(id='similitud-resolucion', options=[{'label': 'Horaria', 'value': 'hour'}, {'label': '15 minutos', 'value': 'fifteen_minutes'}], value='hour', inline=True),
+                    dcc.Dropdown(id='similitud-k', options=[{'label': f"Top {k}", 'value': k} for k in (5, TOP_K, 20)], value=TOP_K, clearable=False, style={'width': '110px'})
+                ]),
+                dcc.Dropdown(id='similitud-series', options=[{'label': col.replace('_MW', ' (MW)').replace('_pct', ' (%)').replace('_EUR_MWh', ' (€/MWh)'), 'value': col} for col in cols_explorador_disponibles], value=[col for col in cols_similitud_defecto if col in cols_explorador_disponibles], multi=True, style={'marginTop': '10px'}),
+                html.Div(id='similitud-tabla', style={'marginTop': '15px'}),
+                dcc.Graph(id='similitud-grafico')
+            ]),
+            html.Div(style={'backgroundColor': 'white', 'padding': '25px', 'borderRadius': '8px', 'boxShadow': '0 2px 10px rgba(0,0,0,0.08)', 'marginBottom': '20px'}, children=[
+                html.H2("Conclusiones Principales y Respuesta a Preguntas Clave", style=styles['h2']),
+                dcc.Markdown("""
+                    Este análisis visual del mix energético español, centrado en el incidente del 28 de abril de 2025, permite extraer varias conclusiones:
+
+                    *   **Perfil del Incidente:**
+                        *   La **secuencia de eventos** muestra una operación con alta participación renovable en las horas previas, seguida de una **caída abrupta de la demanda** el 28 de abril alrededor de las 09:00. El mix de generación se ve afectado de forma generalizada, como se observa en la reducción de la producción de la mayoría de las fuentes.
+                        *   Se observan **rampas significativas** en la generación eólica y solar en las horas previas, y una rampa negativa muy pronunciada en la demanda durante el inicio del incidente. Las fuentes gestionables como la hidráulica también muestran rampas considerables, indicando su papel en la regulación del sistema.
+                    *   **Condiciones de Operación Previas:**
+                        *   El sistema operaba con **porcentajes de cobertura renovable y no emisora consistentemente altos** (frecuentemente >100%, llegando a picos elevados durante la caída de demanda debido al colapso del consumo) en los días y horas inmediatamente anteriores al evento. Esto indica un sistema con alta capacidad de generación limpia en ese momento.
+                        *   El comportamiento del sistema muestra la complejidad de gestionar un mix con alta penetración renovable durante eventos críticos.
+                    *   **Análisis de Estrés:**
+                        *   Los datos permiten observar la respuesta del sistema ante cambios bruscos en la demanda y la participación de diferentes tecnologías en la regulación.
+                    *   **Evolución Contextual:**
+                        *   El mix energético español ha mostrado una **clara tendencia hacia una mayor penetración de fuentes renovables** en los últimos 5 años, con un aumento notable de la eólica y solar, y una disminución del carbón. Esto establece el contexto de un sistema en transición hacia una mayor dependencia de fuentes variables.
+
+                    Esta visualización interactiva sirve como herramienta para entender la complejidad de la gestión de un sistema eléctrico con alta penetración renovable y las dinámicas que podrían preceder a un evento crítico, facilitando la exploración de los datos para responder a preguntas clave sobre la resiliencia y la transición energética.
+                """, style={**styles['paragraph'], 'textAlign':'left'})
+            ])
         ])
     ])
-])
 
-@app.callback(Output('evolucion-mix-horario', 'figure'), [Input('evolucion-mix-horario', 'id')])
+@app.callback(Output('evolucion-mix-datos', 'data'), [Input('evolucion-mix-datos', 'id')])
+@cachear_resultado('update_evolucion_mix', obtener_version_datos)
 def update_evolucion_mix(_):
+    df_horario = obtener_df_horario()
+    agregados_mix = obtener_agregados_mix()
     if df_horario is None or df_horario.empty: return go.Figure().update_layout(title_text="Evolución Mix: Datos horarios no disponibles.", title_x=0.5)
-    df_evol_mix = df_horario.copy()
-    cols_gen_exist_evol = [col for col in cols_generacion_mix_evolucion_horario if col in df_evol_mix.columns and df_evol_mix[col].notna().any()]
+    df_mix_mensual = agregados_mix.get('mensual')
+    cols_gen_exist_evol = [col for col in cols_generacion_mix_evolucion_horario if df_mix_mensual is not None and col in df_mix_mensual.columns]
     if not cols_gen_exist_evol: return go.Figure().update_layout(title_text="Evolución Mix: Columnas de generación insuficientes.", title_x=0.5)
-    df_evol_mix[cols_gen_exist_evol] = df_evol_mix[cols_gen_exist_evol].fillna(0)
-    col_total_gen_horario_actual = 'TotalGeneracion_MW' if 'TotalGeneracion_MW' in df_evol_mix.columns else ('TotalGeneracionMix_MW_Horario' if 'TotalGeneracionMix_MW_Horario' in df_evol_mix.columns else None)
-    if not col_total_gen_horario_actual or col_total_gen_horario_actual not in df_evol_mix.columns:
-        df_evol_mix['CalculatedTotalGen_horario'] = df_evol_mix[cols_gen_exist_evol].sum(axis=1)
-        col_total_gen_horario_actual = 'CalculatedTotalGen_horario'
-    df_evol_mix_filtrado = df_evol_mix[df_evol_mix[col_total_gen_horario_actual] > 0]
-    if df_evol_mix_filtrado.empty: return go.Figure().update_layout(title_text="Evolución Mix: No hay datos con generación positiva.", title_x=0.5)
-    df_mix_mensual = df_evol_mix_filtrado.resample('ME')[cols_gen_exist_evol + [col_total_gen_horario_actual]].mean()
-    df_mix_mensual = df_mix_mensual[df_mix_mensual[col_total_gen_horario_actual].notna() & (df_mix_mensual[col_total_gen_horario_actual] > 1000)]
     if df_mix_mensual.empty: return go.Figure().update_layout(title_text="Evolución Mix: No hay datos mensuales suficientes tras filtrar.", title_x=0.5)
     fig = go.Figure()
     for col in cols_gen_exist_evol:
         nombre_tecnologia_leyenda = col.replace('_MW', '').replace('_PBF','').replace('_TReal','').replace('ResiduosNoRen','Residuos No Ren.').replace('Cogeneracion','Cogen.')
-        if col_total_gen_horario_actual in df_mix_mensual.columns and not df_mix_mensual[col_total_gen_horario_actual].eq(0).all():
-            total_gen_series = df_mix_mensual[col_total_gen_horario_actual]
-            col_pct_evol = np.where(total_gen_series == 0, 0, (df_mix_mensual[col] / total_gen_series) * 100)
-            fig.add_trace(go.Scatter(x=df_mix_mensual.index, y=col_pct_evol, mode='lines', name=nombre_tecnologia_leyenda, stackgroup='one', hoverinfo='x+y+name', line=dict(color=color_palette.get(nombre_tecnologia_leyenda))))
-    fig.update_layout(xaxis_title="Mes", yaxis_title="Porcentaje de Generación (%)", yaxis_ticksuffix="%", height=500, legend_title_text='Tecnología', hovermode="x unified", legend=dict(orientation="h", yanchor="bottom", y=1.05, xanchor="center", x=0.5, font=dict(size=9)))
+        fig.add_trace(go.Scatter(x=df_mix_mensual.index, y=df_mix_mensual[col], mode='lines', name=nombre_tecnologia_leyenda, stackgroup='one', hoverinfo='x+y+name', line=dict(color=color_palette.get(nombre_tecnologia_leyenda))))
+    fig.update_layout(xaxis_title="Mes", yaxis_title=ejes_y_mix['MW'], meta={'ejes_y': ejes_y_mix}, height=500, legend_title_text='Tecnología', hovermode="x unified", legend=dict(orientation="h", yanchor="bottom", y=1.05, xanchor="center", x=0.5, font=dict(size=9)))
     return fig
 
-@app.callback(Output('mix-generacion-incidente', 'figure'),[Input('mix-generacion-incidente', 'id')])
+app.clientside_callback(mostrar_mix_unidad_js, Output('evolucion-mix-horario', 'figure'), [Input('evolucion-mix-datos', 'data'), Input('evolucion-mix-unidad', 'value')])
+
+@app.callback(Output('mix-generacion-incidente-datos', 'data'),[Input('mix-generacion-incidente-datos', 'id')])
+@cachear_resultado('update_mix_generacion_fino', obtener_version_datos)
 def update_mix_generacion_fino(_):
+    df_incidente_plot = obtener_df_incidente()
+    cols_generacion_fino_existentes = [col for col in cols_generacion_fino_plot if col in df_incidente_plot.columns and df_incidente_plot[col].notna().any()]
     if df_incidente_plot.empty or not cols_generacion_fino_existentes: return go.Figure().update_layout(title_text="Mix Generación Incidente: Datos no disponibles", title_x=0.5)
     fig = go.Figure()
     df_plot_gen = df_incidente_plot[cols_generacion_fino_existentes].fillna(0)
     for col in cols_generacion_fino_existentes:
         nombre_leyenda = col.replace('_MW','').replace('YResto_TReal',' & Resto').replace('FuelGas','Fuel/Gas')
         fig.add_trace(go.Scatter(x=df_plot_gen.index, y=df_plot_gen[col], hoverinfo='x+y+name', mode='lines', name=nombre_leyenda, stackgroup='one', line=dict(color=color_palette.get(nombre_leyenda))))
-    fig.update_layout(title_text=None, xaxis_title="Fecha y Hora", yaxis_title="Generación (MW)", legend_title_text='Tecnología', hovermode="x unified", height=500, legend=dict(orientation="h", yanchor="bottom", y=1.05, xanchor="center", x=0.5, font=dict(size=9)))
+    fig.update_layout(title_text=None, xaxis_title="Fecha y Hora", yaxis_title=ejes_y_mix['MW'], meta={'ejes_y': ejes_y_mix}, legend_title_text='Tecnología', hovermode="x unified", height=500, legend=dict(orientation="h", yanchor="bottom", y=1.05, xanchor="center", x=0.5, font=dict(size=9)))
     return fig
 
-@app.callback(Output('mix-generacion-incidente-pct', 'figure'),[Input('mix-generacion-incidente-pct', 'id')])
-def update_mix_generacion_fino_pct_simple(_):
-    if df_incidente_plot.empty or not cols_generacion_fino_existentes: return go.Figure().update_layout(title_text="Mix Generación (%): Datos no disponibles", title_x=0.5)
-    fig_pct = go.Figure()
-    df_plot_gen = df_incidente_plot[cols_generacion_fino_existentes].fillna(0) 
-    for col in cols_generacion_fino_existentes:
-        nombre_leyenda = col.replace('_MW','').replace('YResto_TReal',' & Resto').replace('FuelGas','Fuel/Gas')
-        fig_pct.add_trace(go.Scatter(x=df_plot_gen.index, y=df_plot_gen[col], hoverinfo='x+y+name', mode='lines', name=nombre_leyenda, stackgroup='one', line=dict(color=color_palette.get(nombre_leyenda))))
-    fig_pct.update_layout(title_text=None, xaxis_title="Fecha y Hora", yaxis_title="Porcentaje de Generación (%)", yaxis_ticksuffix="%", legend_title_text='Tecnología', hovermode="x unified", height=500, legend=dict(orientation="h", yanchor="bottom", y=1.05, xanchor="center", x=0.5, font=dict(size=9)))
-    return fig_pct
+app.clientside_callback(mostrar_mix_unidad_js, Output('mix-generacion-incidente', 'figure'), [Input('mix-generacion-incidente-datos', 'data'), Input('mix-generacion-incidente-unidad', 'value')])
 
 @app.callback(Output('demanda-intercambios-precio-incidente', 'figure'),[Input('demanda-intercambios-precio-incidente', 'id')])
+@cachear_resultado('update_demanda_interc_precio_fino', obtener_version_datos)
 def update_demanda_interc_precio_fino(_):
+    df_incidente_plot = obtener_df_incidente()
     if df_incidente_plot.empty: return go.Figure().update_layout(title_text="Demanda/Intercambios/Precio: Datos no disponibles", title_x=0.5)
     fig = make_subplots(specs=[[{"secondary_y": True}]])
     if 'DemandaReal_MW' in df_incidente_plot.columns:
@@ -251,32 +397,32 @@ def update_demanda_interc_precio_fino(_):
     return fig
 
 @app.callback(Output('rampas-incidente-plot', 'figure'),[Input('rampas-incidente-plot', 'id')])
+@cachear_resultado('update_rampas_fino', obtener_version_datos)
 def update_rampas_fino(_):
+    df_incidente_plot = obtener_df_incidente()
     if df_incidente_plot.empty: return go.Figure().update_layout(title_text="Rampas: Datos no disponibles", title_x=0.5)
     fig_rampas = make_subplots(rows=3, cols=1, shared_xaxes=True, vertical_spacing=0.08, subplot_titles=("Rampa Demanda Real", "Rampa Eólica", "Rampa Solar FV"))
-    df_rampas_plot = df_incidente_plot.copy()
-    max_rampas_info = []
     rampa_cols_map = {'DemandaReal_MW': 'Demanda', 'Eolica_MW': 'Eólica', 'SolarFotovoltaica_MW': 'Solar FV'}
+    cols_rampa_existentes = [col for col in rampa_cols_map if col in df_incidente_plot.columns]
+    df_rampas_plot = calcular_rampas(df_incidente_plot, cols_rampa_existentes, '15min')
+    max_rampas = maximos_absolutos(df_incidente_plot, cols_rampa_existentes, '15min')
     
     for i, (col_orig, label) in enumerate(rampa_cols_map.items()):
         if col_orig in df_rampas_plot.columns:
-            rampa_col_name = f'Rampa_{label.replace(" ","_")}'
-            df_rampas_plot[rampa_col_name] = df_rampas_plot[col_orig].diff()
             line_color = color_palette.get(label, 'grey')
-            fig_rampas.add_trace(go.Scatter(x=df_rampas_plot.index, y=df_rampas_plot[rampa_col_name], name=f"Rampa {label}", line=dict(color=line_color), hoverinfo='x+y+name'), row=i+1, col=1)
-            if df_rampas_plot[rampa_col_name].notna().any():
-                idx_max_abs = df_rampas_plot[rampa_col_name].abs().idxmax()
-                if pd.notna(idx_max_abs):
-                    val_max_rampa = df_rampas_plot.loc[idx_max_abs, rampa_col_name]
-                    if pd.notna(val_max_rampa):
-                        fig_rampas.add_annotation(x=idx_max_abs, y=val_max_rampa, text=f"Max: {val_max_rampa:.0f}", showarrow=True, arrowhead=1, row=i+1, col=1, font=dict(size=9), ax=20, ay=-20 if val_max_rampa > 0 else 20)
+            fig_rampas.add_trace(go.Scatter(x=df_rampas_plot.index, y=df_rampas_plot[col_orig], name=f"Rampa {label}", line=dict(color=line_color), hoverinfo='x+y+name'), row=i+1, col=1)
+            if col_orig in max_rampas:
+                idx_max_abs, val_max_rampa = max_rampas[col_orig]
+                fig_rampas.add_annotation(x=idx_max_abs, y=val_max_rampa, text=f"Max: {val_max_rampa:.0f}", showarrow=True, arrowhead=1, row=i+1, col=1, font=dict(size=9), ax=20, ay=-20 if val_max_rampa > 0 else 20)
     
     fig_rampas.update_layout(title_text=None, height=600, showlegend=False, hovermode="x unified")
     for i in range(1,4): fig_rampas.update_yaxes(title_text="MW/15min", row=i, col=1)
     return fig_rampas
 
 @app.callback(Output('cobertura-incidente', 'figure'),[Input('cobertura-incidente', 'id')])
+@cachear_resultado('update_cobertura_fino', obtener_version_datos)
 def update_cobertura_fino(_):
+    df_incidente_plot = obtener_df_incidente()
     cols_cobertura_plot = []
     if 'CoberturaRenovable_pct' in df_incidente_plot.columns: cols_cobertura_plot.append('CoberturaRenovable_pct')
     if 'CoberturaNoEmisora_pct' in df_incidente_plot.columns: cols_cobertura_plot.append('CoberturaNoEmisora_pct')
@@ -307,105 +453,252 @@ def update_cobertura_fino(_):
     fig.update_layout(title_text=None, xaxis_title="Fecha y Hora", yaxis_title="Cobertura (%)", hovermode="x unified", height=450, yaxis_ticksuffix="%", legend=dict(orientation="h", yanchor="bottom", y=1.05, xanchor="center", x=0.5, font=dict(size=10)), yaxis_range=[0, final_y_max])
     return fig
 
-@app.callback(Output('kpi-evolucion-mix-texto', 'children'), [Input('evolucion-mix-horario', 'figure')])
-def update_kpi_evolucion_mix(_):
-    if df_horario is None or df_horario.empty: return html.P("KPIs de evolución no disponibles.", style=styles['kpi_list_item'])
+def rango_desde_relayout(relayout_data, rango_previo):
+    # Ventana visible del eje x: la de relayoutData si trae el eje x, None si vuelve a autorango y, si el
+    # cambio no toca el eje x (modo pan de la barra de herramientas, zoom solo en y...), la última conocida
+    relayout_data = relayout_data or {}
+    if relayout_data.get('xaxis.autorange'): return None
+    rango = relayout_data.get('xaxis.range') or [relayout_data.get('xaxis.range[0]'), relayout_data.get('xaxis.range[1]')]
+    if rango[0] is None or rango[1] is None: return rango_previo
+    return [str(rango[0]), str(rango[1])]
+
+@app.callback([Output('explorador-historico', 'figure'), Output('explorador-rango', 'data')], [Input('explorador-series', 'value'), Input('explorador-metodo', 'value'), Input('explorador-historico', 'relayoutData')], [State('explorador-rango', 'data')])
+def update_explorador_historico(columnas, metodo, relayout_data, rango_previo):
+    rango = rango_desde_relayout(relayout_data, rango_previo)
+    if not columnas: return go.Figure().update_layout(title_text="Explorador: seleccione al menos una serie.", title_x=0.5), rango
+    df_horario = obtener_df_horario(columnas)
+    if df_horario is None or df_horario.empty: return go.Figure().update_layout(title_text="Explorador: Datos horarios no disponibles.", title_x=0.5), rango
+    inicio, fin = (None, None) if rango is None else (pd.Timestamp(rango[0]), pd.Timestamp(rango[1]))
+    if rango is not None and df_horario.index.tz is not None: inicio, fin = inicio.tz_localize(df_horario.index.tz), fin.tz_localize(df_horario.index.tz)
+    series = reducir_ventana(df_horario, columnas, PUNTOS_MAX_EXPLORADOR, inicio, fin, metodo if metodo in METODOS else 'minmax')
+    fig = go.Figure()
+    for col, serie in series.items():
+        nombre = col.replace('_MW', '')
+        fig.add_trace(go.Scattergl(x=serie.index, y=serie.values, mode='lines', name=nombre, line=dict(color=color_palette.get(nombre)), hoverinfo='x+y+name'))
+    n_puntos = sum(len(serie) for serie in series.values())
+    # uirevision mantiene el zoom del usuario mientras se sustituyen los datos por los de la ventana visible
+    fig.update_layout(uirevision='explorador', xaxis_title="Fecha y Hora", height=450, hovermode="x unified", legend=dict(orientation="h", yanchor="bottom", y=1.05, xanchor="center", x=0.5, font=dict(size=10)),
+                      annotations=[dict(text=f"{n_puntos} puntos mostrados", xref='paper', yref='paper', x=1, y=-0.18, showarrow=False, font=dict(size=9, color='#777'))])
+    return fig, rango
+
+def leer_ventana_analisis(resolucion, inicio, fin, columnas):
+    if existe_particionado(DATA_DIR, resolucion): return leer_ventana(DATA_DIR, resolucion, inicio, fin, columnas)
+    # Sin almacén particionado (datos no construidos con construir_datos.py): recorte de los DataFrames en memoria
+    df_base = obtener_df_horario(columnas) if resolucion == 'hour' else cargar_frame(PATH_INCIDENTE_DATOS, columnas)
+    if df_base is None or df_base.empty: return pd.DataFrame()
+    inicio, fin = pd.Timestamp(inicio), pd.Timestamp(fin)
+    if df_base.index.tz is not None: inicio, fin = inicio.tz_localize(df_base.index.tz), fin.tz_localize(df_base.index.tz)
+    return df_base.loc[inicio:fin, [col for col in columnas if col in df_base.columns]]
+
+@app.callback(Output('ventana-mix', 'figure'), [Input('ventana-fechas', 'start_date'), Input('ventana-fechas', 'end_date'), Input('ventana-resolucion', 'value')])
+@cachear_resultado('update_ventana_mix', obtener_version_datos)
+def update_ventana_mix(fecha_inicio, fecha_fin, resolucion):
+    if not fecha_inicio or not fecha_fin: return go.Figure().update_layout(title_text="Ventana: seleccione fecha de inicio y fin.", title_x=0.5)
+    inicio = pd.Timestamp(fecha_inicio)
+    fin = pd.Timestamp(fecha_fin) + timedelta(hours=23, minutes=59)
+    cols_gen_ventana = list(dict.fromkeys(cols_generacion_fino_plot + cols_generacion_mix_evolucion_horario))
+    df_ventana = leer_ventana_analisis(resolucion, inicio, fin, cols_gen_ventana + ['DemandaReal_MW'])
+    cols_gen_ventana = [col for col in cols_gen_ventana if col in df_ventana.columns and df_ventana[col].notna().any()]
+    if df_ventana.empty or not cols_gen_ventana: return go.Figure().update_layout(title_text="Ventana: no hay datos para el intervalo seleccionado.", title_x=0.5)
+    # Ventanas largas: se agregan por medias para respetar el presupuesto de puntos (el área apilada necesita un eje x común)
+    n_series = len(cols_gen_ventana) + 1
+    if len(df_ventana) * n_series > PUNTOS_MAX_EXPLORADOR:
+        horas_por_punto = max(int(np.ceil((df_ventana.index[-1] - df_ventana.index[0]) / pd.Timedelta(hours=1) * n_series / PUNTOS_MAX_EXPLORADOR)), 1)
+        df_ventana = df_ventana.resample(f"{horas_por_punto}h").mean()
+    fig = go.Figure()
+    df_plot_gen = df_ventana[cols_gen_ventana].fillna(0)
+    for col in cols_gen_ventana:
+        nombre_leyenda = col.replace('_MW','').replace('FuelGas','Fuel/Gas')
+        fig.add_trace(go.Scatter(x=df_plot_gen.index, y=df_plot_gen[col], mode='lines', name=nombre_leyenda, stackgroup='one', hoverinfo='x+y+name', line=dict(color=color_palette.get(nombre_leyenda))))
+    if 'DemandaReal_MW' in df_ventana.columns:
+        fig.add_trace(go.Scatter(x=df_ventana.index, y=df_ventana['DemandaReal_MW'], mode='lines', name="Demanda Real", line=dict(color=color_palette.get('Demanda Real'), width=2), hoverinfo='x+y+name'))
+    fig.update_layout(xaxis_title="Fecha y Hora", yaxis_title="Potencia (MW)", height=500, legend_title_text='Tecnología', hovermode="x unified", legend=dict(orientation="h", yanchor="bottom", y=1.05, xanchor="center", x=0.5, font=dict(size=9)))
+    return fig
+
+@functools.lru_cache(maxsize=32)
+def _cobertura_ventana(version, clasif, resolucion, fecha_inicio, fecha_fin):
+    # Una entrada por (clasificación, resolución, ventana): cambiar de definición no vuelve a leer ni calcular lo ya visto
+    inicio, fin = pd.Timestamp(fecha_inicio), pd.Timestamp(fecha_fin) + timedelta(hours=23, minutes=59)
+    cols_gen = list(dict.fromkeys(cols_generacion_fino_plot + cols_generacion_mix_evolucion_horario))
+    df_ventana = leer_ventana_analisis(resolucion, inicio, fin, cols_gen + ['DemandaReal_MW', COL_FACTOR_CO2])
+    if df_ventana.empty: return df_ventana
+    # El factor de emisión solo se publica por horas: a 15 minutos cada intervalo toma el de su hora
+    factor = None
+    if resolucion != 'hour':
+        df_factor = leer_ventana_analisis('hour', inicio, fin, [COL_FACTOR_CO2])
+        if COL_FACTOR_CO2 in df_factor.columns: factor = df_factor[COL_FACTOR_CO2]
+    renovables, no_emisoras = clasif
+    return calcular(df_ventana, [col for col in cols_gen if col in df_ventana.columns], renovables, no_emisoras, factor)
+
+def obtener_cobertura_ventana(renovables, no_emisoras, resolucion, fecha_inicio, fecha_fin):
+    return _cobertura_ventana(obtener_version_datos(), clasificacion(renovables, no_emisoras), resolucion, fecha_inicio, fecha_fin)
+
+def render_kpi_cobertura_ventana(df_cob, renovables):
+    textos = [html.Strong(f"Resumen de la Ventana ({df_cob.index[0].strftime('%d-%b-%Y %H:%M')} a {df_cob.index[-1].strftime('%d-%b-%Y %H:%M')}):", style={'display':'block', 'marginBottom':'5px'})]
+    for clase, col in COLS_COBERTURA.items():
+        if col in df_cob.columns and df_cob[col].notna().any(): textos.append(html.Li(f"Cobertura {clase.replace('_', ' ')} media: {df_cob[col].mean():.1f}% (máx. {df_cob[col].max():.1f}%)", style=styles['kpi_list_item']))
+    textos.append(html.Li("Renovables: " + (", ".join(tecnologias_clasificables.get(col, col) for col in renovables) or "ninguna"), style=styles['kpi_list_item']))
+    validos = df_cob[[COL_INTENSIDAD_CO2, COL_TOTAL]].dropna()
+    if not validos.empty and validos[COL_TOTAL].sum() > 0:
+        # Media ponderada por la generación de cada intervalo y emisiones = factor (t/MWh) x energía (MWh)
+        horas_paso = (df_cob.index[1] - df_cob.index[0]) / pd.Timedelta(hours=1) if len(df_cob) > 1 else 1
+        intensidad_media = (validos[COL_INTENSIDAD_CO2] * validos[COL_TOTAL]).sum() / validos[COL_TOTAL].sum()
+        emisiones_t = (validos[COL_INTENSIDAD_CO2] / 1000 * validos[COL_TOTAL]).sum() * horas_paso
+        textos.append(html.Li(f"Intensidad media de CO2: {intensidad_media:.0f} g/kWh (mín. {validos[COL_INTENSIDAD_CO2].min():.0f}, máx. {validos[COL_INTENSIDAD_CO2].max():.0f}); emisiones estimadas: {emisiones_t:,.0f} t CO2", style=styles['kpi_list_item']))
+    else:
+        textos.append(html.Li("Factor de emisión de CO2 no disponible para la ventana.", style=styles['kpi_list_item']))
+    return html.Ul(textos, style={'listStyleType': 'disc', 'paddingLeft':'20px'})
+
+@app.callback([Output('cobertura-ventana', 'figure'), Output('cobertura-ventana-texto', 'children')], [Input('cobertura-ventana-fechas', 'start_date'), Input('cobertura-ventana-fechas', 'end_date'), Input('cobertura-ventana-resolucion', 'value'), Input('cobertura-renovables', 'value'), Input('cobertura-no-emisoras', 'value')])
+@cachear_resultado('update_cobertura_ventana', obtener_version_datos)
+def update_cobertura_ventana(fecha_inicio, fecha_fin, resolucion, renovables, no_emisoras):
+    if not fecha_inicio or not fecha_fin: return go.Figure().update_layout(title_text="Cobertura: seleccione fecha de inicio y fin.", title_x=0.5), None
+    df_cob = obtener_cobertura_ventana(renovables or [], no_emisoras or [], resolucion, fecha_inicio, fecha_fin)
+    if df_cob.empty: return go.Figure().update_layout(title_text="Cobertura: no hay datos para el intervalo seleccionado.", title_x=0.5), None
+    df_plot = df_cob
+    n_series = len(COLS_COBERTURA) + 1
+    if len(df_plot) * n_series > PUNTOS_MAX_EXPLORADOR:
+        horas_por_punto = max(int(np.ceil((df_plot.index[-1] - df_plot.index[0]) / pd.Timedelta(hours=1) * n_series / PUNTOS_MAX_EXPLORADOR)), 1)
+        df_plot = df_plot.resample(f"{horas_por_punto}h").mean()
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.08, subplot_titles=("Cobertura de la Demanda (%)", "Intensidad de CO2 de la Generación (g/kWh)"))
+    for col in COLS_COBERTURA.values():
+        if col in df_plot.columns: fig.add_trace(go.Scatter(x=df_plot.index, y=df_plot[col], mode='lines', name=col.replace('_pct',' (%)'), hovertemplate='<b>%{x}</b><br>' + col.replace('_pct',' (%)') + ': %{y:.1f}%<extra></extra>'), row=1, col=1)
+    fig.add_hline(y=100, line_dash="dash", line_color="grey", row=1, col=1)
+    fig.add_trace(go.Scatter(x=df_plot.index, y=df_plot[COL_INTENSIDAD_CO2], mode='lines', name="Intensidad CO2 (g/kWh)", line=dict(color='#7f7f7f'), hovertemplate='<b>%{x}</b><br>%{y:.0f} g/kWh<extra></extra>'), row=2, col=1)
+    fig.update_layout(height=600, hovermode="x unified", legend=dict(orientation="h", yanchor="bottom", y=1.05, xanchor="center", x=0.5, font=dict(size=10)))
+    fig.update_yaxes(ticksuffix="%", row=1, col=1)
+    return fig, render_kpi_cobertura_ventana(df_cob, clasificacion(renovables or [], no_emisoras or [])[0])
+
+def leer_historico_completo(resolucion, columnas):
+    # Histórico completo de la resolución (no solo la ventana del incidente), con las columnas pedidas
+    return obtener_df_horario(columnas) if resolucion == 'hour' else cargar_frame(PATH_INCIDENTE_DATOS, columnas)
+
+def tabla_similares(resultados):
+    estilo_celda = {'padding': '4px 8px', 'borderBottom': '1px solid #eee', 'fontSize': '0.85em'}
+    cabecera = html.Tr([html.Th(t, style=estilo_celda) for t in ["Puesto", "Inicio", "Fin", "Similitud", "Distancia"]])
+    cuerpo = [html.Tr([
+        html.Td(f"#{fila.puesto}", style={**estilo_celda, 'color': colores_similitud[(fila.puesto - 1) % len(colores_similitud)], 'fontWeight': 'bold'}),
+        html.Td(fila.inicio.strftime('%d-%b-%Y %H:%M'), style=estilo_celda),
+        html.Td(fila.fin.strftime('%d-%b-%Y %H:%M'), style=estilo_celda),
+        html.Td(f"{fila.correlacion:.2f}", style=estilo_celda),
+        html.Td(f"{fila.distancia:.2f}", style=estilo_celda),
+    ]) for fila in resultados.itertuples()]
+    return html.Table([html.Thead(cabecera), html.Tbody(cuerpo)], style={'width': '100%', 'borderCollapse': 'collapse', 'marginBottom': '15px'})
+
+@app.callback([Output('similitud-grafico', 'figure'), Output('similitud-tabla', 'children')], [Input('similitud-fechas', 'start_date'), Input('similitud-fechas', 'end_date'), Input('similitud-series', 'value'), Input('similitud-resolucion', 'value'), Input('similitud-k', 'value')])
+@cachear_resultado('update_similitud', obtener_version_datos)
+def update_similitud(fecha_inicio, fecha_fin, columnas, resolucion, k):
+    if not fecha_inicio or not fecha_fin or not columnas: return go.Figure().update_layout(title_text="Similitud: seleccione la ventana de referencia y al menos una serie.", title_x=0.5), None
+    df_base = leer_historico_completo(resolucion, columnas)
+    if df_base is None or df_base.empty: return go.Figure().update_layout(title_text="Similitud: datos no disponibles.", title_x=0.5), None
+    inicio, fin = pd.Timestamp(fecha_inicio), pd.Timestamp(fecha_fin) + timedelta(hours=23, minutes=59)
+    if df_base.index.tz is not None: inicio, fin = inicio.tz_localize(df_base.index.tz), fin.tz_localize(df_base.index.tz)
+    resultados, usadas, df_regular = buscar_similares(df_base, inicio, fin, columnas, k or TOP_K)
+    if resultados.empty: return go.Figure().update_layout(title_text="Similitud: la ventana de referencia no tiene datos completos para comparar.", title_x=0.5), None
+    # Superposición en forma normalizada (lo que se compara); el hover muestra los valores reales
+    referencia = df_regular.loc[inicio:fin, usadas]
+    horas = np.arange(len(referencia)) * (df_regular.index[1] - df_regular.index[0]) / pd.Timedelta(hours=1)
+    normalizar = lambda v: (v - np.nanmean(v)) / np.nanstd(v) if np.nanstd(v) > 0 else v * 0
+    fig = make_subplots(rows=len(usadas), cols=1, shared_xaxes=True, vertical_spacing=0.04, subplot_titles=[col.replace('_MW', ' (MW)').replace('_pct', ' (%)').replace('_EUR_MWh', ' (€/MWh)') for col in usadas])
+    episodios = [(f"Referencia ({referencia.index[0].strftime('%d-%b-%Y')})", referencia, dict(color='black', width=3))]
+    episodios += [(f"#{fila.puesto} {fila.inicio.strftime('%d-%b-%Y %H:%M')}", df_regular.loc[fila.inicio:fila.fin, usadas], dict(color=colores_similitud[(fila.puesto - 1) % len(colores_similitud)], width=1)) for fila in resultados.itertuples()]
+    for nombre, tramo, linea in episodios:
+        for i, col in enumerate(usadas):
+            valores = tramo[col].to_numpy(dtype=float)
+            fig.add_trace(go.Scatter(x=horas, y=normalizar(valores), customdata=valores, mode='lines', name=nombre, legendgroup=nombre, showlegend=i == 0, line=linea, hovertemplate=f"{nombre}<br>%{{customdata:.1f}}<extra></extra>"), row=i + 1, col=1)
+    fig.update_layout(height=max(300, 190 * len(usadas)), hovermode="x", legend=dict(orientation="h", yanchor="bottom", y=1.03, xanchor="center", x=0.5, font=dict(size=9)))
+    fig.update_xaxes(title_text="Horas desde el inicio de la ventana", row=len(usadas), col=1)
+    fig.update_yaxes(title_text="z", showticklabels=False)
+    return fig, tabla_similares(resultados)
+
+def render_kpi_directo_mes(medias):
+    if medias is None: return html.P("Medias del mes en curso no disponibles.", style=styles['kpi_list_item'])
+    mes = f"{medias.name % 100:02d}/{medias.name // 100}"
+    textos = [html.Strong(f"Medias del Mes en Curso ({mes}):", style={'display':'block', 'marginBottom':'5px'})]
+    for col, etiqueta, formato in (('DemandaReal_MW', "Demanda", "{:.0f} MW"), ('TotalGeneracion_MW', "Generación total", "{:.0f} MW"), ('CoberturaRenovable_pct', "Cobertura renovable", "{:.1f}%"), ('CoberturaNoEmisora_pct', "Cobertura no emisora", "{:.1f}%")):
+        if col in medias.index and pd.notna(medias[col]): textos.append(html.Li(f"{etiqueta}: {formato.format(medias[col])}", style=styles['kpi_list_item']))
+    return html.Ul(textos, style={'listStyleType': 'disc', 'paddingLeft':'20px'})
+
+if MODO_DIRECTO:
+    @app.callback([Output('directo-grafico', 'extendData'), Output('directo-cursor', 'data'), Output('directo-mes-texto', 'children')], [Input('directo-intervalo', 'n_intervals')], [State('directo-cursor', 'data')])
+    def update_directo(_, cursor):
+        # Cada tick incorpora las filas nuevas de los ficheros y devuelve solo las posteriores al cursor del navegador
+        sondear()
+        filas = filas_desde(cursor, [col for col, _, _ in series_directo])
+        if filas.empty: raise PreventUpdate
+        datos = {'x': [filas.index] * len(series_directo), 'y': [filas[col].to_numpy() for col, _, _ in series_directo]}
+        return [datos, list(range(len(series_directo))), puntos_ventana_directo], filas.index[-1].isoformat(), render_kpi_directo_mes(medias_mes())
+
+def render_kpi_evolucion_mix(kpi_evol):
+    if kpi_evol is None: return html.P("KPIs de evolución no disponibles.", style=styles['kpi_list_item'])
     kpi_evol_texts = [html.Strong("Tendencias Destacadas del Mix (Últimos 5 Años):", style={'display':'block', 'marginBottom':'5px'})]
-    if not df_horario.empty:
-        primer_año = df_horario.index.min().year
-        ultimo_año = df_horario.index.max().year
-        if primer_año < ultimo_año :
-            df_anual_avg = df_horario.resample('YE').mean(numeric_only=True)
-            cols_a_comparar = {'Eolica_MW': 'Eólica', 'SolarFotovoltaica_MW': 'Solar FV', 'Carbon_MW': 'Carbón', 'CicloCombinado_MW': 'Ciclo Combinado'}
-            for col, label in cols_a_comparar.items():
-                if col in df_anual_avg.columns and not df_anual_avg[col].isnull().all():
-                    val_inicio = df_anual_avg[col].iloc[0]
-                    val_fin = df_anual_avg[col].iloc[-1]
-                    if pd.notna(val_inicio) and pd.notna(val_fin) and val_inicio > 0.1 : 
-                        cambio_pct = ((val_fin - val_inicio) / val_inicio) * 100
-                        tendencia = "aumentado" if cambio_pct > 5 else ("disminuido" if cambio_pct < -5 else "mantenido estable, con un cambio del")
-                        kpi_evol_texts.append(html.Li(f"La generación media de {label} ha {tendencia} ~{abs(cambio_pct):.0f}% entre {primer_año} y {ultimo_año}.", style=styles['kpi_list_item']))
-                    elif pd.notna(val_fin):
-                         kpi_evol_texts.append(html.Li(f"Generación media de {label} en {ultimo_año}: {val_fin:.0f} MW.", style=styles['kpi_list_item']))
+    primer_año, ultimo_año = kpi_evol['primer_anio'], kpi_evol['ultimo_anio']
+    for item in kpi_evol['items']:
+        if 'cambio_pct' in item:
+            cambio_pct = item['cambio_pct']
+            tendencia = "aumentado" if cambio_pct > 5 else ("disminuido" if cambio_pct < -5 else "mantenido estable, con un cambio del")
+            kpi_evol_texts.append(html.Li(f"La generación media de {item['label']} ha {tendencia} ~{abs(cambio_pct):.0f}% entre {primer_año} y {ultimo_año}.", style=styles['kpi_list_item']))
+        else:
+            kpi_evol_texts.append(html.Li(f"Generación media de {item['label']} en {ultimo_año}: {item['media_final']:.0f} MW.", style=styles['kpi_list_item']))
     return html.Ul(kpi_evol_texts, style={'listStyleType': 'disc', 'paddingLeft':'20px'}) if len(kpi_evol_texts) > 1 else html.P("No se pudieron generar KPIs de evolución del mix.", style=styles['kpi_list_item'])
 
-@app.callback(Output('kpi-incidente-inicio-texto', 'children'), [Input('demanda-intercambios-precio-incidente', 'figure')])
-def update_kpi_incidente_inicio(_):
-    if df_incidente_plot.empty: return html.P("KPIs del incidente no disponibles.", style=styles['kpi_list_item'])
-    ts_eval = pd.Timestamp('2025-04-28 08:45:00')
-    idx_tz = df_incidente_plot.index.tz
-    if idx_tz is not None and ts_eval.tz is None: ts_eval = ts_eval.tz_localize(idx_tz)
-    elif idx_tz is None and ts_eval.tz is not None: ts_eval = ts_eval.tz_localize(None)
-    
-    kpi_elements = [html.Strong(f"Condiciones a las {ts_eval.strftime('%d-%b %H:%M')} (previo al evento):", style={'display':'block', 'marginBottom':'5px'})]
-    
-    if ts_eval in df_incidente_plot.index:
-        data_at_ts = df_incidente_plot.loc[ts_eval]
-        if 'DemandaReal_MW' in data_at_ts and pd.notna(data_at_ts['DemandaReal_MW']): kpi_elements.append(html.Li(f"Demanda: {data_at_ts['DemandaReal_MW']:.0f} MW", style=styles['kpi_list_item']))
-        if 'SaldoIntercambios_MW' in data_at_ts and pd.notna(data_at_ts['SaldoIntercambios_MW']):
-            saldo_val = data_at_ts['SaldoIntercambios_MW']
+def render_kpi_incidente_inicio(kpi_inicio):
+    if kpi_inicio is None: return html.P("KPIs del incidente no disponibles.", style=styles['kpi_list_item'])
+    kpi_elements = [html.Strong(f"Condiciones a las {kpi_inicio['ts'].strftime('%d-%b %H:%M')} (previo al evento):", style={'display':'block', 'marginBottom':'5px'})]
+    valores = kpi_inicio['valores']
+    if valores is not None:
+        if 'DemandaReal_MW' in valores: kpi_elements.append(html.Li(f"Demanda: {valores['DemandaReal_MW']:.0f} MW", style=styles['kpi_list_item']))
+        if 'SaldoIntercambios_MW' in valores:
+            saldo_val = valores['SaldoIntercambios_MW']
             tipo_saldo = "Importación" if saldo_val > 0 else ("Exportación" if saldo_val < 0 else "Nulo")
             kpi_elements.append(html.Li(f"Saldo Interc.: {abs(saldo_val):.0f} MW ({tipo_saldo})", style=styles['kpi_list_item']))
-        if 'TotalGeneracion_MW' in df_incidente_plot.columns and 'TotalGeneracion_MW' in data_at_ts and pd.notna(data_at_ts['TotalGeneracion_MW']):
-            kpi_elements.append(html.Li(f"Gen. Total: {data_at_ts['TotalGeneracion_MW']:.0f} MW", style=styles['kpi_list_item']))
-        if 'PrecioMercado_EUR_MWh' in data_at_ts and pd.notna(data_at_ts['PrecioMercado_EUR_MWh']):
-            kpi_elements.append(html.Li(f"Precio Mercado: {data_at_ts['PrecioMercado_EUR_MWh']:.2f} €/MWh", style=styles['kpi_list_item']))
+        if 'TotalGeneracion_MW' in valores: kpi_elements.append(html.Li(f"Gen. Total: {valores['TotalGeneracion_MW']:.0f} MW", style=styles['kpi_list_item']))
+        if 'PrecioMercado_EUR_MWh' in valores: kpi_elements.append(html.Li(f"Precio Mercado: {valores['PrecioMercado_EUR_MWh']:.2f} €/MWh", style=styles['kpi_list_item']))
     else:
         kpi_elements.append(html.Li("Datos no disponibles para el momento exacto.", style=styles['kpi_list_item']))
     return html.Ul(kpi_elements, style={'listStyleType': 'disc', 'paddingLeft':'20px'}) if len(kpi_elements) > 1 else html.P("Datos para KPIs del incidente no disponibles.", style=styles['kpi_list_item'])
 
-@app.callback(Output('kpi-rampas-maximas-texto', 'children'),[Input('rampas-incidente-plot', 'figure')])
-def update_kpi_rampas(_):
-    if df_incidente_plot.empty: return html.P("KPIs de rampas no disponibles.", style=styles['kpi_list_item'])
+def render_kpi_rampas(kpi_rampas):
+    if kpi_rampas is None: return html.P("KPIs de rampas no disponibles.", style=styles['kpi_list_item'])
     textos_rampas_html = [html.Strong("Mayores Rampas (MW/15min) en Periodo de Incidente:", style={'display':'block', 'marginBottom':'5px'})]
-    cols_para_rampas = {'DemandaReal_MW': 'Demanda', 'Eolica_MW': 'Eólica', 'SolarFotovoltaica_MW': 'Solar FV', 'CicloCombinado_MW':'Ciclo Comb.', 'Hidraulica_MW':'Hidráulica'}
-    for col, label in cols_para_rampas.items():
-        if col in df_incidente_plot.columns:
-            rampa_serie = df_incidente_plot[col].diff()
-            if rampa_serie.notna().any():
-                idx_max_abs = rampa_serie.abs().idxmax()
-                if pd.notna(idx_max_abs): 
-                    val_max_rampa = rampa_serie.loc[idx_max_abs]
-                    if pd.notna(val_max_rampa):
-                        textos_rampas_html.append(html.Li(f"{label}: {val_max_rampa:.0f} MW (el {idx_max_abs.strftime('%d-%b %H:%M')})", style=styles['kpi_list_item']))
+    for rampa in kpi_rampas:
+        textos_rampas_html.append(html.Li(f"{rampa['label']}: {rampa['valor']:.0f} MW (el {rampa['ts'].strftime('%d-%b %H:%M')})", style=styles['kpi_list_item']))
     return html.Ul(textos_rampas_html, style={'listStyleType': 'disc', 'paddingLeft':'20px'}) if len(textos_rampas_html) > 1 else html.P("No se calcularon KPIs de rampas.", style=styles['kpi_list_item'])
 
-@app.callback(Output('kpi-cobertura-previa-texto', 'children'),[Input('cobertura-incidente', 'figure')])
-def update_kpi_cobertura_previa(_):
-    if df_incidente_plot.empty: return html.P("KPIs de cobertura no disponibles.", style=styles['kpi_list_item'])
-    ts_eval_cob = pd.Timestamp('2025-04-28 08:45:00')
-    idx_tz = df_incidente_plot.index.tz
-    if idx_tz is not None and ts_eval_cob.tz is None: ts_eval_cob = ts_eval_cob.tz_localize(idx_tz)
-    elif idx_tz is None and ts_eval_cob.tz is not None: ts_eval_cob = ts_eval_cob.tz_localize(None)
-    
-    kpi_cob_texts = [html.Strong(f"Condiciones de Cobertura ({ts_eval_cob.strftime('%d-%b %H:%M')} - Previo al Evento):", style={'display':'block', 'marginBottom':'5px'})]
-    
-    if ts_eval_cob in df_incidente_plot.index:
-        data_at_ts_cob = df_incidente_plot.loc[ts_eval_cob]
-        if 'CoberturaRenovable_pct' in data_at_ts_cob and pd.notna(data_at_ts_cob['CoberturaRenovable_pct']):
-            kpi_cob_texts.append(html.Li(f"Cobertura Renovable: {data_at_ts_cob['CoberturaRenovable_pct']:.1f}%", style=styles['kpi_list_item']))
-        if 'CoberturaNoEmisora_pct' in data_at_ts_cob and pd.notna(data_at_ts_cob['CoberturaNoEmisora_pct']):
-            kpi_cob_texts.append(html.Li(f"Cobertura No Emisora: {data_at_ts_cob['CoberturaNoEmisora_pct']:.1f}%", style=styles['kpi_list_item']))
-    else: 
-        idx_mas_cercano_cob = df_incidente_plot.index.asof(ts_eval_cob)
-        if pd.notna(idx_mas_cercano_cob) and idx_mas_cercano_cob in df_incidente_plot.index:
-            data_at_ts_cob = df_incidente_plot.loc[idx_mas_cercano_cob]
-            kpi_cob_texts = [html.Strong(f"Condiciones de Cobertura ({idx_mas_cercano_cob.strftime('%d-%b %H:%M')} - Previo al Evento):", style={'display':'block', 'marginBottom':'5px'})]
-            if 'CoberturaRenovable_pct' in data_at_ts_cob and pd.notna(data_at_ts_cob['CoberturaRenovable_pct']):
-                kpi_cob_texts.append(html.Li(f"Cobertura Renovable: {data_at_ts_cob['CoberturaRenovable_pct']:.1f}%", style=styles['kpi_list_item']))
-            if 'CoberturaNoEmisora_pct' in data_at_ts_cob and pd.notna(data_at_ts_cob['CoberturaNoEmisora_pct']):
-                kpi_cob_texts.append(html.Li(f"Cobertura No Emisora: {data_at_ts_cob['CoberturaNoEmisora_pct']:.1f}%", style=styles['kpi_list_item']))
-        else:
-            kpi_cob_texts.append(html.Li("Datos no disponibles para el momento exacto.", style=styles['kpi_list_item']))
-            
+def render_tabla_rampas_historico(filas):
+    if not filas: return html.P("Catálogo histórico de rampas no disponible.", style=styles['kpi_list_item'])
+    estilo_celda = {'padding': '4px 8px', 'borderBottom': '1px solid #eee', 'fontSize': '0.85em'}
+    cabecera = html.Tr([html.Th(t, style=estilo_celda) for t in ["Serie", "Horizonte", "Rampa del periodo", "Puesto histórico", "Récord histórico"]])
+    cuerpo = [html.Tr([
+        html.Td(fila['label'], style=estilo_celda),
+        html.Td(fila['horizonte'], style=estilo_celda),
+        html.Td(f"{fila['valor']:.0f} MW ({fila['ts'].strftime('%d-%b %H:%M')})", style=estilo_celda),
+        html.Td(f"#{fila['puesto']} de {fila['n_eventos']}" if fila['puesto'] else f"fuera del top {fila['n_eventos']}", style=estilo_celda),
+        html.Td(f"{fila['record_valor']:.0f} MW ({fila['record_ts'].strftime('%d-%b-%Y %H:%M')})", style=estilo_celda),
+    ]) for fila in filas]
+    return html.Table([html.Thead(cabecera), html.Tbody(cuerpo)], style={'width': '100%', 'borderCollapse': 'collapse', 'marginBottom': '15px'})
+
+def render_kpi_cobertura_previa(kpi_cob):
+    if kpi_cob is None: return html.P("KPIs de cobertura no disponibles.", style=styles['kpi_list_item'])
+    kpi_cob_texts = [html.Strong(f"Condiciones de Cobertura ({kpi_cob['ts'].strftime('%d-%b %H:%M')} - Previo al Evento):", style={'display':'block', 'marginBottom':'5px'})]
+    valores = kpi_cob['valores']
+    if valores is not None:
+        if 'CoberturaRenovable_pct' in valores: kpi_cob_texts.append(html.Li(f"Cobertura Renovable: {valores['CoberturaRenovable_pct']:.1f}%", style=styles['kpi_list_item']))
+        if 'CoberturaNoEmisora_pct' in valores: kpi_cob_texts.append(html.Li(f"Cobertura No Emisora: {valores['CoberturaNoEmisora_pct']:.1f}%", style=styles['kpi_list_item']))
+    else:
+        kpi_cob_texts.append(html.Li("Datos no disponibles para el momento exacto.", style=styles['kpi_list_item']))
     return html.Ul(kpi_cob_texts, style={'listStyleType': 'disc', 'paddingLeft':'20px'}) if len(kpi_cob_texts) > 1 else html.P("Datos de cobertura previa no disponibles.", style=styles['kpi_list_item'])
 
+# Dash valida los callbacks contra el layout: con uno sin KPIs se evita que al asignar la función se carguen los datos al importar
+app.validation_layout = serve_layout(dict.fromkeys(['evolucion', 'incidente_inicio', 'rampas', 'cobertura', 'comparativa_rampas']))
+app.layout = serve_layout
+
 if __name__ == '__main__':
     data_loaded_correctly = True
-    if df_incidente_plot.empty:
+    if obtener_df_incidente().empty:
         print("ERROR CRÍTICO: df_incidente_plot está vacío.")
         data_loaded_correctly = False
-    if df_horario is None or df_horario.empty:
+    if obtener_df_horario().empty:
         print("ERROR CRÍTICO: df_horario no se cargó.")
         data_loaded_correctly = False
     
@@ -0,0 +1,92 @@
+import functools
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from metricas import cronometro
+
+# Capa de acceso a datos del dashboard. Los parquet combinados se convierten una vez a un
+# fichero Arrow IPC con valores float32 que cada worker de gunicorn abre con memory-map:
+# el sistema operativo comparte las mismas páginas entre procesos en lugar de que cada
+# worker tenga su propia copia en pandas. La carga es perezosa (primer uso) y cada consulta
+# construye un DataFrame solo con las columnas pedidas, sin copiar los valores.
+
+COLUMNA_TIEMPO = "Timestamp"
+ARROW_DIR = os.environ.get("DATOS_ARROW_DIR")
+
+
+def columnas_disponibles(ruta_parquet):
+    # Lee solo el esquema del pie del fichero, sin cargar datos
+    if not os.path.exists(ruta_parquet):
+        return []
+    return [c for c in pq.read_schema(ruta_parquet).names if c != COLUMNA_TIEMPO and not c.startswith('__')]
+
+
+def _ruta_arrow(ruta_parquet):
+    directorio = ARROW_DIR or os.path.join(os.path.dirname(ruta_parquet), "arrow")
+    return os.path.join(directorio, os.path.splitext(os.path.basename(ruta_parquet))[0] + ".arrow")
+
+
+def _tabla_compacta(ruta_parquet):
+    tabla = pq.read_table(ruta_parquet)
+    campos, columnas = [], []
+    for nombre in tabla.column_names:
+        columna = tabla.column(nombre)
+        if pa.types.is_floating(columna.type):
+            # NaN como valor (no como nulo) para que la conversión a pandas no tenga que copiar
+            valores = columna.to_numpy().astype(np.float32)
+            columna = pa.array(valores, type=pa.float32(), from_pandas=False)
+        campos.append(pa.field(nombre, columna.type))
+        columnas.append(columna)
+    return pa.Table.from_arrays(columnas, schema=pa.schema(campos))
+
+
+def _asegurar_arrow(ruta_parquet):
+    ruta_arrow = _ruta_arrow(ruta_parquet)
+    if os.path.exists(ruta_arrow) and os.path.getmtime(ruta_arrow) >= os.path.getmtime(ruta_parquet):
+        return ruta_arrow
+    os.makedirs(os.path.dirname(ruta_arrow), exist_ok=True)
+    tabla = _tabla_compacta(ruta_parquet)
+    # Escritura atómica: varios workers pueden arrancar a la vez
+    ruta_tmp = f"{ruta_arrow}.{os.getpid()}.tmp"
+    with pa.OSFile(ruta_tmp, 'wb') as f:
+        with pa.ipc.new_file(f, tabla.schema) as escritor:
+            escritor.write_table(tabla)
+    os.replace(ruta_tmp, ruta_arrow)
+    return ruta_arrow
+
+
+@functools.lru_cache(maxsize=8)
+def _abrir(ruta_parquet, mtime_ns):
+    fichero = os.path.basename(ruta_parquet)
+    try:
+        with cronometro('dashboard_carga_datos_segundos', etapa='apertura', fichero=fichero):
+            ruta_arrow = _asegurar_arrow(ruta_parquet)
+            tabla = pa.ipc.open_file(pa.memory_map(ruta_arrow, 'r')).read_all()
+        origen = "Arrow IPC (memory-map)"
+    except OSError as e:
+        # Directorio de datos de solo lectura: copia privada compacta en memoria
+        print(f"No se pudo preparar el fichero Arrow de {ruta_parquet} ({e}); se carga en memoria.")
+        with cronometro('dashboard_carga_datos_segundos', etapa='apertura_memoria', fichero=fichero):
+            tabla = _tabla_compacta(ruta_parquet)
+        origen = "parquet (memoria)"
+    indice = pd.DatetimeIndex(tabla.column(COLUMNA_TIEMPO).to_pandas(), name=COLUMNA_TIEMPO)
+    print(f"Datos cargados desde {origen}: {fichero}. Shape: ({tabla.num_rows}, {tabla.num_columns - 1})")
+    return tabla, indice
+
+
+def cargar_frame(ruta_parquet, columnas=None):
+    # DataFrame con las columnas pedidas (todas si columnas es None); vacío si el fichero no existe
+    if not os.path.exists(ruta_parquet):
+        return pd.DataFrame()
+    tabla, indice = _abrir(ruta_parquet, os.stat(ruta_parquet).st_mtime_ns)
+    with cronometro('dashboard_carga_datos_segundos', etapa='proyeccion', fichero=os.path.basename(ruta_parquet)):
+        nombres = [c for c in tabla.column_names if c != COLUMNA_TIEMPO and not c.startswith('__')]
+        if columnas is not None:
+            nombres = [c for c in columnas if c in nombres]
+        df = tabla.select(nombres).to_pandas(split_blocks=True)
+        df.index = indice
+    return df
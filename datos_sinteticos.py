@@ -0,0 +1,88 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import config
+
+# Generador de datos sintéticos con el mismo formato que los parquet por indicador de ESIOS
+# (`<indicador>_hour.parquet`, `<indicador>_fifteen_minutes.parquet`: índice `Timestamp` en UTC
+# y una columna float64). Sirve para medir el dashboard con históricos de 1 a 20 años sin
+# depender de la API. Las series tienen ciclo diario y anual, tendencia y ruido, con valores
+# del orden de los reales; no pretenden reproducir el sistema eléctrico.
+
+FIN_DEFECTO = pd.Timestamp('2025-04-29 00:00', tz='UTC')
+PASO = pd.Timedelta(minutes=15)
+
+
+def _ruido_lento(rng, n, escala, periodos_h=(6, 37, 170, 900)):
+    # Suma de oscilaciones con fase aleatoria: variabilidad de horas a semanas sin bucles
+    t = np.arange(n) * PASO / pd.Timedelta(hours=1)
+    ruido = np.zeros(n)
+    for periodo in periodos_h:
+        ruido += np.sin(2 * np.pi * t / (periodo * rng.uniform(0.8, 1.2)) + rng.uniform(0, 2 * np.pi))
+    return escala * ruido / np.sqrt(len(periodos_h))
+
+
+def generar_series(inicio, fin, semilla=0):
+    # DataFrame cuartohorario con las columnas de todos los indicadores de config.INDICADORES
+    rng = np.random.default_rng(semilla)
+    indice = pd.date_range(inicio, fin, freq=PASO, name='Timestamp').as_unit('ns')
+    n = len(indice)
+    hora = (indice.hour + indice.minute / 60).to_numpy()
+    dia_anio = indice.dayofyear.to_numpy()
+    anios = ((indice - indice[0]) / pd.Timedelta(days=365.25)).to_numpy()
+    progreso = anios / max(anios[-1], 1)
+    diario = np.cos(2 * np.pi * (hora - 19) / 24)
+    anual = np.cos(2 * np.pi * (dia_anio - 20) / 365.25)
+    sol = np.clip(np.sin(np.pi * (hora - 6 - anual) / (12 + 2 * -anual)), 0, None) * ((hora > 6 + anual) & (hora < 18 - anual))
+    blanco = lambda escala: rng.normal(0, escala, n)
+
+    s = {}
+    s['DemandaReal_MW'] = 28000 + 4500 * diario + 2500 * anual + _ruido_lento(rng, n, 1500) + blanco(150)
+    s['SolarFotovoltaica_MW'] = sol * (5000 + 17000 * progreso) * (0.85 - 0.15 * anual) * np.clip(1 + _ruido_lento(rng, n, 0.2), 0.2, 1.2)
+    s['SolarTermica_MW'] = sol * 2000 * (0.7 - 0.3 * anual) * np.clip(1 + _ruido_lento(rng, n, 0.2), 0.2, 1.2)
+    s['Eolica_MW'] = np.clip(7500 + 1500 * anual + _ruido_lento(rng, n, 5000) + blanco(100), 300, 22000)
+    s['Hidraulica_MW'] = np.clip(3400 + 1500 * anual + 1200 * diario + _ruido_lento(rng, n, 1000) + blanco(50), 400, 11000)
+    # Nuclear casi plana con paradas de recarga: un escalón cada ~18 meses
+    s['Nuclear_MW'] = 7100 - 1050 * ((anios % 1.5) < 0.1) - 1050 * (((anios + 0.7) % 1.5) < 0.1) + blanco(20)
+    s['Carbon_MW'] = np.clip((9000 * (1 - progreso) ** 3 + 400) * (1 + 0.3 * diario) + _ruido_lento(rng, n, 300), 0, None)
+    s['Cogeneracion_MW'] = 2400 + 200 * diario + _ruido_lento(rng, n, 150) + blanco(20)
+    s['TermicaRenovable_MW'] = 700 + 50 * anual + blanco(15)
+    generacion_fija = sum(s[c] for c in ('SolarFotovoltaica_MW', 'SolarTermica_MW', 'Eolica_MW', 'Hidraulica_MW', 'Nuclear_MW', 'Carbon_MW', 'Cogeneracion_MW', 'TermicaRenovable_MW'))
+    s['SaldoIntercambios_MW'] = np.clip(-150 + _ruido_lento(rng, n, 500) + blanco(30), -3000, 3000)
+    # El ciclo combinado cubre el hueco entre demanda y el resto de la generación
+    s['CicloCombinado_MW'] = np.clip(s['DemandaReal_MW'] - s['SaldoIntercambios_MW'] - generacion_fija, 500, 16000)
+    hueco = s['CicloCombinado_MW'] / s['DemandaReal_MW']
+    s['PrecioMercado_EUR_MWh'] = np.clip(20 + 150 * hueco + 25 * diario + _ruido_lento(rng, n, 20) + blanco(3), -5, 650)
+    generacion_total = generacion_fija + s['CicloCombinado_MW']
+    s['EmisionesCO2_Factor_tCO2_MWh'] = (0.95 * s['Carbon_MW'] + 0.37 * s['CicloCombinado_MW'] + 0.4 * s['Cogeneracion_MW']) / generacion_total
+    return pd.DataFrame(s, index=indice)
+
+
+def generar(destino, anios, fin=FIN_DEFECTO, semilla=0):
+    # Escribe un parquet por indicador y resolución con `anios` de histórico hasta `fin`
+    os.makedirs(destino, exist_ok=True)
+    inicio = fin - pd.DateOffset(years=anios)
+    df = generar_series(inicio, fin, semilla)
+    df_hora = df.resample('h').mean()
+    rutas = []
+    # Mismos ficheros, columnas y resoluciones que descarga esios_api.py
+    for indicador, datos in config.INDICADORES.items():
+        for resolucion in datos['resoluciones']:
+            serie = df_hora[datos['columna']] if resolucion == 'hour' else df[datos['columna']]
+            ruta = os.path.join(destino, f"{indicador}_{resolucion}.parquet")
+            serie.round(3).to_frame().to_parquet(ruta)
+            rutas.append(ruta)
+    print(f"Datos sintéticos: {anios} años ({len(df)} filas cuartohorarias) en {destino}")
+    return rutas
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Genera parquet por indicador sintéticos con el formato de ESIOS.")
+    parser.add_argument('destino')
+    parser.add_argument('--anios', type=int, default=5, help="Años de histórico a resolución de 15 minutos (1-20)")
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args()
+    generar(args.destino, args.anios, semilla=args.semilla)
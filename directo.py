@@ -0,0 +1,235 @@
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+import config
+from construir_datos import COLS_DERIVADAS, RESOLUCIONES, alinear, archivos_indicadores, calcular_derivadas, leer_indicador, paso_mediano, primera_marca
+from metricas import cronometro
+from rampas import calcular_rampas
+
+# Modo en directo: sondea los parquet por indicador a 15 minutos de ORIGEN_DIR (los que amplía
+# esios_api.py), más los horarios de los indicadores que no se publican a 15 minutos, igual que
+# construir_datos.py, y lee solo las filas nuevas de cada fichero. Mantiene en memoria una cola con las
+# últimas horas (columnas de origen, derivadas y rampas a 15 minutos) y sumas y cuentas por mes,
+# de modo que cada sondeo solo recalcula el tramo afectado por las filas nuevas: su coste depende
+# de las filas añadidas, no del histórico. Solo la primera carga (o un fichero reescrito, no
+# ampliado) recorre el histórico completo. El estado es de cada proceso, como las métricas.
+
+RESOLUCION = 'fifteen_minutes'
+PASO = RESOLUCIONES[RESOLUCION]['paso']
+VENTANA = pd.Timedelta(hours=float(os.environ.get("DIRECTO_VENTANA_H", "24")))
+# La cola guarda más que la ventana mostrada para absorber indicadores que se publican con retraso
+MARGEN_COLA = pd.Timedelta(hours=float(os.environ.get("DIRECTO_MARGEN_H", "24")))
+INTERVALO_SONDEO_S = float(os.environ.get("DIRECTO_INTERVALO_S", "60"))
+COLS_RAMPA = ['DemandaReal_MW', 'Eolica_MW', 'SolarFotovoltaica_MW']
+HORIZONTE_RAMPA = '15min'
+
+_bloqueo = threading.Lock()
+_estado = {'ficheros': {}, 'cola': pd.DataFrame(), 'sumas': pd.DataFrame(), 'cuentas': pd.DataFrame(), 'completo': None, 'limite': None, 'ultimo_sondeo': 0.0}
+
+
+def col_rampa(col):
+    return f"Rampa{HORIZONTE_RAMPA}_{col}"
+
+
+def clave_mes(indice):
+    return indice.year * 100 + indice.month
+
+
+def _columnas_origen(df):
+    return [c for c in df.columns if not c.startswith('Rampa') and c not in COLS_DERIVADAS]
+
+
+def _acumular(df, signo=1):
+    # Suma (o resta) la contribución de las filas de df a las sumas y cuentas por mes
+    if df.empty:
+        return
+    valores = df[[c for c in df.columns if not c.startswith('Rampa')]]
+    grupos = valores.groupby(clave_mes(valores.index))
+    for nombre, parcial in (('sumas', grupos.sum(min_count=1).fillna(0)), ('cuentas', grupos.count())):
+        _estado[nombre] = _estado[nombre].add(signo * parcial, fill_value=0)
+
+
+def _recalcular_tramo(cola, inicio):
+    # Derivadas y rampas solo desde `inicio`; la rampa necesita además la fila un horizonte antes
+    tramo = cola.loc[inicio - PASO:]
+    derivadas = calcular_derivadas(tramo[_columnas_origen(tramo)].copy())
+    cols = [c for c in COLS_RAMPA if c in tramo.columns]
+    rampas = calcular_rampas(derivadas, cols, HORIZONTE_RAMPA).rename(columns=col_rampa)
+    actualizado = pd.concat([derivadas, rampas], axis=1).loc[inicio:]
+    cola = cola.reindex(columns=cola.columns.union(actualizado.columns))
+    cola.loc[actualizado.index, actualizado.columns] = actualizado
+    return cola
+
+
+def _cargar_completo(propios, complementos):
+    _estado.update(ficheros={}, cola=pd.DataFrame(), sumas=pd.DataFrame(), cuentas=pd.DataFrame(), completo=None, limite=None)
+    # Los horarios solo cubren el periodo de los indicadores a 15 minutos, como en construir_datos.py
+    _estado['limite'] = min((primera_marca(a) for a in propios), default=None)
+    if _estado['limite'] is None:
+        return
+    columnas = {}
+    for ruta in propios + complementos:
+        with cronometro('dashboard_carga_datos_segundos', etapa='directo_completo', fichero=os.path.basename(ruta)):
+            df = leer_indicador(ruta, _estado['limite'] if ruta in complementos else None)
+        if df.empty:
+            continue
+        paso_nativo = paso_mediano(df.index, PASO)
+        columnas.update({col: alinear(df[col], PASO, paso_nativo) for col in df.columns})
+        _registrar_fichero(ruta, df, paso_nativo)
+    if not columnas:
+        return
+    historico = calcular_derivadas(pd.DataFrame(columnas).sort_index())
+    _acumular(historico)
+    cola = historico.loc[historico.index[-1] - VENTANA - MARGEN_COLA:]
+    _estado['cola'] = _recalcular_tramo(cola, cola.index[0])
+    print(f"Modo en directo: {len(historico)} filas de {len(propios) + len(complementos)} indicadores; cola de {len(_estado['cola'])} filas.")
+
+
+def _registrar_fichero(ruta, df, paso_nativo):
+    stat = os.stat(ruta)
+    _estado['ficheros'][os.path.basename(ruta)] = {
+        'ruta': ruta, 'mtime_ns': stat.st_mtime_ns, 'tamano': stat.st_size,
+        'filas': pq.ParquetFile(ruta).metadata.num_rows,
+        'ultimo_ts': df.index.max(), 'paso_nativo': paso_nativo,
+    }
+
+
+def _leer_nuevas(archivos):
+    # {columna: serie alineada} con las filas nuevas de los ficheros ampliados; None si alguno se ha reescrito
+    nuevas = {}
+    for ruta in archivos:
+        nombre = os.path.basename(ruta)
+        previo = _estado['ficheros'].get(nombre)
+        stat = os.stat(ruta)
+        if previo is None:
+            return None
+        if previo['mtime_ns'] == stat.st_mtime_ns and previo['tamano'] == stat.st_size:
+            continue
+        with cronometro('dashboard_carga_datos_segundos', etapa='directo', fichero=nombre):
+            df = leer_indicador(ruta, previo['ultimo_ts'])
+        # Igual que construir_datos.py: se lee desde la última marca incluida, que debe seguir ahí
+        if df.empty or df.index.min() != previo['ultimo_ts'] or pq.ParquetFile(ruta).metadata.num_rows != previo['filas'] + len(df) - 1:
+            return None
+        _registrar_fichero(ruta, df, previo['paso_nativo'])
+        # Reescrito sin filas nuevas (p. ej. una pasada de esios_api.py sin datos publicados): nada que recalcular
+        for col in df.columns:
+            serie = alinear(df[col], PASO, previo['paso_nativo'])
+            serie = serie.loc[serie.index > previo['ultimo_ts']]
+            if not serie.empty:
+                nuevas[col] = serie
+    return nuevas
+
+
+def _leer_tramo(inicio, fin):
+    # Columnas de origen de todos los indicadores en [inicio, fin), alineadas. Cada fichero se lee desde un
+    # paso suyo antes para que el relleno de los horarios cubra el inicio del tramo.
+    columnas = {}
+    for fichero in _estado['ficheros'].values():
+        df = leer_indicador(fichero['ruta'], inicio - fichero['paso_nativo'], fin)
+        for col in df.columns:
+            columnas[col] = alinear(df[col], PASO, fichero['paso_nativo'])
+    return pd.DataFrame(columnas).sort_index().loc[inicio:fin - PASO]
+
+
+def _incorporar_antiguas(antiguas, fin):
+    # Filas anteriores a la cola (un indicador lento que publica tarde): solo cambian las sumas del mes.
+    # Se descuenta el tramo tal como estaba (sin las filas nuevas) y se suma el actual, con sus derivadas.
+    inicio = min(serie.index.min() for serie in antiguas.values())
+    actual = _leer_tramo(inicio, fin)
+    if actual.empty:
+        return
+    anterior = actual.copy()
+    for col, serie in antiguas.items():
+        if col in anterior.columns:
+            anterior.loc[serie.index.intersection(anterior.index), col] = float('nan')
+    _acumular(calcular_derivadas(anterior), signo=-1)
+    _acumular(calcular_derivadas(actual))
+
+
+def _incorporar(nuevas):
+    cola = _estado['cola']
+    if cola.empty:
+        return False
+    antiguas = {col: serie.loc[:cola.index[0] - PASO] for col, serie in nuevas.items()}
+    antiguas = {col: serie for col, serie in antiguas.items() if not serie.empty}
+    if antiguas:
+        _incorporar_antiguas(antiguas, cola.index[0])
+        nuevas = {col: serie.loc[cola.index[0]:] for col, serie in nuevas.items()}
+        nuevas = {col: serie for col, serie in nuevas.items() if not serie.empty}
+        if not nuevas:
+            return True
+    inicio = min(serie.index.min() for serie in nuevas.values())
+    # Se descuenta lo que aportaban al mes las filas que se van a recalcular y se suma lo nuevo
+    _acumular(cola.loc[inicio:], signo=-1)
+    indice = cola.index
+    for serie in nuevas.values():
+        indice = indice.union(serie.index)
+    cola = cola.reindex(index=indice, columns=cola.columns.union(list(nuevas)))
+    for col, serie in nuevas.items():
+        cola.loc[serie.index, col] = serie.values
+    cola = _recalcular_tramo(cola, inicio)
+    _acumular(cola.loc[inicio:])
+    _estado['cola'] = cola.loc[cola.index[-1] - VENTANA - MARGEN_COLA:]
+    return True
+
+
+def _actualizar_completo_hasta():
+    # Última marca que ya han publicado todos los indicadores: las filas hasta ahí no cambian. Un
+    # indicador que lleva más de MARGEN_COLA sin publicar (interrumpido o con huecos largos) no cuenta:
+    # si no, congelaría la vista en directo en su última fila
+    ultimos = [f['ultimo_ts'] for f in _estado['ficheros'].values()]
+    if not ultimos:
+        _estado['completo'] = None
+        return
+    reciente = max(ultimos)
+    _estado['completo'] = min(ts for ts in ultimos if reciente - ts <= MARGEN_COLA)
+
+
+def sondear(origen=config.ORIGEN_DIR, forzar=False):
+    # Incorpora las filas nuevas de los parquet a 15 minutos (como mucho una vez cada INTERVALO_SONDEO_S)
+    with _bloqueo:
+        ahora = time.monotonic()
+        if not forzar and _estado['ficheros'] and ahora - _estado['ultimo_sondeo'] < INTERVALO_SONDEO_S:
+            return False
+        _estado['ultimo_sondeo'] = ahora
+        propios, complementos = archivos_indicadores(origen, RESOLUCION)
+        archivos = propios + complementos if propios else []
+        if {os.path.basename(a) for a in archivos} != set(_estado['ficheros']):
+            _cargar_completo(propios, complementos)
+            _actualizar_completo_hasta()
+            return True
+        nuevas = _leer_nuevas(archivos)
+        if nuevas is None or (nuevas and not _incorporar(nuevas)):
+            print("Modo en directo: histórico de un fichero modificado; se recarga.")
+            _cargar_completo(propios, complementos)
+        elif not nuevas:
+            return False
+        _actualizar_completo_hasta()
+        return True
+
+
+def filas_desde(cursor=None, columnas=None):
+    # Filas completas posteriores a `cursor` dentro de la ventana mostrada (todas si cursor es None)
+    with _bloqueo:
+        cola, completo = _estado['cola'], _estado['completo']
+    if cola.empty or completo is None:
+        return pd.DataFrame(columns=columnas)
+    inicio = completo - VENTANA + PASO
+    if cursor is not None:
+        inicio = max(inicio, pd.Timestamp(cursor) + PASO)
+    filas = cola.loc[inicio:completo]
+    return filas.reindex(columns=columnas) if columnas is not None else filas
+
+
+def medias_mes(mes=None):
+    # Medias del mes (el último con datos si mes es None) a partir de las sumas y cuentas acumuladas
+    with _bloqueo:
+        sumas, cuentas = _estado['sumas'], _estado['cuentas']
+    if sumas.empty:
+        return None
+    mes = sumas.index.max() if mes is None else mes
+    return (sumas.loc[mes] / cuentas.loc[mes].where(cuentas.loc[mes] > 0)).rename(mes)
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+# Reducción de series temporales largas a un presupuesto de puntos para enviarlas al navegador.
+# - minmax: conserva el mínimo y el máximo de cada tramo, de modo que los picos (p. ej. rampas) no desaparecen.
+# - lttb: Largest-Triangle-Three-Buckets, conserva mejor la forma visual de la curva.
+
+METODOS = ('minmax', 'lttb')
+
+
+def indices_minmax(y, n_puntos):
+    n = y.size
+    if n <= n_puntos or n_puntos < 2:
+        return np.arange(n)
+    # Cada tramo aporta como mucho dos puntos; los extremos de la serie se añaden aparte
+    n_tramos = max((n_puntos - 2) // 2, 1)
+    largo = -(-n // n_tramos)
+    n_tramos = -(-n // largo)
+    relleno = n_tramos * largo - n
+    # Matriz (tramo, posición) rellenada con ±inf para que el relleno nunca sea el mínimo ni el máximo
+    matriz_min = np.concatenate([y, np.full(relleno, np.inf)]).reshape(n_tramos, largo)
+    matriz_max = np.concatenate([y, np.full(relleno, -np.inf)]).reshape(n_tramos, largo)
+    base = np.arange(n_tramos) * largo
+    primeros = base + matriz_min.argmin(axis=1)
+    ultimos = base + matriz_max.argmax(axis=1)
+    return np.unique(np.concatenate([primeros, ultimos, [0, n - 1]]))
+
+
+def indices_lttb(x, y, n_puntos):
+    n = y.size
+    if n <= n_puntos or n_puntos < 3:
+        return np.arange(n)
+    # Tramos para los puntos interiores; el primero y el último se conservan siempre
+    bordes = np.linspace(1, n - 1, n_puntos - 1).astype(np.int64)
+    seleccion = np.empty(n_puntos, dtype=np.int64)
+    seleccion[0], seleccion[-1] = 0, n - 1
+    a = 0
+    for i in range(n_puntos - 2):
+        ini, fin = bordes[i], bordes[i + 1]
+        sig_ini, sig_fin = fin, (bordes[i + 2] if i + 2 < len(bordes) else n)
+        cx, cy = x[sig_ini:sig_fin].mean(), y[sig_ini:sig_fin].mean()
+        areas = np.abs((x[a] - cx) * (y[ini:fin] - y[a]) - (x[a] - x[ini:fin]) * (cy - y[a]))
+        a = ini + int(areas.argmax())
+        seleccion[i + 1] = a
+    return seleccion
+
+
+def reducir_serie(serie, n_puntos, metodo='minmax'):
+    serie = serie.dropna()
+    if len(serie) <= n_puntos:
+        return serie
+    y = serie.to_numpy(dtype=float)
+    if metodo == 'lttb':
+        x = serie.index.asi8.astype(float) if isinstance(serie.index, pd.DatetimeIndex) else np.arange(len(serie), dtype=float)
+        indices = indices_lttb(x, y, n_puntos)
+    else:
+        indices = indices_minmax(y, n_puntos)
+    return serie.iloc[indices]
+
+
+def ventana(df, inicio=None, fin=None):
+    # Recorte por posición sobre un índice ordenado (evita la indexación por etiqueta de .loc)
+    indice = df.index
+    ini = 0 if inicio is None else indice.searchsorted(inicio, side='left')
+    fin_pos = len(indice) if fin is None else indice.searchsorted(fin, side='right')
+    return df.iloc[ini:fin_pos]
+
+
+def reducir_ventana(df, columnas, n_puntos_total, inicio=None, fin=None, metodo='minmax'):
+    # Reparte el presupuesto de puntos entre las columnas y reduce solo la ventana visible
+    df_ventana = ventana(df, inicio, fin)
+    n_por_serie = max(n_puntos_total // max(len(columnas), 1), 3)
+    return {col: reducir_serie(df_ventana[col], n_por_serie, metodo) for col in columnas if col in df_ventana.columns}
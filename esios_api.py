@@ -0,0 +1,209 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+import aiohttp
+import pandas as pd
+import pyarrow.parquet as pq
+
+import config
+
+# Cliente asíncrono de la API e·sios. Descarga en paralelo todos los indicadores y tramos de
+# fechas con un pool de conexiones acotado, limitación de peticiones por segundo y reintentos
+# con espera exponencial. Es reanudable: cada `<indicador>_<resolución>.parquet` se amplía
+# desde su última marca temporal, así que una actualización solo pide (y añade) las filas nuevas.
+
+COLUMNA_TIEMPO = "Timestamp"
+ESTADOS_REINTENTABLES = {429, 500, 502, 503, 504}
+# Grupos de filas de un mes a 15 minutos: quien lea solo las filas nuevas (construir_datos.py,
+# el modo en directo) salta por sus estadísticas todos los grupos salvo el último
+FILAS_POR_GRUPO = 31 * 96
+
+
+def ruta_indicador(destino, nombre, resolucion):
+    return os.path.join(destino, f"{nombre}_{resolucion}.parquet")
+
+
+def ultimo_timestamp(ruta):
+    # Máximo de Timestamp a partir de las estadísticas de los grupos de filas (sin leer los datos)
+    if not os.path.exists(ruta):
+        return None
+    fichero = pq.ParquetFile(ruta)
+    if fichero.metadata.num_rows == 0:
+        return None
+    indice = fichero.schema_arrow.get_field_index(COLUMNA_TIEMPO)
+    estadisticas = [fichero.metadata.row_group(i).column(indice).statistics for i in range(fichero.metadata.num_row_groups)] if indice >= 0 else []
+    if estadisticas and all(s is not None and s.has_min_max for s in estadisticas):
+        ultimo = pd.Timestamp(max(s.max for s in estadisticas))
+    else:
+        ultimo = pd.Timestamp(pd.read_parquet(ruta, columns=[]).index.max())
+    return ultimo.tz_localize('UTC') if ultimo.tz is None else ultimo.tz_convert('UTC')
+
+
+def tramos(desde, hasta, dias):
+    # Intervalos [inicio, fin) consecutivos de como mucho `dias` días entre desde y hasta (excluido)
+    inicios = pd.date_range(desde, hasta, freq=f"{dias}D", inclusive='left')
+    return list(zip(inicios, list(inicios[1:]) + [hasta]))
+
+
+def crear_limitador(peticiones_por_segundo):
+    # Reparte las peticiones con un intervalo mínimo entre ellas (compartido por todas las tareas)
+    intervalo = 1 / peticiones_por_segundo if peticiones_por_segundo else 0
+    estado = {'siguiente': 0.0, 'bloqueo': None}
+
+    async def esperar_turno():
+        if estado['bloqueo'] is None:
+            estado['bloqueo'] = asyncio.Lock()
+        async with estado['bloqueo']:
+            ahora = time.monotonic()
+            espera = estado['siguiente'] - ahora
+            estado['siguiente'] = max(ahora, estado['siguiente']) + intervalo
+        if espera > 0:
+            await asyncio.sleep(espera)
+    return esperar_turno
+
+
+def valores_a_serie(respuesta, indicador):
+    valores = respuesta.get('indicator', {}).get('values', [])
+    if indicador.get('geo_id') is not None:
+        valores = [v for v in valores if v.get('geo_id', indicador['geo_id']) == indicador['geo_id']]
+    if not valores:
+        return pd.Series(dtype='float64', name=indicador['columna'], index=pd.DatetimeIndex([], tz='UTC', name=COLUMNA_TIEMPO))
+    indice = pd.DatetimeIndex(pd.to_datetime([v['datetime_utc'] for v in valores], utc=True), name=COLUMNA_TIEMPO)
+    return pd.Series([float(v['value']) for v in valores], index=indice, name=indicador['columna'])
+
+
+async def pedir_tramo(sesion, esperar_turno, url_base, token, indicador, resolucion, inicio, fin, reintentos, grabar_dir=None):
+    # e·sios incluye los dos extremos: el tramo termina un segundo antes del inicio del siguiente
+    parametros = {
+        'start_date': inicio.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'end_date': (fin - pd.Timedelta(seconds=1)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'time_trunc': resolucion,
+        'time_agg': indicador['agregacion'],
+    }
+    if indicador.get('geo_id') is not None:
+        parametros['geo_ids[]'] = str(indicador['geo_id'])
+    cabeceras = {'Accept': 'application/json; application/vnd.esios-api-v1+json', 'Content-Type': 'application/json', 'x-api-key': token}
+    url = f"{url_base.rstrip('/')}/indicators/{indicador['id']}"
+    for intento in range(reintentos + 1):
+        await esperar_turno()
+        espera = min(2 ** intento, 60) * (0.5 + random.random())
+        try:
+            async with sesion.get(url, params=parametros, headers=cabeceras) as respuesta:
+                if respuesta.status == 200:
+                    datos = await respuesta.json(content_type=None)
+                    if grabar_dir:
+                        grabar_respuesta(grabar_dir, indicador['id'], parametros, datos)
+                    return valores_a_serie(datos, indicador)
+                if respuesta.status not in ESTADOS_REINTENTABLES:
+                    raise RuntimeError(f"e·sios respondió {respuesta.status} para el indicador {indicador['id']} ({parametros['start_date']} - {parametros['end_date']}): {(await respuesta.text())[:200]}")
+                if respuesta.headers.get('Retry-After', '').isdigit():
+                    espera = float(respuesta.headers['Retry-After'])
+                motivo = f"HTTP {respuesta.status}"
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            motivo = type(e).__name__
+        if intento < reintentos:
+            print(f"Indicador {indicador['id']} ({resolucion}, {parametros['start_date'][:10]}): {motivo}, reintento {intento + 1}/{reintentos} en {espera:.1f} s")
+            await asyncio.sleep(espera)
+    raise RuntimeError(f"Indicador {indicador['id']} ({resolucion}, {parametros['start_date'][:10]}): sin respuesta válida tras {reintentos} reintentos ({motivo})")
+
+
+def clave_grabacion(id_indicador, parametros):
+    # Nombre de fichero de una respuesta grabada; el servidor simulado la busca con la misma clave
+    return f"{id_indicador}_{parametros['time_trunc']}_{parametros['start_date']}_{parametros['end_date']}".replace(':', '') + ".json"
+
+
+def grabar_respuesta(directorio, id_indicador, parametros, datos):
+    os.makedirs(directorio, exist_ok=True)
+    with open(os.path.join(directorio, clave_grabacion(id_indicador, parametros)), 'w') as f:
+        json.dump(datos, f)
+
+
+def anadir_filas(ruta, columna, serie_nueva, desde):
+    # Añade al parquet del indicador solo las filas posteriores a `desde`, con el mismo formato (índice Timestamp UTC)
+    serie_nueva = serie_nueva[~serie_nueva.index.duplicated(keep='last')].sort_index()
+    if desde is not None:
+        serie_nueva = serie_nueva[serie_nueva.index > desde]
+    if serie_nueva.empty:
+        return 0
+    nuevo = serie_nueva.to_frame(columna)
+    if os.path.exists(ruta):
+        existente = pd.read_parquet(ruta)
+        existente.index = pd.to_datetime(existente.index, utc=True)
+        nuevo = pd.concat([existente, nuevo])
+    nuevo.index.name = COLUMNA_TIEMPO
+    nuevo.to_parquet(ruta + ".tmp", row_group_size=FILAS_POR_GRUPO)
+    os.replace(ruta + ".tmp", ruta)
+    return len(serie_nueva)
+
+
+async def actualizar_indicador(sesion, esperar_turno, opciones, nombre, indicador, resolucion, hasta):
+    ruta = ruta_indicador(opciones['destino'], nombre, resolucion)
+    ultimo = ultimo_timestamp(ruta)
+    desde = ultimo + config.PASOS[resolucion] if ultimo is not None else opciones['desde']
+    if desde >= hasta:
+        return nombre, resolucion, 0, 0
+    peticiones = [pedir_tramo(sesion, esperar_turno, opciones['url'], opciones['token'], indicador, resolucion, inicio, fin, opciones['reintentos'], opciones.get('grabar'))
+                  for inicio, fin in tramos(desde, hasta, config.DIAS_POR_TRAMO[resolucion])]
+    resultados = await asyncio.gather(*peticiones, return_exceptions=True)
+    # Solo se añaden los tramos anteriores al primer fallo: el fichero queda sin huecos y la
+    # siguiente ejecución reanuda desde ahí
+    primer_fallo = next((i for i, r in enumerate(resultados) if isinstance(r, BaseException)), len(resultados))
+    fallo = resultados[primer_fallo] if primer_fallo < len(resultados) else None
+    series = [s for s in resultados[:primer_fallo] if not s.empty]
+    nuevas = anadir_filas(ruta, indicador['columna'], pd.concat(series), ultimo) if series else 0
+    if fallo is not None:
+        print(f"{nombre}_{resolucion}: descarga interrumpida ({fallo}); {nuevas} filas nuevas guardadas.")
+    else:
+        print(f"{nombre}_{resolucion}: {nuevas} filas nuevas en {len(peticiones)} peticiones (desde {desde}).")
+    return nombre, resolucion, nuevas, len(peticiones)
+
+
+async def actualizar(destino=config.ORIGEN_DIR, nombres=None, resoluciones=None, desde=config.FECHA_INICIO_HISTORICO, hasta=None,
+                     url=config.ESIOS_URL, token=config.ESIOS_TOKEN, conexiones=config.MAX_CONEXIONES,
+                     peticiones_por_segundo=config.PETICIONES_POR_SEGUNDO, reintentos=config.REINTENTOS, grabar=None):
+    os.makedirs(destino, exist_ok=True)
+    # Por defecto hasta la última hora completa (la hora en curso aún no tiene su valor definitivo)
+    hasta = hasta if hasta is not None else pd.Timestamp.now(tz='UTC').floor('h')
+    opciones = {'destino': destino, 'desde': desde, 'url': url, 'token': token, 'reintentos': reintentos, 'grabar': grabar}
+    esperar_turno = crear_limitador(peticiones_por_segundo)
+    # Sin timeout total: con el pool lleno, la espera por una conexión libre no cuenta como fallo
+    conector = aiohttp.TCPConnector(limit=conexiones)
+    async with aiohttp.ClientSession(connector=conector, timeout=aiohttp.ClientTimeout(total=None, sock_connect=config.TIMEOUT_S, sock_read=config.TIMEOUT_S)) as sesion:
+        claves = [(nombre, indicador, resolucion) for nombre, indicador in config.INDICADORES.items() if nombres is None or nombre in nombres
+                  for resolucion in indicador['resoluciones'] if resoluciones is None or resolucion in resoluciones]
+        resultados = await asyncio.gather(*[actualizar_indicador(sesion, esperar_turno, opciones, nombre, indicador, resolucion, hasta)
+                                            for nombre, indicador, resolucion in claves], return_exceptions=True)
+    # Un indicador que falla (p. ej. al escribir su fichero) no interrumpe la descarga de los demás
+    for i, ((nombre, _, resolucion), resultado) in enumerate(zip(claves, resultados)):
+        if isinstance(resultado, Exception):
+            print(f"{nombre}_{resolucion}: error en la actualización ({resultado}); se reintentará en la próxima ejecución.")
+            resultados[i] = (nombre, resolucion, 0, 0)
+    return resultados
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Descarga incremental de los indicadores de e·sios a parquet por indicador.")
+    parser.add_argument('--destino', default=config.ORIGEN_DIR)
+    parser.add_argument('--indicadores', nargs='+', choices=list(config.INDICADORES), help="Por defecto, todos")
+    parser.add_argument('--resoluciones', nargs='+', choices=list(config.PASOS), help="Por defecto, las de cada indicador")
+    parser.add_argument('--desde', default=str(config.FECHA_INICIO_HISTORICO.date()), help="Inicio para indicadores sin fichero local")
+    parser.add_argument('--hasta', help="Fin de la descarga, excluido (por defecto, la hora actual)")
+    parser.add_argument('--url', default=config.ESIOS_URL, help="URL base de la API (p. ej. la del servidor simulado)")
+    parser.add_argument('--conexiones', type=int, default=config.MAX_CONEXIONES)
+    parser.add_argument('--tasa', type=float, default=config.PETICIONES_POR_SEGUNDO, help="Peticiones por segundo (0 = sin límite)")
+    parser.add_argument('--reintentos', type=int, default=config.REINTENTOS)
+    parser.add_argument('--grabar', help="Directorio donde guardar las respuestas JSON para el servidor simulado")
+    args = parser.parse_args()
+
+    if not config.ESIOS_TOKEN and args.url == config.ESIOS_URL:
+        print("Aviso: ESIOS_TOKEN no está definido; la API de e·sios rechazará las peticiones.")
+    inicio = time.perf_counter()
+    resultado = asyncio.run(actualizar(
+        args.destino, args.indicadores, args.resoluciones, pd.Timestamp(args.desde, tz='UTC'),
+        pd.Timestamp(args.hasta, tz='UTC') if args.hasta else None, args.url, config.ESIOS_TOKEN,
+        args.conexiones, args.tasa, args.reintentos, args.grabar))
+    print(f"Descarga terminada en {time.perf_counter() - inicio:.1f} s: {sum(r[2] for r in resultado)} filas nuevas en {sum(r[3] for r in resultado)} peticiones.")
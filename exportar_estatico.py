@@ -0,0 +1,172 @@
+import argparse
+import gzip
+import json
+import os
+import re
+import shutil
+import time
+from datetime import datetime
+
+# Exportación estática del dashboard. Ejecuta una vez cada callback del servidor con los valores
+# iniciales del layout (a través del propio endpoint de Dash, con la misma serialización), incrusta
+# los resultados en el layout y escribe en un directorio todo lo que pide el navegador:
+#   index.html, _dash-layout, _dash-dependencies (solo callbacks de cliente) y los JS de Dash.
+# Cada fichero de texto se guarda también comprimido (.gz y, si está instalado el paquete brotli, .br).
+# servidor_estatico.py, o cualquier servidor de ficheros estáticos, lo sirve sin pandas ni cálculo.
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SALIDA_DEFECTO = "estatico"
+ARCHIVO_MANIFIESTO = "estatico.json"
+EXTENSIONES_COMPRIMIBLES = ('.html', '.js', '.css', '.json', '.ico', '.svg', '_dash-layout', '_dash-dependencies')
+# Propiedades de los controles cuyos callbacks dejan de tener servidor: se deshabilitan en la exportación
+PROPS_CONTROL = {'value', 'start_date', 'end_date', 'date'}
+# Huella de versión que Dash añade a los recursos de los paquetes de componentes
+HUELLA = re.compile(r"^v[\w-]+m[0-9a-fA-F]+$")
+
+
+def escribir(salida, ruta_relativa, contenido):
+    ruta = os.path.join(salida, ruta_relativa.lstrip('/'))
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(ruta, 'wb') as f:
+        f.write(contenido)
+    if ruta.endswith(EXTENSIONES_COMPRIMIBLES):
+        with open(ruta + ".gz", 'wb') as f:
+            f.write(gzip.compress(contenido, compresslevel=9))
+        if brotli is not None:
+            with open(ruta + ".br", 'wb') as f:
+                f.write(brotli.compress(contenido, quality=11))
+    return len(contenido)
+
+
+def componentes_por_id(nodo, acc):
+    # {id: props} de todos los componentes del layout serializado
+    if isinstance(nodo, dict):
+        props = nodo.get('props', {})
+        if 'id' in props:
+            acc[props['id']] = nodo
+        for valor in props.values():
+            componentes_por_id(valor, acc)
+    elif isinstance(nodo, list):
+        for valor in nodo:
+            componentes_por_id(valor, acc)
+    return acc
+
+
+def separar_salida(salida):
+    id_componente, _, prop = salida.rpartition('.')
+    return id_componente, prop
+
+
+def ejecutar_callbacks(cliente, layout, dependencias):
+    # Una pasada en el orden de registro: ningún callback del servidor depende de la salida de otro
+    componentes = componentes_por_id(layout, {})
+    valor = lambda e: componentes.get(e['id'], {}).get('props', {}).get(e['property'])
+    tiempos = {}
+    for dep in dependencias:
+        if dep.get('clientside_function'):
+            continue
+        # Varias salidas: Dash las codifica como `..id1.prop1...id2.prop2..`
+        salidas = [dict(zip(('id', 'property'), separar_salida(s))) for s in dep['output'].strip('.').split('...')]
+        cuerpo = {
+            'output': dep['output'],
+            'outputs': salidas if dep['output'].startswith('..') else salidas[0],
+            'inputs': [{'id': e['id'], 'property': e['property'], 'value': valor(e)} for e in dep['inputs']],
+            'state': [{'id': e['id'], 'property': e['property'], 'value': valor(e)} for e in dep.get('state', [])],
+            'changedPropIds': [],
+        }
+        inicio = time.perf_counter()
+        respuesta = cliente.post('/_dash-update-component', json=cuerpo)
+        tiempos[dep['output']] = time.perf_counter() - inicio
+        if respuesta.status_code == 204:
+            continue
+        if respuesta.status_code != 200:
+            raise RuntimeError(f"El callback de {dep['output']} respondió {respuesta.status_code}: {respuesta.data[:300]!r}")
+        for id_salida, props in respuesta.get_json()['response'].items():
+            componentes[id_salida]['props'].update(props)
+    return tiempos
+
+
+def deshabilitar_controles(layout, dependencias):
+    componentes = componentes_por_id(layout, {})
+    for dep in dependencias:
+        if dep.get('clientside_function'):
+            continue
+        for entrada in dep['inputs']:
+            componente = componentes.get(entrada['id'])
+            if componente is None or entrada['property'] not in PROPS_CONTROL:
+                continue
+            if componente.get('type') in ('RadioItems', 'Checklist'):
+                componente['props']['options'] = [dict(o, disabled=True) for o in componente['props'].get('options', [])]
+            else:
+                componente['props']['disabled'] = True
+
+
+def quitar_huella(ruta):
+    # Igual que Dash: `dash_renderer.v4_4_1m1700000000.min.js` -> `dash_renderer.min.js`
+    partes = ruta.split('/')
+    nombre = partes[-1].split('.')
+    if len(nombre) > 2 and HUELLA.match(nombre[1]):
+        partes[-1] = '.'.join([nombre[0]] + nombre[2:])
+    return '/'.join(partes)
+
+
+def rutas_locales(html):
+    return sorted(set(re.findall(r'(?:src|href)="(/[^"?]+)', html)))
+
+
+def exportar(salida=SALIDA_DEFECTO):
+    # La exportación es una foto fija: sin la sección en directo, que necesita el servidor en cada tick
+    os.environ['MODO_DIRECTO'] = '0'
+    import dashboard_app
+
+    app = dashboard_app.app
+    cliente = dashboard_app.server.test_client()
+    if os.path.exists(salida):
+        shutil.rmtree(salida)
+    os.makedirs(salida)
+
+    inicio = time.perf_counter()
+    html = cliente.get('/').data.decode('utf-8')
+    layout = cliente.get('/_dash-layout').get_json()
+    dependencias = cliente.get('/_dash-dependencies').get_json()
+    tiempos = ejecutar_callbacks(cliente, layout, dependencias)
+    deshabilitar_controles(layout, dependencias)
+    dependencias_cliente = [dep for dep in dependencias if dep.get('clientside_function')]
+
+    tamanos = {
+        'index.html': escribir(salida, 'index.html', html.encode('utf-8')),
+        '_dash-layout': escribir(salida, '_dash-layout', json.dumps(layout, separators=(',', ':')).encode('utf-8')),
+        '_dash-dependencies': escribir(salida, '_dash-dependencies', json.dumps(dependencias_cliente).encode('utf-8')),
+    }
+    # Recursos de Dash: los enlazados desde index.html (con la huella de versión) y todos los registrados,
+    # incluidos los fragmentos que los componentes cargan bajo demanda (async-graph.js, plotly...)
+    recursos = set(rutas_locales(html))
+    for paquete, rutas in app.registered_paths.items():
+        recursos.update(f"/_dash-component-suites/{paquete}/{ruta}" for ruta in rutas if not ruta.endswith('.map'))
+    for ruta in sorted(recursos):
+        respuesta = cliente.get(ruta)
+        if respuesta.status_code != 200:
+            print(f"Aviso: {ruta} respondió {respuesta.status_code}; no se exporta.")
+            continue
+        tamanos[ruta] = escribir(salida, quitar_huella(ruta), respuesta.data)
+
+    manifiesto = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'version_datos': dashboard_app.obtener_version_datos(),
+        'callbacks_s': tiempos,
+        'bytes': {'layout': tamanos['_dash-layout'], 'total': sum(tamanos.values())},
+    }
+    escribir(salida, ARCHIVO_MANIFIESTO, json.dumps(manifiesto, indent=2).encode('utf-8'))
+    print(f"Exportación estática en {salida}: {len(tamanos)} ficheros, layout de {tamanos['_dash-layout'] / 1024:.0f} KB, en {time.perf_counter() - inicio:.1f} s.")
+    return manifiesto
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Exporta el dashboard como ficheros estáticos precalculados.")
+    parser.add_argument('--salida', default=SALIDA_DEFECTO)
+    args = parser.parse_args()
+    exportar(args.salida)
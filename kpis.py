@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+from rampas import maximos_absolutos, puesto_en_catalogo
+
+# Cálculo de todos los bloques de KPIs del dashboard en una sola pasada sobre los datos.
+# Devuelve valores (no componentes) para que dashboard_app.py los pinte directamente en el
+# layout inicial, sin callbacks que reciban figuras completas desde el navegador.
+
+TS_EVALUACION = pd.Timestamp('2025-04-28 08:45:00')
+COLS_EVOLUCION = {'Eolica_MW': 'Eólica', 'SolarFotovoltaica_MW': 'Solar FV', 'Carbon_MW': 'Carbón', 'CicloCombinado_MW': 'Ciclo Combinado'}
+COLS_CONDICIONES = ['DemandaReal_MW', 'SaldoIntercambios_MW', 'TotalGeneracion_MW', 'PrecioMercado_EUR_MWh']
+COLS_COBERTURA = ['CoberturaRenovable_pct', 'CoberturaNoEmisora_pct']
+COLS_RAMPAS = {'DemandaReal_MW': 'Demanda', 'Eolica_MW': 'Eólica', 'SolarFotovoltaica_MW': 'Solar FV', 'CicloCombinado_MW': 'Ciclo Comb.', 'Hidraulica_MW': 'Hidráulica'}
+HORIZONTES_COMPARATIVA = ['1h', '4h', '24h']
+
+
+def ajustar_tz(ts, indice):
+    idx_tz = indice.tz
+    if idx_tz is not None and ts.tz is None: return ts.tz_localize(idx_tz)
+    if idx_tz is None and ts.tz is not None: return ts.tz_localize(None)
+    return ts
+
+
+def kpis_evolucion(df_horario, df_anual):
+    if df_horario is None or df_horario.empty:
+        return None
+    primer_anio, ultimo_anio = df_horario.index.min().year, df_horario.index.max().year
+    items = []
+    if primer_anio < ultimo_anio and df_anual is not None and not df_anual.empty:
+        cols = [c for c in COLS_EVOLUCION if c in df_anual.columns]
+        inicio = df_anual[cols].iloc[0].to_numpy(dtype=float)
+        fin = df_anual[cols].iloc[-1].to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cambio_pct = (fin - inicio) / inicio * 100
+        for col, v_ini, v_fin, cambio in zip(cols, inicio, fin, cambio_pct):
+            if df_anual[col].isnull().all():
+                continue
+            if np.isfinite(v_ini) and np.isfinite(v_fin) and v_ini > 0.1:
+                items.append({'label': COLS_EVOLUCION[col], 'cambio_pct': float(cambio)})
+            elif np.isfinite(v_fin):
+                items.append({'label': COLS_EVOLUCION[col], 'media_final': float(v_fin)})
+    return {'primer_anio': primer_anio, 'ultimo_anio': ultimo_anio, 'items': items}
+
+
+def kpis_incidente(df_incidente, ts_eval=TS_EVALUACION):
+    if df_incidente is None or df_incidente.empty:
+        return None, None, None
+    indice = df_incidente.index
+    ts_eval = ajustar_tz(ts_eval, indice)
+
+    # Una sola búsqueda de la marca de evaluación: exacta para las condiciones, la anterior más cercana para la cobertura
+    pos_asof = indice.searchsorted(ts_eval, side='right') - 1
+    exacto = pos_asof >= 0 and indice[pos_asof] == ts_eval
+    condiciones = {'ts': ts_eval, 'valores': None}
+    if exacto:
+        fila = df_incidente.iloc[pos_asof]
+        condiciones['valores'] = {c: float(fila[c]) for c in COLS_CONDICIONES if c in fila.index and pd.notna(fila[c])}
+    cobertura = {'ts': ts_eval, 'valores': None}
+    if pos_asof >= 0:
+        fila = df_incidente.iloc[pos_asof]
+        cobertura = {'ts': indice[pos_asof], 'valores': {c: float(fila[c]) for c in COLS_COBERTURA if c in fila.index and pd.notna(fila[c])}}
+
+    # Rampas de todas las columnas a la vez con el motor de rampas
+    cols = [c for c in COLS_RAMPAS if c in df_incidente.columns]
+    maximos = maximos_absolutos(df_incidente, cols, '15min')
+    rampas = [{'label': COLS_RAMPAS[col], 'valor': valor, 'ts': ts} for col, (ts, valor) in maximos.items()]
+    return condiciones, rampas, cobertura
+
+
+def comparativa_rampas(df_incidente, catalogo):
+    # Mayor rampa del periodo del incidente frente a los eventos del catálogo horario de todo el histórico
+    if df_incidente is None or df_incidente.empty or catalogo is None or catalogo.empty:
+        return []
+    cols = [c for c in COLS_RAMPAS if c in df_incidente.columns]
+    filas = []
+    for horizonte in HORIZONTES_COMPARATIVA:
+        for col, (ts, valor) in maximos_absolutos(df_incidente, cols, horizonte).items():
+            puesto, eventos = puesto_en_catalogo(catalogo, col, horizonte, valor, resolucion='hour')
+            if eventos.empty:
+                continue
+            record = eventos.iloc[eventos['rampa_MW'].abs().argmax()]
+            filas.append({'label': COLS_RAMPAS[col], 'horizonte': horizonte, 'valor': valor, 'ts': ts, 'puesto': puesto, 'n_eventos': len(eventos), 'record_valor': float(record['rampa_MW']), 'record_ts': record['fin']})
+    return filas
+
+
+def calcular_kpis(df_horario, df_incidente, agregados, catalogo_rampas=None):
+    condiciones, rampas, cobertura = kpis_incidente(df_incidente)
+    return {
+        'evolucion': kpis_evolucion(df_horario, agregados.get('anual') if agregados else None),
+        'incidente_inicio': condiciones,
+        'rampas': rampas,
+        'cobertura': cobertura,
+        'comparativa_rampas': comparativa_rampas(df_incidente, catalogo_rampas),
+    }
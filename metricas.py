@@ -0,0 +1,191 @@
+import contextlib
+import cProfile
+import os
+import threading
+import time
+from datetime import datetime
+
+# Métricas de rendimiento del dashboard en formato de texto de Prometheus, sin dependencias
+# externas. Los hooks de Flask miden cada petición y, en las de callbacks de Dash
+# (`/_dash-update-component`), el tiempo real, el tiempo de CPU del hilo y los bytes de la
+# respuesta por callback. La caché de figuras y la capa de datos registran aciertos/fallos y
+# tiempos de carga con `observar` y `contar`. Las métricas son de cada proceso: con varios
+# workers de gunicorn, cada scrape de /metrics responde el worker que atiende la petición.
+#
+# Perfilado bajo demanda (solo si se define METRICAS_PERFILES_DIR):
+#   GET /metrics/perfilar?callback=update_rampas_fino&veces=1  -> perfila las próximas ejecuciones
+#   o la cabecera `X-Perfilar: 1` en una petición concreta. Cada traza se guarda como .prof (pstats).
+
+PERFILES_DIR = os.environ.get("METRICAS_PERFILES_DIR")
+RUTA_CALLBACKS = "/_dash-update-component"
+
+BUCKETS_SEGUNDOS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_BYTES = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+HISTOGRAMAS = {
+    'dashboard_peticion_duracion_segundos': ("Tiempo real de cada petición HTTP por ruta.", BUCKETS_SEGUNDOS),
+    'dashboard_callback_duracion_segundos': ("Tiempo real de cada callback de Dash, incluida la serialización.", BUCKETS_SEGUNDOS),
+    'dashboard_callback_cpu_segundos': ("Tiempo de CPU del hilo que atiende cada callback.", BUCKETS_SEGUNDOS),
+    'dashboard_callback_respuesta_bytes': ("Tamaño de la respuesta de cada callback.", BUCKETS_BYTES),
+    'dashboard_carga_datos_segundos': ("Tiempo de las cargas de datos por etapa y fichero.", BUCKETS_SEGUNDOS),
+}
+CONTADORES = {
+    'dashboard_cache_figuras_total': "Consultas a la caché de figuras por callback y resultado (acierto/fallo).",
+    'dashboard_callback_errores_total': "Respuestas de callbacks con código de error.",
+    'dashboard_perfiles_total': "Trazas de cProfile guardadas por callback.",
+}
+
+_bloqueo = threading.Lock()
+_series_histogramas = {nombre: {} for nombre in HISTOGRAMAS}  # nombre -> {etiquetas: [cuentas por bucket..., suma, n]}
+_series_contadores = {nombre: {} for nombre in CONTADORES}
+_perfilado_pendiente = {}  # callback -> ejecuciones que quedan por perfilar
+
+
+def observar(nombre, valor, **etiquetas):
+    buckets = HISTOGRAMAS[nombre][1]
+    clave = tuple(sorted(etiquetas.items()))
+    with _bloqueo:
+        serie = _series_histogramas[nombre].setdefault(clave, [0] * len(buckets) + [0.0, 0])
+        for i, limite in enumerate(buckets):
+            if valor <= limite:
+                serie[i] += 1
+        serie[-2] += valor
+        serie[-1] += 1
+
+
+def contar(nombre, incremento=1, **etiquetas):
+    clave = tuple(sorted(etiquetas.items()))
+    with _bloqueo:
+        _series_contadores[nombre][clave] = _series_contadores[nombre].get(clave, 0) + incremento
+
+
+@contextlib.contextmanager
+def cronometro(nombre, **etiquetas):
+    # with cronometro('dashboard_carga_datos_segundos', etapa='apertura', fichero=...): ...
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        observar(nombre, time.perf_counter() - inicio, **etiquetas)
+
+
+def _formato_etiquetas(pares):
+    if not pares:
+        return ""
+    texto = ",".join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in pares)
+    return "{" + texto + "}"
+
+
+def _formato_numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def exponer():
+    # Texto en formato de exposición de Prometheus (versión 0.0.4)
+    lineas = []
+    with _bloqueo:
+        for nombre, (ayuda, buckets) in HISTOGRAMAS.items():
+            lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} histogram"]
+            for clave, serie in sorted(_series_histogramas[nombre].items()):
+                for limite, cuenta in zip(buckets, serie):
+                    lineas.append(f"{nombre}_bucket{_formato_etiquetas(clave + (('le', _formato_numero(limite)),))} {cuenta}")
+                lineas.append(f"{nombre}_bucket{_formato_etiquetas(clave + (('le', '+Inf'),))} {serie[-1]}")
+                lineas.append(f"{nombre}_sum{_formato_etiquetas(clave)} {_formato_numero(serie[-2])}")
+                lineas.append(f"{nombre}_count{_formato_etiquetas(clave)} {serie[-1]}")
+        for nombre, ayuda in CONTADORES.items():
+            lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} counter"]
+            for clave, valor in sorted(_series_contadores[nombre].items()):
+                lineas.append(f"{nombre}{_formato_etiquetas(clave)} {valor}")
+    return "\n".join(lineas) + "\n"
+
+
+def _nombre_callback(app, cuerpo):
+    # Nombre de la función del callback a partir del `output` de la petición de Dash
+    salida = (cuerpo or {}).get('output', '')
+    callback = app.callback_map.get(salida, {}).get('callback')
+    return getattr(callback, '__name__', None) or salida or 'desconocido'
+
+
+def _reservar_perfil(callback, cabecera):
+    if PERFILES_DIR is None:
+        return False
+    if cabecera:
+        return True
+    with _bloqueo:
+        pendientes = _perfilado_pendiente.get(callback, 0)
+        if pendientes <= 0:
+            return False
+        _perfilado_pendiente[callback] = pendientes - 1
+        return True
+
+
+def _guardar_perfil(perfil, callback):
+    os.makedirs(PERFILES_DIR, exist_ok=True)
+    ruta = os.path.join(PERFILES_DIR, f"{callback}-{datetime.now():%Y%m%d-%H%M%S-%f}-{os.getpid()}.prof")
+    perfil.dump_stats(ruta)
+    contar('dashboard_perfiles_total', callback=callback)
+    print(f"Perfil de {callback} guardado en {ruta}")
+    return ruta
+
+
+def instrumentar(app):
+    # Registra los hooks de medida y las rutas /metrics y /metrics/perfilar en el servidor Flask de la app
+    from flask import Response, g, request
+
+    server = app.server
+
+    @server.before_request
+    def _inicio_peticion():
+        g.metricas_inicio = (time.perf_counter(), time.thread_time())
+        g.metricas_callback = None
+        g.metricas_perfil = None
+        if request.path.endswith(RUTA_CALLBACKS):
+            g.metricas_callback = _nombre_callback(app, request.get_json(silent=True))
+            if _reservar_perfil(g.metricas_callback, request.headers.get('X-Perfilar')):
+                perfil = cProfile.Profile()
+                try:
+                    perfil.enable()
+                    g.metricas_perfil = perfil
+                except ValueError:
+                    # Solo puede haber un perfilador activo por proceso: esta petición se queda sin traza
+                    print(f"No se pudo perfilar {g.metricas_callback}: hay otro perfil en curso.")
+
+    @server.after_request
+    def _fin_peticion(response):
+        inicio = getattr(g, 'metricas_inicio', None)
+        if inicio is None:
+            return response
+        duracion, cpu = time.perf_counter() - inicio[0], time.thread_time() - inicio[1]
+        regla = request.url_rule.rule if request.url_rule is not None else 'sin_ruta'
+        observar('dashboard_peticion_duracion_segundos', duracion, ruta=regla, metodo=request.method)
+        callback = g.metricas_callback
+        if callback is not None:
+            if g.metricas_perfil is not None:
+                g.metricas_perfil.disable()
+                response.headers['X-Perfil'] = os.path.basename(_guardar_perfil(g.metricas_perfil, callback))
+            observar('dashboard_callback_duracion_segundos', duracion, callback=callback)
+            observar('dashboard_callback_cpu_segundos', cpu, callback=callback)
+            if not response.direct_passthrough:
+                observar('dashboard_callback_respuesta_bytes', response.calculate_content_length() or 0, callback=callback)
+            if response.status_code >= 400:
+                contar('dashboard_callback_errores_total', callback=callback, codigo=response.status_code)
+        return response
+
+    @server.route('/metrics')
+    def _metricas():
+        return Response(exponer(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    @server.route('/metrics/perfilar')
+    def _perfilar():
+        if PERFILES_DIR is None:
+            return Response("Perfilado deshabilitado: defina METRICAS_PERFILES_DIR.\n", status=404, mimetype='text/plain')
+        callback = request.args.get('callback', '')
+        nombres = {getattr(c.get('callback'), '__name__', None) for c in app.callback_map.values()}
+        if callback not in nombres:
+            return Response(f"Callback desconocido. Disponibles: {', '.join(sorted(n for n in nombres if n))}\n", status=400, mimetype='text/plain')
+        veces = max(request.args.get('veces', 1, type=int), 1)
+        with _bloqueo:
+            _perfilado_pendiente[callback] = _perfilado_pendiente.get(callback, 0) + veces
+        return Response(f"Se perfilarán las próximas {veces} ejecuciones de {callback} en {PERFILES_DIR}.\n", mimetype='text/plain')
+
+    return app
@@ -0,0 +1,140 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Motor de rampas: variación de cada columna entre t - horizonte y t, calculada para todas
+# las columnas a la vez sobre la matriz de valores, y catálogo de los k mayores eventos
+# (subidas y bajadas) por tecnología y horizonte sobre todo el histórico.
+
+HORIZONTES = {
+    '15min': pd.Timedelta(minutes=15),
+    '1h': pd.Timedelta(hours=1),
+    '4h': pd.Timedelta(hours=4),
+    '24h': pd.Timedelta(hours=24),
+}
+TOP_K = 10
+ARCHIVO_CATALOGO = "catalogo_rampas.parquet"
+COLS_CATALOGO = ['resolucion', 'columna', 'horizonte', 'signo', 'puesto', 'inicio', 'fin', 'rampa_MW']
+
+
+def columnas_rampa(df):
+    return [c for c in df.columns if c.endswith('_MW')]
+
+
+def paso_indice(indice):
+    if len(indice) < 2:
+        return None
+    return pd.Timedelta(np.median(np.diff(indice.asi8)), unit='ns')
+
+
+def pasos_horizonte(indice, horizonte):
+    paso = paso_indice(indice)
+    if paso is None or horizonte < paso or horizonte % paso != pd.Timedelta(0):
+        return None
+    return int(horizonte / paso)
+
+
+def matriz_rampas(df, columnas, horizonte):
+    # Devuelve (valores, posiciones_fin): rampa[i] = x[i + k] - x[i], válida solo si ambos
+    # extremos están separados exactamente por el horizonte (los huecos del índice dan NaN)
+    duracion = HORIZONTES[horizonte]
+    k = pasos_horizonte(df.index, duracion)
+    if k is None or len(df) <= k:
+        return None, None
+    valores = df[columnas].to_numpy(dtype=float)
+    tiempos = df.index.asi8
+    rampas = valores[k:] - valores[:-k]
+    rampas[(tiempos[k:] - tiempos[:-k]) != duracion.value] = np.nan
+    return rampas, np.arange(k, len(df))
+
+
+def calcular_rampas(df, columnas, horizonte):
+    rampas, posiciones = matriz_rampas(df, columnas, horizonte)
+    if rampas is None:
+        return pd.DataFrame(index=df.index, columns=columnas, dtype=float)
+    salida = np.full((len(df), len(columnas)), np.nan)
+    salida[posiciones] = rampas
+    return pd.DataFrame(salida, index=df.index, columns=columnas)
+
+
+def maximos_absolutos(df, columnas, horizonte):
+    # Rampa de mayor magnitud por columna: {columna: (instante_fin, valor)}
+    rampas, posiciones = matriz_rampas(df, columnas, horizonte)
+    if rampas is None:
+        return {}
+    magnitud = np.where(np.isnan(rampas), -np.inf, np.abs(rampas))
+    pos_max = magnitud.argmax(axis=0)
+    return {col: (df.index[posiciones[pos_max[j]]], float(rampas[pos_max[j], j])) for j, col in enumerate(columnas) if np.isfinite(magnitud[pos_max[j], j])}
+
+
+def top_k_separados(valores, k, exclusion):
+    # Los k mayores valores separados al menos `exclusion` posiciones, para que una misma
+    # rampa no aparezca varias veces por ventanas solapadas
+    validos = np.flatnonzero(~np.isnan(valores))
+    # Cada evento elegido bloquea como mucho 2·exclusion - 1 posiciones: basta con ordenar
+    # los k·2·exclusion mayores candidatos en lugar de toda la serie
+    n_candidatos = k * 2 * exclusion
+    if validos.size > n_candidatos:
+        validos = validos[np.argpartition(-valores[validos], n_candidatos)[:n_candidatos]]
+    orden = validos[np.argsort(-valores[validos], kind='stable')]
+    bloqueado = np.zeros(valores.size, dtype=bool)
+    elegidos = []
+    for pos in orden:
+        if bloqueado[pos]:
+            continue
+        elegidos.append(pos)
+        if len(elegidos) == k:
+            break
+        bloqueado[max(pos - exclusion + 1, 0):pos + exclusion] = True
+    return elegidos
+
+
+def catalogo_rampas(df, resolucion, horizontes=HORIZONTES, k=TOP_K):
+    columnas = columnas_rampa(df)
+    filas = []
+    for horizonte in horizontes:
+        rampas, posiciones = matriz_rampas(df, columnas, horizonte)
+        if rampas is None:
+            continue
+        pasos = int(posiciones[0])
+        for j, col in enumerate(columnas):
+            for signo, valores in (('subida', rampas[:, j]), ('bajada', -rampas[:, j])):
+                for puesto, pos in enumerate(top_k_separados(valores, k, pasos), start=1):
+                    fin = posiciones[pos]
+                    filas.append((resolucion, col, horizonte, signo, puesto, df.index[fin - pasos], df.index[fin], float(rampas[pos, j])))
+    return pd.DataFrame(filas, columns=COLS_CATALOGO)
+
+
+def construir_catalogo(frames, k=TOP_K):
+    # frames: {resolucion: DataFrame}. Cada horizonte se calcula en las resoluciones que lo permiten.
+    partes = [catalogo_rampas(df, resolucion, k=k) for resolucion, df in frames.items() if df is not None and not df.empty]
+    return pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=COLS_CATALOGO)
+
+
+def guardar_catalogo(catalogo, destino):
+    ruta = os.path.join(destino, ARCHIVO_CATALOGO)
+    catalogo.to_parquet(ruta + ".tmp", index=False)
+    os.replace(ruta + ".tmp", ruta)
+
+
+def cargar_catalogo(data_dir, cargar_frames, rutas_origen):
+    # El catálogo guardado si es al menos tan reciente como los datos; si no, se construye con los
+    # DataFrames que devuelve `cargar_frames()` (solo se cargan en ese caso)
+    ruta = os.path.join(data_dir, ARCHIVO_CATALOGO)
+    origenes = [r for r in rutas_origen if os.path.exists(r)]
+    if os.path.exists(ruta) and origenes and all(os.path.getmtime(ruta) >= os.path.getmtime(r) for r in origenes):
+        return pd.read_parquet(ruta)
+    return construir_catalogo(cargar_frames())
+
+
+def puesto_en_catalogo(catalogo, columna, horizonte, valor, resolucion=None):
+    # Posición que ocuparía `valor` entre los eventos catalogados del mismo signo (None si queda fuera del top-k)
+    signo = 'subida' if valor >= 0 else 'bajada'
+    eventos = catalogo[(catalogo['columna'] == columna) & (catalogo['horizonte'] == horizonte) & (catalogo['signo'] == signo)]
+    if resolucion is not None:
+        eventos = eventos[eventos['resolucion'] == resolucion]
+    if eventos.empty:
+        return None, eventos
+    superiores = int((eventos['rampa_MW'].abs().to_numpy() > abs(valor)).sum())
+    return (superiores + 1 if superiores < len(eventos) else None), eventos
@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+
+import pandas as pd
+from aiohttp import web
+
+import config
+from esios_api import clave_grabacion
+
+# Servidor HTTP local que imita el endpoint `/indicators/{id}` de e·sios para probar y medir
+# esios_api.py sin red. Responde con las respuestas grabadas (`esios_api.py --grabar DIR`)
+# cuando hay una para la misma petición y, si no, construye la respuesta a partir de los parquet
+# por indicador de un directorio (p. ej. `datos_esios copy2` o los de datos_sinteticos.py).
+# Puede añadir latencia y errores 429/503 para ejercitar la concurrencia y los reintentos:
+#   python servidor_esios_simulado.py --parquet "datos_esios copy2" --latencia 0.3 --errores 0.05
+#   ESIOS_URL=http://127.0.0.1:8085 python esios_api.py --destino /tmp/esios
+
+PUERTO_DEFECTO = 8085
+INDICADORES_POR_ID = {indicador['id']: (nombre, indicador) for nombre, indicador in config.INDICADORES.items()}
+
+
+def respuesta_desde_parquet(directorio, id_indicador, parametros):
+    nombre, indicador = INDICADORES_POR_ID[id_indicador]
+    ruta = os.path.join(directorio, f"{nombre}_{parametros['time_trunc']}.parquet")
+    valores = []
+    if os.path.exists(ruta):
+        inicio, fin = pd.Timestamp(parametros['start_date']), pd.Timestamp(parametros['end_date'])
+        df = pd.read_parquet(ruta, filters=[('Timestamp', '>=', inicio), ('Timestamp', '<=', fin)])
+        serie = df.iloc[:, 0].dropna()
+        geo_id = indicador.get('geo_id')
+        locales = serie.index.tz_convert('Europe/Madrid')
+        valores = [{'value': float(valor), 'datetime': local.isoformat(timespec='milliseconds'), 'datetime_utc': utc.strftime('%Y-%m-%dT%H:%M:%SZ'), 'geo_id': geo_id}
+                   for valor, local, utc in zip(serie.to_numpy(), locales, serie.index)]
+    return {'indicator': {'id': id_indicador, 'short_name': nombre, 'values': valores}}
+
+
+def crear_app(directorio_parquet=None, directorio_grabaciones=None, latencia=0.0, errores=0.0):
+    estadisticas = {'peticiones': 0, 'errores_simulados': 0, 'grabadas': 0}
+
+    async def indicador(request):
+        estadisticas['peticiones'] += 1
+        if latencia:
+            await asyncio.sleep(latencia * random.uniform(0.5, 1.5))
+        if random.random() < errores:
+            estadisticas['errores_simulados'] += 1
+            estado = random.choice([429, 503])
+            return web.json_response({'message': 'error simulado'}, status=estado, headers={'Retry-After': '1'} if estado == 429 else None)
+        id_indicador = int(request.match_info['id'])
+        if id_indicador not in INDICADORES_POR_ID:
+            return web.json_response({'message': f"Indicador {id_indicador} no configurado"}, status=404)
+        parametros = dict(request.query)
+        if directorio_grabaciones:
+            ruta = os.path.join(directorio_grabaciones, clave_grabacion(id_indicador, parametros))
+            if os.path.exists(ruta):
+                estadisticas['grabadas'] += 1
+                with open(ruta) as f:
+                    return web.json_response(json.load(f))
+        if directorio_parquet is None:
+            return web.json_response({'message': 'Respuesta no grabada'}, status=404)
+        respuesta = await asyncio.to_thread(respuesta_desde_parquet, directorio_parquet, id_indicador, parametros)
+        return web.json_response(respuesta)
+
+    async def estado(request):
+        return web.json_response(estadisticas)
+
+    app = web.Application()
+    app.router.add_get('/indicators/{id}', indicador)
+    app.router.add_get('/estado', estado)
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Servidor local que imita la API de e·sios con respuestas grabadas o parquet locales.")
+    parser.add_argument('--parquet', default=config.ORIGEN_DIR, help="Directorio de parquet por indicador con los que responder ('' para usar solo las grabaciones)")
+    parser.add_argument('--grabaciones', help="Directorio de respuestas JSON grabadas con esios_api.py --grabar")
+    parser.add_argument('--puerto', type=int, default=PUERTO_DEFECTO)
+    parser.add_argument('--latencia', type=float, default=0.0, help="Latencia media por petición, en segundos")
+    parser.add_argument('--errores', type=float, default=0.0, help="Fracción de peticiones que responden 429/503")
+    args = parser.parse_args()
+    web.run_app(crear_app(args.parquet or None, args.grabaciones, args.latencia, args.errores), host='127.0.0.1', port=args.puerto)
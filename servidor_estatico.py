@@ -0,0 +1,63 @@
+import os
+
+from flask import Flask, Response, abort, request
+
+from exportar_estatico import ARCHIVO_MANIFIESTO, SALIDA_DEFECTO, quitar_huella
+
+# Sirve la exportación de exportar_estatico.py sin dash, pandas ni cálculo en la petición:
+#   gunicorn servidor_estatico:server
+# Elige la versión precomprimida (.br o .gz) según Accept-Encoding y sirve los recursos con huella
+# de versión con caché larga, como hace Dash. Directorio de la exportación en ESTATICO_DIR.
+
+ESTATICO_DIR = os.path.abspath(os.environ.get("ESTATICO_DIR", SALIDA_DEFECTO))
+TIPOS = {
+    '.html': 'text/html; charset=utf-8', '.js': 'application/javascript', '.css': 'text/css',
+    '.json': 'application/json', '.ico': 'image/x-icon', '.svg': 'image/svg+xml',
+    # El renderer de Dash solo interpreta estas dos respuestas si llegan como JSON
+    '_dash-layout': 'application/json', '_dash-dependencies': 'application/json',
+}
+CODIFICACIONES = (('br', '.br'), ('gzip', '.gz'))
+
+server = Flask(__name__)
+
+
+def tipo_contenido(ruta):
+    for final, tipo in TIPOS.items():
+        if ruta.endswith(final):
+            return tipo
+    return 'application/octet-stream'
+
+
+@server.route('/', defaults={'ruta': 'index.html'})
+@server.route('/<path:ruta>')
+def servir(ruta):
+    relativa = quitar_huella(ruta)
+    completa = os.path.normpath(os.path.join(ESTATICO_DIR, relativa))
+    if not completa.startswith(ESTATICO_DIR + os.sep) or not os.path.isfile(completa):
+        abort(404)
+    aceptadas = request.headers.get('Accept-Encoding', '')
+    codificacion = None
+    for nombre, extension in CODIFICACIONES:
+        if nombre in aceptadas and os.path.isfile(completa + extension):
+            completa, codificacion = completa + extension, nombre
+            break
+    with open(completa, 'rb') as f:
+        respuesta = Response(f.read(), content_type=tipo_contenido(relativa))
+    respuesta.headers['Vary'] = 'Accept-Encoding'
+    if codificacion:
+        respuesta.headers['Content-Encoding'] = codificacion
+    # Los recursos con huella no cambian nunca; el resto se revalida al regenerar la exportación
+    respuesta.headers['Cache-Control'] = 'public, max-age=31536000, immutable' if relativa != ruta else 'no-cache'
+    return respuesta
+
+
+@server.route('/_dash-update-component', methods=['POST'])
+def sin_callbacks():
+    # La exportación no registra callbacks de servidor; responder "sin cambios" si alguno llegara
+    return Response(status=204)
+
+
+if __name__ == '__main__':
+    if not os.path.exists(os.path.join(ESTATICO_DIR, ARCHIVO_MANIFIESTO)):
+        print(f"No hay exportación en {ESTATICO_DIR}; generarla con: python exportar_estatico.py --salida {ESTATICO_DIR}")
+    server.run(host='0.0.0.0', port=int(os.environ.get("PORT", "8050")))
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+from rampas import paso_indice, top_k_separados
+
+# Búsqueda de episodios parecidos a una ventana de referencia en todo el histórico ("¿cuándo más
+# estuvo el sistema así?"). Se compara la forma, no el nivel: distancia euclídea entre ventanas
+# z-normalizadas, calculada para todas las posiciones a la vez con el algoritmo MASS (producto
+# escalar deslizante por FFT y medias y desviaciones móviles con sumas acumuladas), O(n log n) por
+# serie. Con varias series la distancia es la media cuadrática de las de cada una, y los k mejores
+# episodios se eligen sin solaparse entre sí ni con la propia referencia.
+
+TOP_K = 10
+COLS_RESULTADO = ['puesto', 'inicio', 'fin', 'distancia', 'correlacion']
+
+
+def _productos_deslizantes(serie, consulta):
+    # producto[i] = sum_j consulta[j] * serie[i + j] para cada posición i, por convolución con FFT
+    n, m = serie.size, consulta.size
+    tamano = 1 << int(np.ceil(np.log2(n + m)))
+    producto = np.fft.irfft(np.fft.rfft(serie, tamano) * np.fft.rfft(consulta[::-1], tamano), tamano)
+    return producto[m - 1:n]
+
+
+def _sumas_moviles(valores, m):
+    acumulado = np.concatenate([[0.0], np.cumsum(valores)])
+    return acumulado[m:] - acumulado[:-m]
+
+
+def perfil_distancias(serie, consulta):
+    # Distancia z-normalizada de `consulta` (m valores sin huecos) a cada ventana de m valores de `serie`:
+    # n - m + 1 distancias, inf en las ventanas con algún NaN
+    serie, consulta = np.asarray(serie, dtype=float), np.asarray(consulta, dtype=float)
+    m = consulta.size
+    huecos = np.isnan(serie)
+    # Centrar antes de acumular cuadrados evita perder precisión con valores de decenas de miles de MW
+    x = np.where(huecos, 0.0, serie - np.nanmean(serie))
+    q = consulta - consulta.mean()
+    medias = _sumas_moviles(x, m) / m
+    desviaciones = np.sqrt(np.maximum(_sumas_moviles(x * x, m) / m - medias ** 2, 0))
+    # Con la consulta centrada, sum(q * x) ya es la covarianza sin restar la media de cada ventana
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correlacion = _productos_deslizantes(x, q) / (m * q.std() * desviaciones)
+    correlacion = np.clip(np.where(desviaciones > 0, correlacion, 0.0), -1, 1)
+    distancias = np.sqrt(2 * m * (1 - correlacion))
+    distancias[_sumas_moviles(huecos.astype(float), m) > 0] = np.inf
+    return distancias
+
+
+def rejilla_regular(df):
+    # Reindexa a paso constante (los huecos del índice pasan a ser NaN) para que posición = tiempo
+    paso = paso_indice(df.index)
+    if paso is None:
+        return df
+    return df.reindex(pd.date_range(df.index[0], df.index[-1], freq=paso))
+
+
+def buscar_similares(df, inicio, fin, columnas, k=TOP_K, exclusion=None):
+    # Devuelve (resultados, columnas usadas, frame regular). `exclusion` (en posiciones, por defecto el
+    # largo de la ventana) es la separación mínima entre episodios para que no se repitan desplazados.
+    vacio = pd.DataFrame(columns=COLS_RESULTADO)
+    columnas = [c for c in columnas if c in df.columns]
+    if df.empty or not columnas:
+        return vacio, [], df
+    df = rejilla_regular(df[columnas])
+    consulta = df.loc[inicio:fin]
+    m = len(consulta)
+    if m < 3 or m >= len(df):
+        return vacio, [], df
+    cuadrados = np.zeros(len(df) - m + 1)
+    usadas = []
+    for col in columnas:
+        q = consulta[col].to_numpy(dtype=float)
+        # Una serie con huecos o constante en la referencia no tiene forma que comparar
+        if np.isnan(q).any() or np.nanstd(q) == 0:
+            continue
+        cuadrados += perfil_distancias(df[col].to_numpy(dtype=float), q) ** 2
+        usadas.append(col)
+    if not usadas:
+        return vacio, [], df
+    distancias = np.sqrt(cuadrados / len(usadas))
+    # La referencia y las ventanas que se solapan con ella no cuentan como episodios parecidos
+    pos_consulta = df.index.get_loc(consulta.index[0])
+    distancias[max(pos_consulta - m + 1, 0):pos_consulta + m] = np.inf
+    puntuaciones = np.where(np.isfinite(distancias), -distancias, np.nan)
+    elegidos = top_k_separados(puntuaciones, k, exclusion or m)
+    paso = df.index[1] - df.index[0]
+    resultados = pd.DataFrame([(puesto, df.index[pos], df.index[pos] + (m - 1) * paso, distancias[pos], 1 - distancias[pos] ** 2 / (2 * m))
+                               for puesto, pos in enumerate(elegidos, start=1)], columns=COLS_RESULTADO)
+    return resultados, usadas, df
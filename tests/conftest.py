@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from datos_sinteticos import generar_series
+
+# Datos de origen para las pruebas: parquet por indicador y resolución, como los de ORIGEN_DIR,
+# generados con datos_sinteticos.py para unos pocos días.
+
+FIN = pd.Timestamp('2025-04-29 00:00', tz='UTC')
+DIAS = 12
+
+
+@pytest.fixture(scope='session')
+def series_origen():
+    # {fichero: serie} de todos los indicadores de config.INDICADORES
+    df = generar_series(FIN - pd.Timedelta(days=DIAS), FIN)
+    df_hora = df.resample('h').mean()
+    return {f"{nombre}_{resolucion}.parquet": (df_hora if resolucion == 'hour' else df)[datos['columna']].round(3)
+            for nombre, datos in config.INDICADORES.items() for resolucion in datos['resoluciones']}
+
+
+def escribir_origen(directorio, series, hasta):
+    # Escribe cada fichero con las filas hasta `hasta` (un Timestamp o {fichero: Timestamp}), incluida
+    os.makedirs(directorio, exist_ok=True)
+    for nombre, serie in series.items():
+        corte = hasta.get(nombre, FIN) if isinstance(hasta, dict) else hasta
+        serie.loc[:corte].to_frame().to_parquet(os.path.join(directorio, nombre))
@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+
+import construir_datos
+from almacen import leer_ventana
+from conftest import FIN, escribir_origen
+
+
+def leer_salidas(destino):
+    return {resolucion: pd.read_parquet(os.path.join(destino, config['salida'])) for resolucion, config in construir_datos.RESOLUCIONES.items()}
+
+
+def comprobar_igual_a_completa(origen, destino, tmp_path):
+    completo = str(tmp_path / "completo")
+    construir_datos.construir(origen, completo, completo=True)
+    incremental, referencia = leer_salidas(destino), leer_salidas(completo)
+    for resolucion in construir_datos.RESOLUCIONES:
+        pdt.assert_frame_equal(incremental[resolucion][referencia[resolucion].columns], referencia[resolucion], check_exact=False, rtol=1e-9)
+        pdt.assert_frame_equal(leer_ventana(destino, resolucion), leer_ventana(completo, resolucion), check_exact=False, rtol=1e-9)
+
+
+def test_incremental_igual_a_reconstruccion(series_origen, tmp_path):
+    origen, destino = str(tmp_path / "origen"), str(tmp_path / "datos")
+    # Los indicadores avanzan a ritmos distintos entre ejecuciones, como con esios_api.py
+    for paso, retraso_eolica in ((5, 0), (3, 6), (1, 0), (0, 0)):
+        corte = FIN - pd.Timedelta(days=paso)
+        escribir_origen(origen, series_origen, {nombre: corte - pd.Timedelta(hours=retraso_eolica) if 'eolica' in nombre else corte for nombre in series_origen})
+        construir_datos.construir(origen, destino)
+    comprobar_igual_a_completa(origen, destino, tmp_path)
+
+
+def test_sin_cambios_no_reescribe(series_origen, tmp_path):
+    origen, destino = str(tmp_path / "origen"), str(tmp_path / "datos")
+    escribir_origen(origen, series_origen, FIN)
+    assert construir_datos.construir(origen, destino)
+    ruta = os.path.join(destino, construir_datos.RESOLUCIONES['hour']['salida'])
+    mtime = os.stat(ruta).st_mtime_ns
+    assert not construir_datos.construir(origen, destino)
+    assert os.stat(ruta).st_mtime_ns == mtime
+
+
+def test_historico_modificado_se_relee(series_origen, tmp_path):
+    origen, destino = str(tmp_path / "origen"), str(tmp_path / "datos")
+    # Un hueco en el pasado que e·sios rellena después, junto con filas nuevas: el fichero no solo crece al final
+    nombre = 'demanda_real_fifteen_minutes.parquet'
+    con_hueco = dict(series_origen)
+    con_hueco[nombre] = series_origen[nombre].drop(series_origen[nombre].index[10:20])
+    escribir_origen(origen, con_hueco, FIN - pd.Timedelta(days=2))
+    construir_datos.construir(origen, destino)
+    escribir_origen(origen, series_origen, FIN)
+    construir_datos.construir(origen, destino)
+    comprobar_igual_a_completa(origen, destino, tmp_path)
+
+
+def test_indicadores_horarios_en_la_rejilla_de_15_minutos(series_origen, tmp_path):
+    origen, destino = str(tmp_path / "origen"), str(tmp_path / "datos")
+    escribir_origen(origen, series_origen, FIN)
+    construir_datos.construir(origen, destino)
+    df = leer_salidas(destino)['fifteen_minutes']
+    precio = series_origen['precio_mercado_diario_hour.parquet']
+    # Empieza con los indicadores a 15 minutos y cada intervalo toma el valor de su hora
+    assert df.index.min() == series_origen['demanda_real_fifteen_minutes.parquet'].index.min()
+    np.testing.assert_allclose(df['PrecioMercado_EUR_MWh'].loc[:precio.index[-1]].to_numpy(), precio.reindex(df.index[df.index <= precio.index[-1]], method='ffill').to_numpy())
+    # El total incluye las tecnologías que solo se publican por horas
+    assert df['TotalGeneracion_MW'].gt(df[['SolarFotovoltaica_MW', 'Eolica_MW', 'Hidraulica_MW', 'Nuclear_MW']].sum(axis=1)).all()
+    assert {'SolarTermica_MW', 'TermicaRenovable_MW', 'CogeneracionYResiduos_MW', 'EmisionesCO2_Factor_tCO2_MWh'} <= set(df.columns)
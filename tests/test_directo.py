@@ -0,0 +1,95 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import construir_datos
+import directo
+from conftest import FIN, escribir_origen
+
+LENTO = 'generacion_eolica_fifteen_minutes.parquet'
+ESTANCADO = 'generacion_ciclo_combinado_fifteen_minutes.parquet'
+INICIO = FIN - pd.Timedelta(days=3)
+
+
+@pytest.fixture(autouse=True)
+def estado_limpio():
+    directo._estado.update(ficheros={}, cola=pd.DataFrame(), sumas=pd.DataFrame(), cuentas=pd.DataFrame(), completo=None, limite=None)
+
+
+@pytest.fixture
+def recargas(monkeypatch):
+    llamadas = []
+    original = directo._cargar_completo
+    monkeypatch.setattr(directo, '_cargar_completo', lambda *args: (llamadas.append(args), original(*args))[1])
+    return llamadas
+
+
+def cortes_iniciales(series_origen):
+    # El ciclo combinado deja de publicar antes del inicio de la cola (ventana + margen)
+    return {nombre: INICIO - pd.Timedelta(days=2) if nombre == ESTANCADO else INICIO for nombre in series_origen}
+
+
+def simular(series_origen, origen, ticks=12):
+    # Cada tick publica una hora más de todos los indicadores salvo el lento (dos horas cada dos ticks);
+    # el estancado publica una fila suelta en el tick 4. Devuelve las filas entregadas con el cursor.
+    cortes = cortes_iniciales(series_origen)
+    escribir_origen(origen, series_origen, cortes)
+    directo.sondear(origen, forzar=True)
+    entregadas = [directo.filas_desde(None)]
+    cursor = entregadas[0].index[-1]
+    for tick in range(1, ticks + 1):
+        for nombre in series_origen:
+            if nombre == ESTANCADO:
+                cortes[nombre] += directo.PASO if tick == 4 else pd.Timedelta(0)
+            elif nombre != LENTO or tick % 2 == 0:
+                cortes[nombre] = INICIO + pd.Timedelta(hours=tick)
+        # Se reescriben todos los ficheros, también los que no tienen filas nuevas (como una pasada de esios_api.py)
+        escribir_origen(origen, series_origen, cortes)
+        directo.sondear(origen, forzar=True)
+        filas = directo.filas_desde(cursor)
+        if len(filas):
+            cursor = filas.index[-1]
+            entregadas.append(filas)
+    return pd.concat(entregadas)
+
+
+def construido(origen, destino):
+    construir_datos.construir(origen, destino, completo=True)
+    return pd.read_parquet(os.path.join(destino, construir_datos.RESOLUCIONES['fifteen_minutes']['salida']))
+
+
+def test_incremental_igual_a_construido(series_origen, tmp_path, recargas):
+    origen = str(tmp_path / "origen")
+    simular(series_origen, origen)
+    assert len(recargas) == 1
+    referencia = construido(origen, str(tmp_path / "datos"))
+    cola = directo._estado['cola']
+    pd.testing.assert_frame_equal(cola[referencia.columns], referencia.loc[cola.index], check_exact=False, rtol=1e-9, check_freq=False)
+    rampa = referencia['DemandaReal_MW'].diff().loc[cola.index[1:]]
+    np.testing.assert_allclose(cola[directo.col_rampa('DemandaReal_MW')].iloc[1:].to_numpy(), rampa.to_numpy(), rtol=1e-9)
+    # Las sumas por mes incluyen la fila tardía del indicador estancado, anterior a la cola
+    grupos = referencia.groupby(directo.clave_mes(referencia.index))
+    medias = grupos.sum(min_count=1) / grupos.count().where(grupos.count() > 0)
+    for mes in medias.index:
+        np.testing.assert_allclose(directo.medias_mes(mes)[medias.columns].to_numpy(dtype=float), medias.loc[mes].to_numpy(dtype=float), rtol=1e-9)
+
+
+def test_cursor_entrega_cada_fila_una_vez(series_origen, tmp_path):
+    origen = str(tmp_path / "origen")
+    entregadas = simular(series_origen, origen)
+    assert entregadas.index.is_unique and entregadas.index.is_monotonic_increasing
+    assert (np.diff(entregadas.index.to_numpy()) == directo.PASO.to_timedelta64()).all()
+    assert entregadas.index[-1] == directo._estado['completo']
+    cola = directo._estado['cola']
+    comunes = entregadas.index.intersection(cola.index)
+    pd.testing.assert_frame_equal(entregadas.loc[comunes, cola.columns], cola.loc[comunes], check_freq=False)
+
+
+def test_indicador_estancado_no_congela_el_horizonte(series_origen, tmp_path):
+    origen = str(tmp_path / "origen")
+    escribir_origen(origen, series_origen, cortes_iniciales(series_origen))
+    directo.sondear(origen, forzar=True)
+    assert directo._estado['completo'] == INICIO
+    assert directo.filas_desde(None).index[-1] == INICIO